@@ -1,13 +1,29 @@
-from flask import Blueprint, jsonify, request, abort, Response
+from flask import Blueprint, jsonify, request, abort, Response, copy_current_request_context, stream_with_context
+from werkzeug.exceptions import HTTPException, InternalServerError
 from navigator_engine.common.decision_engine import DecisionEngine
-from navigator_engine.model import load_graph
-from navigator_engine.common import choose_graph, choose_data_loader
+from navigator_engine.common.compiled_graph import get_action_payload, load_compiled_graph
+from navigator_engine.common import choose_graph, choose_data_loader, get_config
 from navigator_engine.common.action_list import create_action_list
-from navigator_engine import model
-from typing import Any
+from navigator_engine.common.instrumentation import Timer
+from navigator_engine.common.resource_cache import release_prefetched_resources
+from navigator_engine.common.result_cache import fingerprint, get_result_cache
+from navigator_engine.common.route_checkpoint import load_route_checkpoint
+from navigator_engine.pluggable_logic.data_loaders import get_source_fingerprint
+from flask_babel import get_locale
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Iterator, Optional
+import flask
 import json
+import logging
+import threading
 
 api_blueprint = Blueprint('main', __name__, url_prefix='/api/')
+logger = logging.getLogger(__name__)
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+_batch_executor: Optional[ThreadPoolExecutor] = None
+_batch_executor_lock = threading.Lock()
 
 
 @api_blueprint.route('/decide', methods=['POST'])
@@ -28,24 +44,67 @@ def decide() -> Response:
     """
 
     input_data = json.loads(request.data)
-    engine = _make_engine(input_data)
-    engine.decide()
-    del engine.decision['node']
-    stop_action = input_data.get('actionID')
+    return _jsonify(_memoize('decide', _decide, input_data))
 
-    if stop_action and stop_action != engine.decision['id']:
-        abort(
-            400,
-            f"Please specify a valid actionID. The actionID {stop_action}"
-            f" is not found in the action path {engine.progress.action_breadcrumbs}"
-        )
 
-    return jsonify({
-        "decision": engine.decision,
-        "actions": engine.progress.action_breadcrumbs,
-        "removeSkipActions": engine.remove_skip_requests,
-        "progress": engine.progress.report
-    })
+@api_blueprint.route('/decide/batch', methods=['POST'])
+def decide_batch() -> Response:
+    """
+    Decide what needs to happen next for many data files at once.
+
+    POST Request takes the following json input, each item being the input to `/decide`:
+    ```
+        {
+            "items": [
+                {
+                    "data": {
+                        "url": "<url from estimates dataset json datadict>",
+                        "authorization_header": "<optional value to be supplied as the Authorization header tag>"
+                    },
+                    "skipActions": ["<action_id>", "<action_id>"]
+                }
+            ]
+        }
+    ```
+    Each result holds the item's index and either the `/decide` response or an error.  If the
+    request accepts `application/x-ndjson`, results are streamed one per line as they finish.
+    """
+    input_data = json.loads(request.data)
+    items = input_data.get('items')
+
+    if not isinstance(items, list) or not items:
+        abort(400, "No items specified in request")
+
+    max_items = get_config('BATCH_DECIDE_MAX_ITEMS', 500)
+    if len(items) > max_items:
+        abort(400, f"Too many items in request, the maximum is {max_items}")
+
+    def decide_item(index: int, item: dict) -> dict[str, Any]:
+        try:
+            if not isinstance(item, dict):
+                abort(400, "Each item must be an object")
+            return {'index': index, **_memoize('decide', _decide, item)}
+        except HTTPException as e:
+            error = e
+        except Exception:
+            logger.exception(f"Failed to decide batch item {index}")
+            error = InternalServerError()
+        return {'index': index, 'error': {'status_code': error.code, 'error': error.name, 'message': error.description}}
+
+    executor = _get_batch_executor()
+    # Each item runs in its own copy of the request context, e.g. for the requested locale
+    futures = [
+        executor.submit(copy_current_request_context(decide_item), index, item)
+        for index, item in enumerate(items)
+    ]
+
+    if request.accept_mimetypes.best == NDJSON_MIMETYPE:
+        def stream_results() -> Iterator[str]:
+            for future in as_completed(futures):
+                yield flask.json.dumps(future.result()) + '\n'
+        return Response(stream_with_context(stream_results()), mimetype=NDJSON_MIMETYPE)
+
+    return _jsonify({'results': [future.result() for future in futures]})
 
 
 @api_blueprint.route('/decide/list', methods=['POST'])
@@ -65,35 +124,114 @@ def decide_list() -> Response:
     ```
     """
     input_data = json.loads(request.data)
+    return _jsonify(_memoize('decide/list', _decide_list, input_data))
+
+
+@api_blueprint.route('/action/<action_id>')
+def action(action_id: str) -> Response:
+    """
+    Get the details of a specific action in the task breadcrumbs.
+    """
+
+    payload = get_action_payload(action_id)
+
+    if not payload:
+        abort(400, f"Please specify a valid action ID. Action {action_id} not found.")
+
+    # Actions only change when a new release is loaded, so clients revalidate with the ETag
+    etag, body = payload
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = get_config('ACTION_CACHE_MAX_AGE_SECONDS', 300)
+    response.vary.add('Accept-Language')
+    response.make_conditional(request)
+    return response
+
+
+def _jsonify(response_data: dict[str, Any]) -> Response:
+    with Timer('stage', 'serialisation'):
+        return jsonify(response_data)
+
 
+def _decide(input_data: dict[str, Any]) -> dict[str, Any]:
+    engine = _make_engine(input_data)
+    engine.decide()
+    del engine.decision['node']
+    stop_action = input_data.get('actionID')
+
+    if stop_action and stop_action != engine.decision['id']:
+        abort(
+            400,
+            f"Please specify a valid actionID. The actionID {stop_action}"
+            f" is not found in the action path {engine.progress.action_breadcrumbs}"
+        )
+
+    return {
+        "decision": engine.decision,
+        "actions": engine.progress.action_breadcrumbs,
+        "removeSkipActions": engine.remove_skip_requests,
+        "progress": engine.progress.report
+    }
+
+
+def _decide_list(input_data: dict[str, Any]) -> dict[str, Any]:
     engine = _make_engine(input_data)
     action_list, path_fully_resolved = create_action_list(engine)
 
-    return jsonify({
+    return {
         'milestones': engine.progress.report['milestones'],
         'progress': engine.progress.report['progress'],
         'actionList': action_list,
         'fullyResolved': path_fully_resolved,
         'removeSkipActions': engine.remove_skip_requests,
-    })
+    }
 
 
-@api_blueprint.route('/action/<action_id>')
-def action(action_id: str) -> Response:
-    """
-    Get the details of a specific action in the task breadcrumbs.
-    """
+def _memoize(endpoint: str, respond: Callable[[dict[str, Any]], dict[str, Any]],
+             input_data: dict[str, Any]) -> dict[str, Any]:
+    # Responses depend only upon the graph, the data, the request and the locale
+    cache = get_result_cache()
+    if not cache or not isinstance(input_data.get('data'), dict) or not input_data['data'].get('url'):
+        return respond(input_data)
 
-    node = model.load_node(node_ref=action_id)
-    action = getattr(node, 'action', None)
+    # The key is built from a copy of the data, which keeps the dataset downloaded for the key
+    # so the data loader doesn't download it again
+    source_data = dict(input_data['data'])
+    input_data = {**input_data, 'data': source_data}
+    data_loader = choose_data_loader(source_data['url'])
+    try:
+        source_fingerprint = get_source_fingerprint(data_loader, source_data)
+        if source_fingerprint is None:
+            return respond(input_data)
+        key = fingerprint(
+            endpoint,
+            load_compiled_graph(choose_graph(source_data['url'])).key,
+            str(get_locale()),
+            source_fingerprint,
+            input_data.get('skipActions', []),
+            input_data.get('actionID')
+        )
+        response = cache.get(key)
+        if response is None:
+            response = respond(input_data)
+            cache.set(key, response)
+        return response
+    finally:
+        # The dataset is left downloaded if the response was cached or the decision failed
+        release_prefetched_resources(source_data)
 
-    if not action:
-        abort(400, f"Please specify a valid action ID. Action {action_id} not found.")
 
-    return jsonify({
-        'id': action_id,
-        'content': action.to_dict()
-    })
+def _get_batch_executor() -> ThreadPoolExecutor:
+    # Shared by all batch requests, so the number of concurrent decisions is bounded per process
+    global _batch_executor
+    with _batch_executor_lock:
+        if not _batch_executor:
+            _batch_executor = ThreadPoolExecutor(
+                max_workers=get_config('BATCH_DECIDE_WORKERS', 8),
+                thread_name_prefix='batch-decide'
+            )
+    return _batch_executor
 
 
 def _make_engine(input_data: dict[str, Any]) -> DecisionEngine:
@@ -104,16 +242,23 @@ def _make_engine(input_data: dict[str, Any]) -> DecisionEngine:
     if not input_data['data'].get('url'):
         abort(400, "No url to data specified in request")
 
-    graph = load_graph(choose_graph(input_data['data']['url']))
+    graph = load_compiled_graph(choose_graph(input_data['data']['url']))
     data_loader = choose_data_loader(input_data['data']['url'])
     source_data = input_data['data']
     skip_requests = input_data.get('skipActions', [])
     stop_action = str(input_data.get('actionID'))
+    # Each dataset's previous route is replayed up to the conditionals whose data has changed
+    checkpoint = load_route_checkpoint(
+        graph.key,
+        source_data['url'],
+        source_data.get('authorization_header')
+    )
 
     return DecisionEngine(
         graph,
         source_data,
         data_loader=data_loader,
         skip_requests=skip_requests,
-        stop=stop_action
+        stop=stop_action,
+        checkpoint=checkpoint
     )
@@ -7,7 +7,10 @@ from navigator_engine import cli
 from navigator_engine.api import api_blueprint
 from navigator_engine.model import db
 from navigator_engine.common import dash_app
+from navigator_engine.common.compiled_graph import load_graph_artifact
+import navigator_engine.common.instrumentation as instrumentation
 from navigator_engine.healthz import healthz_bp
+from navigator_engine.metrics import metrics_bp
 import importlib
 import json
 import json_logging
@@ -25,6 +28,8 @@ def create_app(config_object=None):
         )
 
     app.config.from_object(config_object)
+    if app.config.get('METRICS_ENABLED') and not instrumentation.prometheus_client:
+        raise RuntimeError(instrumentation.MISSING_CLIENT_MESSAGE)
     app.url_map.strict_slashes = False
     app.logger.setLevel(app.config.get('LOGGING_LEVEL'))
     if app.config['JSON_LOGGING']:
@@ -47,7 +52,13 @@ def create_app(config_object=None):
     # Importing this code registers all the pluggable_logic for use
     importlib.import_module('navigator_engine.pluggable_logic')
 
+    # Serves the graphs compiled into the artifact without querying the db
+    if app.config.get('GRAPH_ARTIFACT'):
+        with app.app_context():
+            load_graph_artifact(app.config['GRAPH_ARTIFACT'])
+
     app.register_blueprint(healthz_bp)
+    app.register_blueprint(metrics_bp)
 
     @app.route('/')
     def index():
@@ -1,5 +1,7 @@
 import click
-from navigator_engine.common.graph_loader import graph_loader, validate_graph
+from navigator_engine import model
+from navigator_engine.common.compiled_graph import export_graph_artifact
+from navigator_engine.common.graph_loader import graph_loader, validate_graph, workbook_hash
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,11 +16,43 @@ def register(app):
 
     @navigator_engine.command()
     @click.argument('graph-config-file', default=app.config.get('DEFAULT_DECISION_GRAPH'))
-    def load_graph(graph_config_file):
-        """Loads binary decision graph into the db"""
+    @click.option('--reset', is_flag=True, help="Drop and recreate the db first, deleting every release")
+    @click.option('--force', is_flag=True, help="Load the workbook even if the active release was loaded from it")
+    def load_graph(graph_config_file, reset, force):
+        """Loads binary decision graph into the db as a new release and activates it"""
+        if reset:
+            logger.info("Resetting the db")
+            model.db.drop_all()
+        model.migrate_schema()
+        active_release = model.load_active_release()
+        if not force and active_release and active_release.source_hash == workbook_hash(graph_config_file):
+            logger.info(f"Active release {active_release.id} was loaded from {graph_config_file}, nothing to load")
+            return
         logger.info(f"Loading the graph {graph_config_file}")
-        graph_loader(graph_config_file)
-        logger.info("Loading graph successful")
-        logger.info("Validating graph with graph_id = 1")
-        validate_graph(1)
+        release = graph_loader(graph_config_file)
+        logger.info(f"Loading graph successful, created release {release.id}")
+        logger.info(f"Validating graph with graph_id = {release.graph_id}")
+        validate_graph(release.graph_id)
         logger.info("Graph validation successful")
+        model.activate_release(release.id)
+        logger.info(f"Activated release {release.id}")
+        pruned_release_ids = model.prune_releases(app.config['GRAPH_RELEASES_KEPT'])
+        if pruned_release_ids:
+            logger.info(f"Pruned releases {pruned_release_ids}")
+
+    @navigator_engine.command()
+    @click.argument('release-id', type=int)
+    def activate_release(release_id):
+        """Activates a previously loaded graph release, e.g. to roll back"""
+        if not model.db.session.get(model.GraphRelease, release_id):
+            raise click.BadParameter(f"Release {release_id} not found")
+        model.activate_release(release_id)
+        logger.info(f"Activated release {release_id}")
+
+    @navigator_engine.command()
+    @click.argument('artifact-file')
+    @click.option('--release-id', type=int, help="Release to export, defaults to the active release")
+    def export_graph(artifact_file, release_id):
+        """Exports the compiled graphs of a release, for workers to load with GRAPH_ARTIFACT"""
+        artifact = export_graph_artifact(artifact_file, release_id)
+        logger.info(f"Exported {len(artifact['graphs'])} graphs of release {artifact['release_id']} to {artifact_file}")
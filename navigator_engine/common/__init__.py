@@ -1,14 +1,20 @@
 import ast
-from typing import Callable
+import functools
+from flask import current_app, has_app_context
+from typing import Any, Callable
 
 CONDITIONAL_FUNCTIONS: dict[str, Callable] = {}
 DATA_LOADERS: dict[str, Callable] = {}
+ASYNC_DATA_LOADERS: dict[str, Callable] = {}
+# Conditionals that read or change the engine's state beyond its data
+STATEFUL_CONDITIONALS: set[str] = set()
 
 
 def choose_graph(file_url):
     # TODO:  choose the graph for a given file url
-    # For now only one graph type
-    return 1
+    # For now only one graph type, the root graph of the active release
+    from navigator_engine.common.compiled_graph import get_active_graph_id
+    return get_active_graph_id()
 
 
 def choose_data_loader(file_url):
@@ -17,14 +23,35 @@ def choose_data_loader(file_url):
     return "load_estimates_dataset('url', 'authorization_header')"
 
 
+def get_config(key: str, default: Any = None) -> Any:
+    # App config if running within the app, so the engine can also be used standalone
+    if has_app_context():
+        return current_app.config.get(key, default)
+    return default
+
+
 def register_conditional(f):
     CONDITIONAL_FUNCTIONS[f.__name__] = f
     return f
 
 
+def register_stateful_conditional(f):
+    STATEFUL_CONDITIONALS.add(f.__name__)
+    return register_conditional(f)
+
+
 def register_loader(f):
-    DATA_LOADERS[f.__name__] = f
-    return f
+    # Loaders are timed wherever they are called from, including by other loaders
+    from navigator_engine.common.instrumentation import instrument_loader
+    DATA_LOADERS[f.__name__] = instrument_loader(f)
+    return DATA_LOADERS[f.__name__]
+
+
+def register_async_loader(f):
+    # Async counterpart of a loader registered under the same name
+    from navigator_engine.common.instrumentation import instrument_loader
+    ASYNC_DATA_LOADERS[f.__name__] = instrument_loader(f)
+    return ASYNC_DATA_LOADERS[f.__name__]
 
 
 def get_resource_from_dataset(resource_type: str, dataset: dict) -> dict:
@@ -43,7 +70,9 @@ def get_resource_from_dataset(resource_type: str, dataset: dict) -> dict:
         return {}
 
 
+@functools.lru_cache(maxsize=1024)
 def get_pluggable_function_and_args(function_string: str) -> tuple[str, tuple]:
+    # Cached, so the returned args are shared and must not be modified
     function_name = function_string.split("(")[0]
     function_args = function_string.split(function_name)[1]
     eval_function_args = ast.literal_eval(function_args)
@@ -52,6 +81,14 @@ def get_pluggable_function_and_args(function_string: str) -> tuple[str, tuple]:
     return function_name, eval_function_args
 
 
+def resolve_pluggable_logic(function_string: str, functions: dict[str, Callable]) -> tuple[Callable, tuple]:
+    function_name, function_args = get_pluggable_function_and_args(function_string)
+    try:
+        return functions[function_name], function_args
+    except KeyError:
+        raise DecisionError(f"No pluggable logic for {function_name}")
+
+
 class DecisionError(Exception):
     """Raised when there is an error in the decision logic."""
     pass
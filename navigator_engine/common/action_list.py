@@ -1,8 +1,21 @@
 from navigator_engine import model
+import navigator_engine.common.compiled_graph as compiled_graph
 from navigator_engine.common.progress_tracker import ProgressTracker
 from navigator_engine.common.network import Network
 from navigator_engine.common.decision_engine import DecisionEngine
-from typing import Any
+from navigator_engine.common.instrumentation import Timer
+from flask_babel import get_locale
+from types import MappingProxyType
+from typing import Any, Mapping
+import networkx
+import threading
+import weakref
+
+# Unreached actions depend only upon the graph, the nodes the decision stopped at and the locale
+_future_actions: weakref.WeakKeyDictionary[
+    networkx.DiGraph, dict[tuple, tuple[tuple[Mapping[str, Any], ...], bool]]
+] = weakref.WeakKeyDictionary()
+_future_actions_lock = threading.Lock()
 
 
 def step_through_common_path(network: Network,
@@ -17,8 +30,7 @@ def step_through_common_path(network: Network,
         progress.add_node(node)
 
         if getattr(node, 'milestone_id'):
-            milestone_graph = model.load_graph(node.milestone.graph_id)
-            milestone_network = Network(milestone_graph.to_networkx())
+            milestone_network = compiled_graph.load_compiled_network(node.milestone.graph_id)
             milestone_progress, milestone_path_fully_resolved = step_through_common_path(
                 milestone_network,
                 sources
@@ -31,6 +43,25 @@ def step_through_common_path(network: Network,
     return progress, path_fully_resolved
 
 
+def get_future_actions(network: Network,
+                       sources: list[model.Node]) -> tuple[tuple[Mapping[str, Any], ...], bool]:
+    # Memoized, so the returned breadcrumbs are shared and can't be modified
+    locale = get_locale()
+    key = (tuple(node.ref for node in sources), str(locale) if locale else None)
+    future_actions = _future_actions.get(network.networkx, {}).get(key)
+    if future_actions:
+        return future_actions
+
+    progress, path_fully_resolved = step_through_common_path(network, sources=list(sources))
+    future_actions = (
+        tuple(MappingProxyType(action) for action in progress.action_breadcrumbs[1:]),
+        path_fully_resolved
+    )
+    with _future_actions_lock:
+        _future_actions.setdefault(network.networkx, {})[key] = future_actions
+    return future_actions
+
+
 def create_action_list(engine: DecisionEngine) -> tuple[list[dict[str, Any]], bool]:
 
     engine.decide()
@@ -42,20 +73,15 @@ def create_action_list(engine: DecisionEngine) -> tuple[list[dict[str, Any]], bo
     ongoing_milestone_id = engine.progress.report.get('currentMilestoneID')
 
     if ongoing_milestone_id:
-        ongoing_milestone_node = model.load_node(node_ref=ongoing_milestone_id)
+        ongoing_milestone_node = engine.network.get_node(ongoing_milestone_id)
         sources = [ongoing_milestone_node, engine.progress.entire_route[-2]]
 
     else:
         sources = [engine.progress.entire_route[-2]]
 
-    progress, path_fully_resolved = step_through_common_path(
-        engine.network,
-        sources=sources
-    )
-    unreached_actions = progress.action_breadcrumbs[1:]
-
-    for action in unreached_actions:
-        action['reached'] = False
+    with Timer('stage', 'action_list'):
+        future_actions, path_fully_resolved = get_future_actions(engine.network, sources)
+        unreached_actions = [dict(action, reached=False) for action in future_actions]
 
     action_list = reached_actions + unreached_actions
 
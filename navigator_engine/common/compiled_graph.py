@@ -0,0 +1,379 @@
+"""
+Compiled decision graphs are plain python copies of the Graph, Node, Action,
+Conditional and Milestone rows held in the db.  They are built once per
+process and then shared between requests, so that making a decision does
+not need to touch the db once the cache is warm.
+
+Compiled objects expose the same attributes as the db models used by the
+DecisionEngine, so the two can be used interchangeably.
+
+Each process periodically checks which graph release is active, so a newly
+loaded and activated workbook is served without restarting the workers.
+
+The compiled graphs of a release can also be exported as an artifact, which
+workers load at startup instead of querying the db.  Artifacts are pickles,
+so must only be loaded from trusted locations.
+
+Nodes of the release are indexed by ref, and the JSON payloads served for
+its actions are rendered for every locale, once when first needed or when
+an artifact is loaded.
+"""
+import navigator_engine.model as model
+from navigator_engine.common import CONDITIONAL_FUNCTIONS, DecisionError, get_config, resolve_pluggable_logic
+from navigator_engine.common.instrumentation import Timer
+from navigator_engine.common.network import Network
+from navigator_engine.common.result_cache import clear_result_cache
+from navigator_engine.common.route_checkpoint import clear_route_checkpoints
+from flask import current_app, json
+from flask_babel import get_locale
+from typing import Any, Callable, Optional
+import datetime
+import hashlib
+import networkx
+import os
+import pickle
+import threading
+import time
+import uuid
+import weakref
+
+# Graphs loaded before graph releases were introduced
+DEFAULT_GRAPH_ID = 1
+DEFAULT_RELEASE_CHECK_SECONDS = 10
+# Increment whenever the compiled classes change, so that old artifacts are rejected
+ARTIFACT_FORMAT = 2
+
+GRAPH_CACHE: dict[int, 'CompiledGraph'] = {}
+_cache_lock = threading.Lock()
+# Networks are dropped along with their compiled graph, so are never pickled into artifacts
+_networks: weakref.WeakKeyDictionary['CompiledGraph', Network] = weakref.WeakKeyDictionary()
+# Nodes of every graph in the release, by release id then node ref
+_node_index: dict[Optional[int], dict[str, 'CompiledNode']] = {}
+# Rendered payloads of the release's actions, by release id, then action ref, then locale
+_action_payloads: dict[Optional[int], dict[str, dict[str, tuple[str, str]]]] = {}
+_active_release: dict[str, Any] = {
+    'checked_at': None, 'release_id': None, 'graph_id': DEFAULT_GRAPH_ID, 'artifact': None
+}
+_release_lock = threading.Lock()
+
+
+def _translate(translations: dict[str, Optional[str]], locale: Optional[str] = None) -> Optional[str]:
+    # Mirrors sqlalchemy_i18n, falling back to the default language if no translation
+    locale = locale or _get_locale()
+    value = translations.get(locale)
+    return value or translations.get(model.default_language)
+
+
+def _get_locale() -> str:
+    locale = get_locale()
+    return str(locale) if locale else model.default_language
+
+
+def _get_translations(obj: Any, attribute: str) -> dict[str, Optional[str]]:
+    return {lang: getattr(obj.translations[lang], attribute) for lang in model.languages}
+
+
+class CompiledConditional():
+
+    def __init__(self, conditional: model.Conditional) -> None:
+        self.id: int = conditional.id
+        self.function: str = conditional.function
+        self.titles: dict[str, Optional[str]] = _get_translations(conditional, 'title')
+        self.logic: Optional[tuple[Callable, tuple]] = None
+        try:
+            self.logic = resolve_pluggable_logic(conditional.function, CONDITIONAL_FUNCTIONS)
+        except (DecisionError, ValueError, SyntaxError):
+            pass  # Bad functions raise their errors when the conditional is processed
+
+    @property
+    def title(self) -> Optional[str]:
+        return _translate(self.titles)
+
+
+class CompiledResource():
+
+    def __init__(self, resource: model.Resource) -> None:
+        self.id: int = resource.id
+        self.url: str = resource.url
+        self.titles: dict[str, Optional[str]] = _get_translations(resource, 'title')
+
+    @property
+    def title(self) -> Optional[str]:
+        return _translate(self.titles)
+
+    def to_dict(self, locale: Optional[str] = None) -> dict:
+        return {'label': _translate(self.titles, locale), 'url': self.url}
+
+
+class CompiledAction():
+
+    def __init__(self, action: model.Action) -> None:
+        self.id: int = action.id
+        self.skippable: bool = action.skippable
+        self.action_url: str = action.action_url
+        self.complete: bool = action.complete
+        self.titles: dict[str, Optional[str]] = _get_translations(action, 'title')
+        self.htmls: dict[str, Optional[str]] = _get_translations(action, 'html')
+        self.resources: tuple[CompiledResource, ...] = tuple(
+            CompiledResource(resource) for resource in action.resources
+        )
+
+    @property
+    def title(self) -> Optional[str]:
+        return _translate(self.titles)
+
+    @property
+    def html(self) -> Optional[str]:
+        return _translate(self.htmls)
+
+    def to_dict(self, locale: Optional[str] = None) -> dict:
+        return {
+            "title": _translate(self.titles, locale),
+            "displayHTML": _translate(self.htmls, locale),
+            "skippable": self.skippable,
+            "terminus": self.complete,
+            "helpURLs": [resource.to_dict(locale) for resource in self.resources]
+        }
+
+
+class CompiledMilestone():
+
+    def __init__(self, milestone: model.Milestone) -> None:
+        self.id: int = milestone.id
+        self.graph_id: int = milestone.graph_id
+        self.data_loader: str = milestone.data_loader
+        self.titles: dict[str, Optional[str]] = _get_translations(milestone, 'title')
+
+    @property
+    def title(self) -> Optional[str]:
+        return _translate(self.titles)
+
+
+class CompiledNode():
+
+    def __init__(self, node: model.Node) -> None:
+        self.id: int = node.id
+        self.ref: str = node.ref
+        self.conditional_id: Optional[int] = node.conditional_id
+        self.action_id: Optional[int] = node.action_id
+        self.milestone_id: Optional[int] = node.milestone_id
+        self.distance_to_complete: Optional[int] = node.distance_to_complete
+        self.milestones_to_complete: Optional[tuple[str, ...]] = \
+            tuple(node.milestones_to_complete) if node.milestones_to_complete is not None else None
+        self.milestones_to_complete_resolved: Optional[bool] = node.milestones_to_complete_resolved
+        self.conditional = CompiledConditional(node.conditional) if node.conditional else None
+        self.action = CompiledAction(node.action) if node.action else None
+        self.milestone = CompiledMilestone(node.milestone) if node.milestone else None
+
+    def __hash__(self) -> int:
+        return self.id
+
+    def __repr__(self) -> str:
+        return f"<CompiledNode {self.ref}>"
+
+
+class CompiledGraph():
+
+    def __init__(self, graph: model.Graph) -> None:
+        self.id: int = graph.id
+        # Identifies this compilation, as graph ids are reused when graphs are loaded without a release
+        self.key: str = uuid.uuid4().hex
+        self.version: str = graph.version
+        self.titles: dict[str, Optional[str]] = _get_translations(graph, 'title')
+        self.descriptions: dict[str, Optional[str]] = _get_translations(graph, 'description')
+        nodes: dict[int, CompiledNode] = {}
+
+        def compile_node(node: model.Node) -> CompiledNode:
+            if node.id not in nodes:
+                nodes[node.id] = CompiledNode(node)
+            return nodes[node.id]
+
+        self.networkx = networkx.DiGraph()
+        self.networkx.add_edges_from([
+            (compile_node(edge.from_node), compile_node(edge.to_node), {'type': edge.type})
+            for edge in graph.edges
+        ])
+        networkx.freeze(self.networkx)
+
+    @property
+    def title(self) -> Optional[str]:
+        return _translate(self.titles)
+
+    @property
+    def description(self) -> Optional[str]:
+        return _translate(self.descriptions)
+
+    def to_networkx(self) -> networkx.DiGraph:
+        return self.networkx
+
+
+def load_compiled_graph(graph_id: int) -> CompiledGraph:
+    compiled_graph = GRAPH_CACHE.get(graph_id)
+    if compiled_graph:
+        return compiled_graph
+    with _cache_lock:
+        if graph_id not in GRAPH_CACHE:
+            with Timer('stage', 'graph_load'):
+                graph = model.load_graph_full(graph_id)
+                if not graph:
+                    raise DecisionError(f"Graph {graph_id} not found")
+                GRAPH_CACHE[graph_id] = CompiledGraph(graph)
+        return GRAPH_CACHE[graph_id]
+
+
+def load_compiled_network(graph_id: int) -> Network:
+    # Shared between decisions, so that the paths and distances it caches are only found once
+    graph = load_compiled_graph(graph_id)
+    network = _networks.get(graph)
+    if not network:
+        with _cache_lock:
+            network = _networks.setdefault(graph, Network(graph.to_networkx()))
+    return network
+
+
+def get_compiled_node(node_ref: str) -> Optional[CompiledNode]:
+    # Refs are only unique within a release, so nodes are looked up in the active release
+    release_id = get_active_release_id()
+    node_index = _node_index.get(release_id)
+    if node_index is None:
+        node_index = load_node_index(release_id)
+    return node_index.get(node_ref)
+
+
+def load_node_index(release_id: Optional[int]) -> dict[str, CompiledNode]:
+    if _active_release['artifact']:
+        graphs = list(GRAPH_CACHE.values())
+    else:
+        graph_ids = [graph_id for graph_id, in model.db.session.query(model.Graph.id).filter_by(release_id=release_id)]
+        graphs = [load_compiled_graph(graph_id) for graph_id in graph_ids]
+
+    node_index = {node.ref: node for graph in graphs for node in graph.to_networkx().nodes}
+    with _cache_lock:
+        _node_index[release_id] = node_index
+    return node_index
+
+
+def get_action_payload(action_ref: str) -> Optional[tuple[str, str]]:
+    # The ETag and JSON body of the action in the current locale
+    node = get_compiled_node(action_ref)
+    if not node or not node.action:
+        return None
+    release_id = get_active_release_id()
+    payloads = _action_payloads.get(release_id, {}).get(action_ref)
+    if payloads is None:
+        payloads = render_action_payloads(release_id, node.ref, node.action)
+    return payloads.get(_get_locale()) or payloads.get(model.default_language)
+
+
+def render_action_payloads(release_id: Optional[int], action_ref: str,
+                           action: CompiledAction) -> dict[str, tuple[str, str]]:
+    # Actions only change when a release is loaded, so each is rendered for every locale once
+    payloads: dict[str, tuple[str, str]] = {}
+    for locale in model.languages:
+        body = _dumps_as_jsonify({'id': action_ref, 'content': action.to_dict(locale)})
+        etag = hashlib.sha256(f"{release_id}:{locale}:{body}".encode()).hexdigest()
+        payloads[locale] = (etag, body)
+
+    with _cache_lock:
+        _action_payloads.setdefault(release_id, {})[action_ref] = payloads
+    return payloads
+
+
+def _dumps_as_jsonify(data: Any) -> str:
+    # The same output as jsonify, which reads the app's JSON settings so needs the app context
+    indent, separators = None, (',', ':')
+    if current_app.config['JSONIFY_PRETTYPRINT_REGULAR'] or current_app.debug:
+        indent, separators = 2, (', ', ': ')
+    return f"{json.dumps(data, indent=indent, separators=separators)}\n"
+
+
+def _clear_release_caches() -> None:
+    # Everything derived from the cached graphs is dropped along with them, must hold _cache_lock
+    GRAPH_CACHE.clear()
+    _node_index.clear()
+    _action_payloads.clear()
+    clear_result_cache()
+    clear_route_checkpoints()
+
+
+def clear_graph_cache() -> None:
+    with _cache_lock:
+        _clear_release_caches()
+    with _release_lock:
+        _active_release.update(checked_at=None, release_id=None, graph_id=DEFAULT_GRAPH_ID, artifact=None)
+
+
+def get_active_release() -> dict[str, Any]:
+    # A loaded artifact pins the release being served
+    if _active_release['artifact']:
+        return _active_release
+    checked_at = _active_release['checked_at']
+    interval = get_config('GRAPH_RELEASE_CHECK_SECONDS', DEFAULT_RELEASE_CHECK_SECONDS)
+    if checked_at is not None and time.monotonic() - checked_at < interval:
+        return _active_release
+    with _release_lock:
+        release = model.load_active_release()
+        release_id = release.id if release else None
+        if release_id != _active_release['release_id']:
+            # Graphs of the previous release are no longer needed
+            with _cache_lock:
+                _clear_release_caches()
+        _active_release.update(
+            checked_at=time.monotonic(),
+            release_id=release_id,
+            graph_id=release.graph_id if release else DEFAULT_GRAPH_ID
+        )
+        return _active_release
+
+
+def get_active_graph_id() -> int:
+    return get_active_release()['graph_id']
+
+
+def get_active_release_id() -> Optional[int]:
+    return get_active_release()['release_id']
+
+
+def export_graph_artifact(path: str, release_id: Optional[int] = None) -> dict[str, Any]:
+    # Exports the active release if no release is given, or all graphs if there are no releases
+    release = model.db.session.get(model.GraphRelease, release_id) if release_id else model.load_active_release()
+    if release_id and not release:
+        raise DecisionError(f"Release {release_id} not found")
+    graph_ids = [graph.id for graph in (release.graphs if release else model.Graph.query.all())]
+
+    artifact = {
+        'format': ARTIFACT_FORMAT,
+        'created': datetime.datetime.utcnow(),
+        'release_id': release.id if release else None,
+        'graph_id': release.graph_id if release else DEFAULT_GRAPH_ID,
+        'graphs': {graph_id: CompiledGraph(model.load_graph_full(graph_id)) for graph_id in graph_ids}
+    }
+
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, 'wb') as artifact_file:
+        pickle.dump(artifact, artifact_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_path, path)
+    return artifact
+
+
+def load_graph_artifact(path: str) -> dict[str, Any]:
+    with open(path, 'rb') as artifact_file:
+        artifact = pickle.load(artifact_file)
+    if not isinstance(artifact, dict) or artifact.get('format') != ARTIFACT_FORMAT:
+        raise DecisionError(f"Graph artifact {path} is not in format {ARTIFACT_FORMAT}, export it again")
+
+    with _cache_lock:
+        _clear_release_caches()
+        GRAPH_CACHE.update(artifact['graphs'])
+    with _release_lock:
+        _active_release.update(
+            checked_at=time.monotonic(),
+            release_id=artifact['release_id'],
+            graph_id=artifact['graph_id'],
+            artifact=path
+        )
+    # Workers loading an artifact render every action up front, so they never query the db
+    for node in load_node_index(artifact['release_id']).values():
+        if node.action:
+            render_action_payloads(artifact['release_id'], node.ref, node.action)
+    return artifact
@@ -1,24 +1,44 @@
 import navigator_engine.model as model
+import navigator_engine.common.compiled_graph as compiled_graph
 from navigator_engine.common import (
+    ASYNC_DATA_LOADERS,
     CONDITIONAL_FUNCTIONS,
     DATA_LOADERS,
     DecisionError,
-    get_pluggable_function_and_args
+    get_pluggable_function_and_args,
+    resolve_pluggable_logic
 )
+from navigator_engine.common.instrumentation import Timer
 from navigator_engine.common.progress_tracker import ProgressTracker
+from navigator_engine.common.resource_cache import release_prefetched_resources
+from navigator_engine.common.route_checkpoint import RouteCheckpoint
 from navigator_engine.common.network import Network
-from typing import Callable, Any
+from typing import Callable, Any, Optional, Union
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+class MilestoneFrame():
+    # The state of the graph being processed, saved while the engine processes a milestone's graph
+
+    def __init__(self, network: Network, data: Any, progress: ProgressTracker,
+                 remove_skip_requests: list[str], milestone_node: model.Node) -> None:
+        self.network: Network = network
+        self.data: Any = data
+        self.progress: ProgressTracker = progress
+        self.remove_skip_requests: list[str] = remove_skip_requests
+        self.milestone_node: model.Node = milestone_node
+
+
 class DecisionEngine():
 
-    def __init__(self, graph: model.Graph, source_data: object, data_loader: str = None,
-                 stop: str = "", skip_requests: list[str] = [], route: list[model.Node] = [],
-                 skipped_actions: list[str] = []) -> None:
-        self.graph: model.Graph = graph
+    def __init__(self, graph: Union[model.Graph, compiled_graph.CompiledGraph], source_data: object,
+                 data_loader: Optional[str] = None, stop: str = "", skip_requests: list[str] = [],
+                 route: list[model.Node] = [], skipped_actions: list[str] = [],
+                 checkpoint: Optional[RouteCheckpoint] = None) -> None:
+        self.graph: Union[model.Graph, compiled_graph.CompiledGraph] = graph
         self.network: Network = Network(self.graph.to_networkx())
         self.data: Any = source_data
         self.skip_requests: list[str] = skip_requests
@@ -26,10 +46,21 @@ class DecisionEngine():
         self.progress: ProgressTracker = ProgressTracker(self.network, route=route, skipped_actions=skipped_actions)
         self.decision: dict[str, Any] = {}
         self.stop_action: str = stop
+        self.frames: list[MilestoneFrame] = []
+        self.checkpoint: Optional[RouteCheckpoint] = checkpoint
         if data_loader:
             self.data = self.run_pluggable_logic(data_loader, DATA_LOADERS)
 
-    def decide(self, data: object = None, skip_requests: list[str] = None, stop=None) -> dict:
+    @classmethod
+    async def create_async(cls, graph: Union[model.Graph, compiled_graph.CompiledGraph], source_data: object,
+                           data_loader: Optional[str] = None, **kwargs: Any) -> 'DecisionEngine':
+        # Loads the data without blocking the event loop, so many engines can load at once
+        engine = cls(graph, source_data, **kwargs)
+        if data_loader:
+            engine.data = await engine.run_async_pluggable_logic(data_loader)
+        return engine
+
+    def decide(self, data: object = None, skip_requests: Optional[list[str]] = None, stop=None) -> dict:
         if data is not None:
             self.data = data
         if skip_requests is not None:
@@ -37,17 +68,43 @@ class DecisionEngine():
         if stop is not None:
             self.stop_action = stop
         self.progress.reset()
-        next_action = self.process_node(self.network.get_root_node())
+        if self.checkpoint:
+            self.checkpoint.reset()
+        try:
+            next_action = self.process_node(self.network.get_root_node())
+        finally:
+            # Resources prefetched for parts of the graph the decision didn't reach are released
+            release_prefetched_resources(self.data)
         self.decision = {
             "id": next_action.ref,
             "content": next_action.action.to_dict(),
             "node": next_action
         }
-        self.progress.report_progress()
+        with Timer('stage', 'progress'):
+            self.progress.report_progress()
         self.remove_skip_requests_not_needed()
+        if self.checkpoint:
+            self.checkpoint.save()
         return self.decision
 
     def process_node(self, node: model.Node) -> model.Node:
+        # Nodes are processed in a loop rather than recursively, so long graphs can't exhaust the
+        # stack. Each node returns the next node to process, actions return themselves once reached.
+        depth = len(self.frames)
+        try:
+            while True:
+                next_node = self.visit_node(node)
+                while next_node is node and len(self.frames) > depth:
+                    next_node = self.complete_milestone(node)
+                if next_node is node:
+                    return node
+                node = next_node
+        except BaseException:
+            while len(self.frames) > depth:
+                self.pop_frame()
+            raise
+
+    def visit_node(self, node: model.Node) -> model.Node:
         self.progress.add_node(node)
         if getattr(node, 'conditional_id'):
             return self.process_conditional(node)
@@ -58,9 +115,20 @@ class DecisionEngine():
         raise DecisionError(f"Node {node.ref} is not a conditional, action or milestone")
 
     def process_conditional(self, node: model.Node) -> model.Node:
-        edge_type = self.run_pluggable_logic(node.conditional.function)
-        next_node = self.get_next_node(node, edge_type)
-        return self.process_node(next_node)
+        if self.checkpoint:
+            edge_type = self.checkpoint.evaluate(node, self)
+        else:
+            edge_type = self.run_conditional(node)
+        return self.get_next_node(node, edge_type)
+
+    def run_conditional(self, node: model.Node) -> Any:
+        # Data loaders are timed by the loader registry, so only conditionals are timed here
+        function_name, _ = get_pluggable_function_and_args(node.conditional.function)
+        with Timer('conditional', function_name):
+            return self.run_pluggable_logic(
+                node.conditional.function,
+                logic=getattr(node.conditional, 'logic', None)
+            )
 
     def process_action(self, node: model.Node) -> model.Node:
         stop_action = node.ref == self.stop_action
@@ -75,23 +143,44 @@ class DecisionEngine():
         return node
 
     def process_milestone(self, node: model.Node) -> model.Node:
-        milestone_engine = engine_factory(
-            model.load_graph(node.milestone.graph_id),
-            self.data.copy(),
-            data_loader=node.milestone.data_loader,
-            skip_requests=self.skip_requests,
-            skipped_actions=self.progress.skipped_actions,
-            stop=self.stop_action
+        # The milestone's graph is processed by this engine, with its own progress, sharing the data
+        # unless the milestone loads its own. Loaders add to the data they're given, so are given a copy.
+        self.push_frame(compiled_graph.load_compiled_network(node.milestone.graph_id), self.data, node)
+        if node.milestone.data_loader:
+            self.data = self.data.copy()
+            self.data = self.run_pluggable_logic(node.milestone.data_loader, DATA_LOADERS)
+        return self.network.get_root_node()
+
+    def complete_milestone(self, action_node: model.Node) -> model.Node:
+        # Returns to the graph containing the milestone, once an action in the milestone's graph is reached
+        self.remove_skip_requests_not_needed()
+        milestone_frame = self.pop_frame()
+        self.remove_skip_requests += milestone_frame.remove_skip_requests
+        self.progress.add_milestone(milestone_frame.milestone_node, milestone_frame.progress)
+        if action_node.action.complete:
+            return self.get_next_node(milestone_frame.milestone_node, True)
+        return action_node
+
+    def push_frame(self, network: Network, data: Any, milestone_node: model.Node) -> None:
+        self.frames.append(MilestoneFrame(
+            self.network, self.data, self.progress, self.remove_skip_requests, milestone_node
+        ))
+        self.network = network
+        self.data = data
+        self.progress = ProgressTracker(network, skipped_actions=self.progress.skipped_actions)
+        self.remove_skip_requests = []
+
+    def pop_frame(self) -> MilestoneFrame:
+        # Restores the state saved by push_frame, returning the state of the graph that was processed
+        frame = self.frames.pop()
+        processed_frame = MilestoneFrame(
+            self.network, self.data, self.progress, self.remove_skip_requests, frame.milestone_node
         )
-        milestone_result = milestone_engine.decide()
-        self.remove_skip_requests += milestone_engine.remove_skip_requests
-        if milestone_result['node'].action.complete:
-            self.progress.add_milestone(node, milestone_engine.progress)
-            next_node = self.get_next_node(node, True)
-            return self.process_node(next_node)
-        else:
-            self.progress.add_milestone(node, milestone_engine.progress)
-            return milestone_result['node']
+        self.network = frame.network
+        self.data = frame.data
+        self.progress = frame.progress
+        self.remove_skip_requests = frame.remove_skip_requests
+        return processed_frame
 
     def get_next_node(self, node: model.Node, edge_type: bool) -> model.Node:
         new_node = None
@@ -105,12 +194,10 @@ class DecisionEngine():
         return new_node
 
     def run_pluggable_logic(self, function_string: str,
-                            functions: dict[str, Callable] = CONDITIONAL_FUNCTIONS) -> Any:
-        function_name, function_args = get_pluggable_function_and_args(function_string)
-        try:
-            function = functions[function_name]
-        except KeyError:
-            raise DecisionError(f"No pluggable logic for {function_name}")
+                            functions: dict[str, Callable] = CONDITIONAL_FUNCTIONS,
+                            logic: Optional[tuple[Callable, tuple]] = None) -> Any:
+        # Compiled conditionals provide their logic already resolved
+        function, function_args = logic if logic else resolve_pluggable_logic(function_string, functions)
         try:
             return function(*function_args, self)
         except Exception as e:
@@ -119,13 +206,31 @@ class DecisionEngine():
                 f"Error running pluggable logic {function_string}: {type(e).__name__} {e}"
             )
 
+    async def run_async_pluggable_logic(self, function_string: str) -> Any:
+        # Loaders without an async counterpart are run in a thread
+        function_name, _ = get_pluggable_function_and_args(function_string)
+        is_async = function_name in ASYNC_DATA_LOADERS
+        function, function_args = resolve_pluggable_logic(
+            function_string,
+            ASYNC_DATA_LOADERS if is_async else DATA_LOADERS
+        )
+        try:
+            if is_async:
+                return await function(*function_args, self)
+            return await asyncio.to_thread(function, *function_args, self)
+        except Exception as e:
+            logger.exception(e)
+            raise DecisionError(
+                f"Error running pluggable logic {function_string}: {type(e).__name__} {e}"
+            )
+
     def skip_action(self, node: model.Node) -> model.Node:
         previous_node = self.progress.entire_route[-2]
         for previous_node, new_node in self.network.networkx.out_edges(previous_node):
             if node != new_node:
                 self.progress.skipped_actions.append(node.ref)
                 self.progress.pop_node()
-                return self.process_node(new_node)
+                return new_node
         raise DecisionError(f"Only one outgoing edge for node: {previous_node}")
 
     def remove_skip_requests_not_needed(self) -> None:
@@ -133,16 +238,3 @@ class DecisionEngine():
         ignored_skips = [ref for ref in self.skip_requests if ref not in self.progress.skipped_actions]
         ignored_skips_in_path = [ref for ref in ignored_skips if ref in action_breadcrumbs_ref]
         self.remove_skip_requests.extend(ref for ref in ignored_skips_in_path if ref not in self.remove_skip_requests)
-
-
-def engine_factory(graph, data, data_loader=None, skip_requests=[],
-                   stop=None, skipped_actions=[]) -> DecisionEngine:
-    # Used to mock out engine creation in tests
-    return DecisionEngine(
-        graph,
-        data,
-        skip_requests=skip_requests,
-        data_loader=data_loader,
-        stop=stop,
-        skipped_actions=skipped_actions
-    )
@@ -1,8 +1,12 @@
 import navigator_engine.model as model
 import navigator_engine.common as common
+from navigator_engine.common.network import Network
+import hashlib
 import logging
+import networkx
 import os
 import pandas as pd
+from pandas.io.parsers import TextParser
 import re
 import markdown
 from urllib.parse import urlparse
@@ -44,9 +48,9 @@ logger = logging.getLogger(__name__)
 
 
 def graph_loader(graph_config_file):
-    # Clear and reset the db
-    model.db.drop_all()
-    model.db.create_all()
+    # The whole workbook is built in the session and written in a single transaction, as a new
+    # release. Releases being served are left untouched until the new one is activated.
+    model.migrate_schema()
 
     split_file_name = os.path.splitext(graph_config_file)
     file_extension = split_file_name[1]
@@ -56,30 +60,25 @@ def graph_loader(graph_config_file):
     default_lang = app.config['DEFAULT_LANGUAGE']
     languages = app.config['LANGUAGES']
 
-    xl = pd.ExcelFile(graph_config_file)
-    regex = re.compile(r'[\d]{2,2}-')
-    graph_sheets = list(filter(lambda x: regex.match(x), xl.sheet_names))
+    workbook = read_workbook(graph_config_file)
+    graph_sheets = list(workbook.keys())
     graphs = {}
+    # Nodes of the release by ref, so rows can refer to nodes created earlier without querying the db
+    nodes_by_ref = {}
+    release = model.GraphRelease(
+        source=os.path.basename(graph_config_file),
+        source_hash=workbook_hash(graph_config_file)
+    )
+    model.db.session.add(release)
 
     for index, sheet_name in enumerate(graph_sheets):
 
-        graph_header = pd.read_excel(
-            graph_config_file,
-            sheet_name=sheet_name,
-            header=0
-        ).loc[0]
-
-        graph_data = pd.read_excel(
-            graph_config_file,
-            sheet_name=sheet_name,
-            header=3,
-            index_col=0,
-            dtype=str
-        )
+        graph_header, graph_data = workbook[sheet_name]
 
         # Create graphs on first past through
         # So that they can be referenced by foreign keys on second pass
         graph = model.Graph()
+        graph.release = release
         graph.version = graph_header[MILESTONE_COLUMNS['TITLE']]
         graph.translations[default_lang].title = graph_header[MILESTONE_COLUMNS['TITLE']]
 
@@ -93,14 +92,13 @@ def graph_loader(graph_config_file):
                     graph_header.get(MILESTONE_COLUMNS['DESCRIPTION'] + '::' + lang)
 
         model.db.session.add(graph)
-        model.db.session.commit()
 
         graphs[sheet_name] = {
-            'graph_id': graph.id,
             "graph": graph,
             'title': {},
             'graph_header': graph_header,
-            'graph_data': graph_data
+            'graph_data': graph_data,
+            'edges': []
         }
 
         for lang in languages:
@@ -109,21 +107,68 @@ def graph_loader(graph_config_file):
             else:
                 graphs[sheet_name]['title'][lang] = graph_header.get(MILESTONE_COLUMNS['TITLE'] + '::' + lang)
 
+    # Assigns the graph ids referenced by milestones
+    model.db.session.flush()
+    for sheet_name in graph_sheets:
+        graphs[sheet_name]['graph_id'] = graphs[sheet_name]['graph'].id
+    release.graph_id = graphs[graph_sheets[0]]['graph_id']
+
     for sheet_name in graph_sheets:
-        import_data(sheet_name, graphs)
+        import_data(sheet_name, graphs, nodes_by_ref)
+
+    # Edges only need the ids of their nodes, so are inserted in one statement once the nodes are flushed
+    model.db.session.flush()
+    model.db.session.execute(model.Edge.__table__.insert(), [
+        {'graph_id': graphs[sheet_name]['graph_id'], 'from_id': from_node.id, 'to_id': to_node.id, 'type': edge['type']}
+        for sheet_name in graph_sheets
+        for from_node, to_node, edge in graphs[sheet_name]['edges']
+    ])
+
+    # Progress is stored in the same transaction, so a release is never active without it
+    for sheet_name in graph_sheets:
+        network = networkx.DiGraph()
+        network.add_edges_from(graphs[sheet_name]['edges'])
+        precompute_progress(network)
+
+    model.db.session.commit()
+    return release
+
+
+def workbook_hash(graph_config_file):
+    sha256 = hashlib.sha256()
+    with open(graph_config_file, 'rb') as workbook_file:
+        for chunk in iter(lambda: workbook_file.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
 
 
-def import_data(sheet_name, graphs):
+def read_workbook(graph_config_file):
+    # Each graph sheet is parsed once, then split into its header and data in memory
+    regex = re.compile(r'[\d]{2,2}-')
+    workbook = {}
+
+    with pd.ExcelFile(graph_config_file) as xl:
+        for sheet_name in filter(lambda x: regex.match(x), xl.sheet_names):
+            rows = xl.parse(sheet_name, header=None, dtype=object).fillna('').values.tolist()
+            graph_header = TextParser(rows, header=0).read().loc[0]
+            graph_data = TextParser(rows, header=3, index_col=0, dtype=str).read()
+            workbook[sheet_name] = (graph_header, graph_data)
+
+    return workbook
+
+
+def import_data(sheet_name, graphs, nodes_by_ref):
 
     default_lang = app.config['DEFAULT_LANGUAGE']
 
     graph_data = graphs[sheet_name]['graph_data']
     graph_header = graphs[sheet_name]['graph_header']
-    graph = graphs[sheet_name]['graph']
+    edges = graphs[sheet_name]['edges']
+    release = graphs[sheet_name]['graph'].release
 
-    # Add new columns for references to database primary keys
-    graph_data.insert(0, 'DbNodeId', None)
-    graph_data.insert(1, 'DbActionNodeId', None)
+    # Add new columns for references to the nodes created for each row
+    graph_data.insert(0, 'DbNode', None)
+    graph_data.insert(1, 'DbActionNode', None)
 
     # Loop through the graph dataframe to create nodes, conditionals and actions
     for idx in graph_data.index:
@@ -132,9 +177,14 @@ def import_data(sheet_name, graphs):
             p = re.compile(r'[\d]{2,2}-')
             is_milestone = p.match(graph_data.loc[idx, DATA_COLUMNS['TITLE']])
             if is_milestone:
-                graph_data.at[idx, 'DbNodeId'] = _create_milestone(graph_data, graphs, idx)
+                graph_data.at[idx, 'DbNode'] = _create_milestone(graph_data, graphs, idx, release)
             else:
-                graph_data.at[idx, 'DbNodeId'] = _create_conditional(graph_data, graphs, idx)
+                graph_data.at[idx, 'DbNode'] = _create_conditional(graph_data, graphs, idx, release, nodes_by_ref)
+
+            for column in ['DbNode', 'DbActionNode']:
+                node = graph_data.at[idx, column]
+                if node is not None:
+                    nodes_by_ref[node.ref] = node
 
         except Exception as e:
             logger.error(f"Error reading row: {idx}")
@@ -154,59 +204,45 @@ def import_data(sheet_name, graphs):
     complete_action.complete = True
 
     complete_node = model.Node()
+    complete_node.release = release
     complete_node.action = complete_action
     complete_node.ref = _get_ref(idx, 'complete')
 
     model.db.session.add(complete_node)
-    model.db.session.commit()
+    nodes_by_ref[complete_node.ref] = complete_node
 
     # Loop through the graph dataframe to create edges
     for idx in graph_data.index:
         try:
             if graph_data.iloc[-1, :].equals(graph_data.loc[idx, :]):
                 logging.info('End node reached')
-                edge_true_to_id = complete_node.id
+                edge_true_to = complete_node
             else:
-                edge_true_to_id = graph_data.iloc[graph_data.index.get_loc(graph_data.loc[idx].name) + 1].loc['DbNodeId']
-
-            edge_true = model.Edge(
-                graph_id=graph.id,
-                from_id=graph_data.at[idx, 'DbNodeId'],
-                to_id=edge_true_to_id,
-                type=True
-            )
+                edge_true_to = graph_data.iloc[graph_data.index.get_loc(graph_data.loc[idx].name) + 1].loc['DbNode']
 
-            model.db.session.add(edge_true)
-            model.db.session.commit()
+            edges.append((graph_data.at[idx, 'DbNode'], edge_true_to, {'type': True}))
 
-            false_edge_to_id = None
+            false_edge_to = None
             is_milestone = re.compile(r'[\d]{2,2}-').match(graph_data.loc[idx, DATA_COLUMNS['TITLE']])
 
             # Add a "False" edge from conditional to the relevant action if no skip destination is given
             if graph_data.loc[:, DATA_COLUMNS['SKIP_TO']].isnull().loc[idx] and not is_milestone:
-                false_edge_to_id = graph_data.at[idx, 'DbNodeActionId']
+                false_edge_to = graph_data.at[idx, 'DbActionNode']
             # if skip destination is "complete", create an edge to the complete action
             elif graph_data.loc[idx, DATA_COLUMNS['SKIP_TO']] == 'complete':
-                false_edge_to_id = complete_node.id
+                false_edge_to = complete_node
             # if skip destination is given, add an edge to its node
             elif not pd.isnull(graph_data.loc[idx, DATA_COLUMNS['SKIP_TO']]):
-                false_edge_to_id = graph_data.at[graph_data.at[idx, DATA_COLUMNS['SKIP_TO']], 'DbNodeId']
-
-            if false_edge_to_id:
-                edge_false = model.Edge(
-                    graph_id=graph.id,
-                    from_id=graph_data.at[idx, 'DbNodeId'],
-                    to_id=false_edge_to_id,
-                    type=False
-                )
-                model.db.session.add(edge_false)
-                model.db.session.commit()
+                false_edge_to = graph_data.at[graph_data.at[idx, DATA_COLUMNS['SKIP_TO']], 'DbNode']
+
+            if false_edge_to is not None:
+                edges.append((graph_data.at[idx, 'DbNode'], false_edge_to, {'type': False}))
         except Exception as e:
             logger.error(f"Error creating edges for {idx}")
             raise e
 
 
-def _create_milestone(graph_data, graphs, idx):
+def _create_milestone(graph_data, graphs, idx, release):
     languages = app.config['LANGUAGES']
 
     milestone_sheet_name = graph_data.loc[idx, DATA_COLUMNS['TITLE']]
@@ -218,27 +254,23 @@ def _create_milestone(graph_data, graphs, idx):
     milestone.data_loader = data_loader
     for lang in languages:
         milestone.translations[lang].title = graphs[milestone_sheet_name]['title'][lang]
-    model.db.session.add(milestone)
-    model.db.session.commit()
 
     node_milestone = model.Node()
+    node_milestone.release = release
     node_milestone.ref = _get_ref(idx, 'milestone')
-    node_milestone.milestone_id = milestone.id
+    node_milestone.milestone = milestone
 
     model.db.session.add(node_milestone)
-    model.db.session.commit()
 
-    return node_milestone.id
+    return node_milestone
 
 
-def _create_conditional(graph_data, graphs, idx):
+def _create_conditional(graph_data, graphs, idx, release, nodes_by_ref):
     default_lang = app.config['DEFAULT_LANGUAGE']
     languages = app.config['LANGUAGES']
 
     conditional = model.Conditional()
     conditional.function = graph_data.loc[idx, DATA_COLUMNS['FUNCTION']]
-    model.db.session.add(conditional)
-    model.db.session.commit()
     for lang in languages:
         if lang == default_lang:
             conditional.translations[lang].title = graph_data.loc[idx, DATA_COLUMNS['TITLE']]
@@ -247,24 +279,24 @@ def _create_conditional(graph_data, graphs, idx):
                 graph_data.loc[idx].get(DATA_COLUMNS['TITLE'] + '::' + lang)
 
     node_conditional = model.Node()
+    node_conditional.release = release
     node_conditional.ref = _get_ref(idx, 'conditional')
-    node_conditional.conditional_id = conditional.id
+    node_conditional.conditional = conditional
     model.db.session.add(node_conditional)
-    model.db.session.commit()
 
     # If Conditional is False, add an action node if no skip destination is given
     if graph_data.loc[:, DATA_COLUMNS['SKIP_TO']].isnull().loc[idx]:
 
         if 'check_not_skipped' in conditional.function:
-            graph_data.loc[idx, :] = _create_check_skips_action(conditional, graph_data.loc[idx, :])
+            graph_data.loc[idx, :] = _create_check_skips_action(conditional, graph_data.loc[idx, :], nodes_by_ref)
 
         skippable = not _map_excel_boolean(graph_data.at[idx, DATA_COLUMNS['UNSKIPPABLE']])
-        _create_action(graph_data, skippable, idx)
+        _create_action(graph_data, skippable, idx, release)
 
-    return node_conditional.id
+    return node_conditional
 
 
-def _create_action(graph_data, skippable, idx):
+def _create_action(graph_data, skippable, idx, release):
     default_lang = app.config['DEFAULT_LANGUAGE']
     languages = app.config['LANGUAGES']
 
@@ -282,22 +314,17 @@ def _create_action(graph_data, skippable, idx):
                 DATA_COLUMNS['ACTION'] + '::' + lang)
             action.translations[lang].html = _markdown_to_html(graph_data.loc[idx].get(
                 DATA_COLUMNS['ACTION_CONTENT'] + '::' + lang))
-    model.db.session.add(action)
-    model.db.session.commit()
 
     _create_resources(graph_data, action, idx)
 
     # Add node to action
     node_action = model.Node()
+    node_action.release = release
     node_action.ref = _get_ref(idx, 'action')
-    node_action.action_id = action.id
+    node_action.action = action
 
     model.db.session.add(node_action)
-    model.db.session.commit()
-
-    graph_data.at[idx, 'DbNodeActionId'] = node_action.id
-    model.db.session.add(node_action)
-    model.db.session.commit()
+    graph_data.at[idx, 'DbActionNode'] = node_action
 
 
 def _create_resources(graph_data, action, idx):
@@ -321,7 +348,6 @@ def _create_resources(graph_data, action, idx):
             if len(resources[lang]) > 0:
                 resource.translations[lang].title = resources[lang][resource_idx].get('title')
         model.db.session.add(resource)
-        model.db.session.commit()
 
         resource_idx = resource_idx + 1
 
@@ -380,7 +406,7 @@ def _is_null_or_false(value):
     return pd.isnull(value) or not bool(value)
 
 
-def _create_check_skips_action(conditional, graph_data):
+def _create_check_skips_action(conditional, graph_data, nodes_by_ref):
 
     if _is_null_or_false(graph_data[DATA_COLUMNS['ACTION']]):
         graph_data[DATA_COLUMNS['ACTION']] = "You have skipped some essential tasks"
@@ -390,8 +416,8 @@ def _create_check_skips_action(conditional, graph_data):
 
         tasks = []
         for node_ref in function_args[0]:
-            node = model.load_node(node_ref=node_ref)
-            tasks.append(node.action.title)
+            require(node_ref in nodes_by_ref, f"check_not_skipped refers to unknown node {node_ref}")
+            tasks.append(nodes_by_ref[node_ref].action.title)
         tasks_list = "\n - ".join(tasks)
 
         graph_data[DATA_COLUMNS['ACTION_CONTENT']] = (
@@ -460,7 +486,7 @@ def validate_pluggable_logic(node, network):
 
 
 def validate_graph(graph_id):
-    graph = model.load_graph(graph_id)
+    graph = model.load_graph_full(graph_id)
     network = graph.to_networkx()
     milestones = []
 
@@ -491,3 +517,20 @@ def validate_graph(graph_id):
 
     for milestone in milestones:
         validate_graph(milestone)
+
+
+def precompute_progress(network):
+    # Progress only depends upon the graph, so store it with each node to save work per request
+    progress_network = Network(network)
+    complete_node = progress_network.get_complete_node()
+
+    for node in network.nodes():
+        if node == complete_node or networkx.has_path(network, node, complete_node):
+            milestones, resolved = progress_network.milestone_path(node)
+            node.distance_to_complete = 0 if node == complete_node else progress_network.longest_path_length(node)
+            node.milestones_to_complete = [milestone.ref for milestone in milestones]
+            node.milestones_to_complete_resolved = resolved
+        else:
+            node.distance_to_complete = None
+            node.milestones_to_complete = None
+            node.milestones_to_complete_resolved = None
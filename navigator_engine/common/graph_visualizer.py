@@ -1,8 +1,23 @@
 import navigator_engine.model as model
+import navigator_engine.common.compiled_graph as compiled_graph
 from dash import dcc
 import dash_cytoscape as cyto
 from dash import html
 from dash.dependencies import Input, Output
+from flask_babel import get_locale
+from typing import Any
+import threading
+import weakref
+
+# Distance in pixels between the levels of the graph, and between nodes within a level
+LEVEL_SPACING = 100
+NODE_SPACING = 150
+
+# Element lists are dropped along with their compiled graph, when a new release is activated
+_graph_elements: weakref.WeakKeyDictionary[
+    compiled_graph.CompiledGraph, dict[str, list[dict[str, Any]]]
+] = weakref.WeakKeyDictionary()
+_graph_elements_lock = threading.Lock()
 
 # Group selectors
 graph_stylesheet = [
@@ -136,85 +151,11 @@ def create_visualizer(flask_app, dash_app) -> None:
             return []
 
         with flask_app.app_context():
-            graph = model.load_graph(graph_id=graph_id)
-            graph_x = graph.to_networkx()
-
-        root_nodes = [n for n, d in graph_x.in_degree() if d == 0]
-        assert len(root_nodes) == 1
-
-        elements = []
-        for n in graph_x.nodes:
-            node = model.load_node(node_id=n.id)
-            if node.action and node.action.complete:
-                node_element = {
-                    'classes': 'red triangle',
-                    'data': {
-                        'id': str(node.id),
-                        'label': f'{node.ref} COMPLETE',
-                        'infobox': f'Action {node.ref} | Node {node.id} | {node.action.title}'
-                    }
-                }
-            elif node.action and not node.action.complete:
-                node_element = {
-                    'classes': 'red triangle',
-                    'data': {
-                        'id': str(node.id),
-                        'label': f'{node.ref}',
-                        'infobox': f'Action {node.ref} | Node {node.id} | {node.action.title}'
-                    }
-                }
-            elif node.milestone:
-                node_element = {
-                    'classes': 'blue square',
-                    'data': {
-                        'id': str(node.id),
-                        'label': f'{node.ref}',
-                        'infobox': f'Milestone {node.ref} | Node {node.id} | {node.milestone.title}'
-                    }
-                }
-            elif node.conditional:
-                node_element = {
-                    'classes': 'green circle',
-                    'data': {
-                        'id': str(node.id),
-                        'label': f'{node.ref}',
-                        'infobox': f'Conditional {node.ref} | Node {node.id} | {node.conditional.title}'
-                    }
-                }
-            else:
-                continue
-
-            elements.append(node_element)
-
-        for e in graph_x.edges:
-            edge = model.load_edge(from_id=e[0].id, to_id=e[1].id)
-            if edge.type:
-                edge_element = {
-                    'classes': 'true',
-                    'data': {
-                        'source': str(e[0].id),
-                        'target': str(e[1].id)
-                    },
-                }
-            elif not edge.type:
-                edge_element = {
-                    'classes': 'false',
-                    'data': {
-                        'source': str(e[0].id),
-                        'target': str(e[1].id)
-                    },
-                }
-            else:
-                continue
-
-            elements.append(edge_element)
+            elements = get_graph_elements(graph_id)
 
         fig = cyto.Cytoscape(
             id='cytoscape-figure',
-            layout={
-                'name': 'breadthfirst',
-                'roots': f'[id = "{root_nodes[0].id}"]'
-            },
+            layout={'name': 'preset'},
             style={
                 'width': '100%',
                 'height': '400px'
@@ -226,3 +167,83 @@ def create_visualizer(flask_app, dash_app) -> None:
         return [fig]
 
     return dash_app
+
+
+def get_graph_elements(graph_id: int) -> list[dict[str, Any]]:
+    # Cached per compiled graph and locale, so must not be modified
+    graph = compiled_graph.load_compiled_graph(graph_id)
+    locale = str(get_locale())
+    elements = _graph_elements.get(graph, {}).get(locale)
+    if elements is None:
+        elements = create_graph_elements(graph)
+        with _graph_elements_lock:
+            _graph_elements.setdefault(graph, {})[locale] = elements
+    return elements
+
+
+def create_graph_elements(graph: compiled_graph.CompiledGraph) -> list[dict[str, Any]]:
+    graph_x = graph.to_networkx()
+    positions = get_preset_positions(graph_x)
+
+    elements = []
+    for node in graph_x.nodes:
+        if node.action and node.action.complete:
+            classes = 'red triangle'
+            label = f'{node.ref} COMPLETE'
+            infobox = f'Action {node.ref} | Node {node.id} | {node.action.title}'
+        elif node.action:
+            classes = 'red triangle'
+            label = f'{node.ref}'
+            infobox = f'Action {node.ref} | Node {node.id} | {node.action.title}'
+        elif node.milestone:
+            classes = 'blue square'
+            label = f'{node.ref}'
+            infobox = f'Milestone {node.ref} | Node {node.id} | {node.milestone.title}'
+        elif node.conditional:
+            classes = 'green circle'
+            label = f'{node.ref}'
+            infobox = f'Conditional {node.ref} | Node {node.id} | {node.conditional.title}'
+        else:
+            continue
+
+        elements.append({
+            'classes': classes,
+            'data': {'id': str(node.id), 'label': label, 'infobox': infobox},
+            'position': positions[node]
+        })
+
+    for from_node, to_node, edge_type in graph_x.edges(data='type'):
+        elements.append({
+            'classes': 'true' if edge_type else 'false',
+            'data': {'source': str(from_node.id), 'target': str(to_node.id)}
+        })
+
+    return elements
+
+
+def get_preset_positions(graph_x) -> dict[Any, dict[str, float]]:
+    # Mirrors cytoscape's breadthfirst layout: each level holds the nodes first reached at that
+    # distance from the root, ordered by the positions of the nodes that lead to them
+    root_nodes = [node for node, in_degree in graph_x.in_degree() if in_degree == 0]
+    assert len(root_nodes) == 1
+
+    levels = [root_nodes]
+    placed = {root_nodes[0]: 0.0}
+    while levels[-1]:
+        level = []
+        for node in levels[-1]:
+            for child in graph_x.successors(node):
+                if child not in placed and child not in level:
+                    level.append(child)
+        level.sort(key=lambda child: (
+            min(placed[parent] for parent in graph_x.predecessors(child) if parent in placed), child.ref
+        ))
+        for index, node in enumerate(level):
+            placed[node] = index - (len(level) - 1) / 2
+        levels.append(level)
+
+    positions = {}
+    for depth, level in enumerate(levels):
+        for node in level:
+            positions[node] = {'x': placed[node] * NODE_SPACING, 'y': depth * LEVEL_SPACING}
+    return positions
@@ -0,0 +1,81 @@
+"""
+A process-wide requests.Session shared by the data loaders, so that
+connections to the ADR are kept alive and reused between requests.
+"""
+from navigator_engine.common import get_config
+from http.cookiejar import DefaultCookiePolicy
+from requests.adapters import HTTPAdapter
+from typing import Any, Optional
+from urllib3.util.retry import Retry
+import requests
+import threading
+
+DEFAULT_HTTP_CONFIG = {
+    'HTTP_POOL_CONNECTIONS': 4,
+    'HTTP_POOL_MAXSIZE': 16,
+    'HTTP_CONNECT_TIMEOUT': 10,
+    'HTTP_READ_TIMEOUT': 60,
+    'HTTP_RETRIES': 3,
+    'HTTP_RETRY_BACKOFF': 0.5
+}
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_http_config(key: str) -> Any:
+    return get_config(key, DEFAULT_HTTP_CONFIG[key])
+
+
+def get_session() -> requests.Session:
+    global _session
+    with _session_lock:
+        if not _session:
+            retries = Retry(
+                total=get_http_config('HTTP_RETRIES'),
+                backoff_factor=get_http_config('HTTP_RETRY_BACKOFF'),
+                status_forcelist=[502, 503, 504],
+                allowed_methods=['GET', 'HEAD'],
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(
+                pool_connections=get_http_config('HTTP_POOL_CONNECTIONS'),
+                pool_maxsize=get_http_config('HTTP_POOL_MAXSIZE'),
+                max_retries=retries
+            )
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            # The session is shared by every user, so cookies must never be stored on it
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            _session = session
+    return _session
+
+
+def close_session() -> None:
+    global _session
+    with _session_lock:
+        if _session:
+            _session.close()
+        _session = None
+
+
+def get_timeout() -> tuple[float, float]:
+    return get_http_config('HTTP_CONNECT_TIMEOUT'), get_http_config('HTTP_READ_TIMEOUT')
+
+
+def get_pool_metrics() -> dict[str, int]:
+    # Pool hits are requests served by a kept-alive connection, misses needed a new connection.
+    # Only counts the host pools currently held by the session.
+    requests_made = 0
+    connections_made = 0
+    if _session:
+        for adapter in set(_session.adapters.values()):
+            for pool in adapter.poolmanager.pools.values():
+                requests_made += pool.num_requests
+                connections_made += pool.num_connections
+    return {
+        'requests': requests_made,
+        'pool_hits': requests_made - connections_made,
+        'pool_misses': connections_made
+    }
@@ -0,0 +1,114 @@
+"""
+Prometheus metrics of where the time of a decision goes, served at /metrics
+when METRICS_ENABLED is configured.
+
+Each data loader is timed by the loader registry, wherever it is called from,
+and each conditional is timed as the DecisionEngine runs it, so new pluggable
+functions are covered without being instrumented themselves.  Stages of the
+request are timed with a Timer.  Nothing is recorded while metrics are
+disabled, leaving only a config lookup per timed call.  The reuse of pooled
+HTTP connections is read from the shared session when scraped.
+"""
+from navigator_engine.common import get_config
+import navigator_engine.common.http_session as http_session
+from typing import Any, Callable, Optional
+import functools
+import inspect
+import time
+
+try:
+    import prometheus_client
+except ImportError:  # Only serving metrics needs prometheus_client
+    prometheus_client = None  # type: ignore
+
+# The label identifying what was timed, for each kind of timer
+TIMER_LABELS = {
+    'stage': 'stage',
+    'conditional': 'function',
+    'data_loader': 'loader'
+}
+# Gauges of the shared HTTP session's connection pools, by key of http_session.get_pool_metrics
+HTTP_POOL_GAUGES = {
+    'requests': "Requests made through the shared HTTP session",
+    'pool_hits': "Requests served by a kept-alive connection",
+    'pool_misses': "Requests that needed a new connection"
+}
+
+MISSING_CLIENT_MESSAGE = "METRICS_ENABLED is set, but prometheus_client is not installed"
+
+REGISTRY: Any = None
+_durations: dict[str, Any] = {}
+_errors: dict[str, Any] = {}
+_downloaded_bytes: Any = None
+
+if prometheus_client:
+    # A registry of our own, so the process' default metrics are only served if wanted
+    REGISTRY = prometheus_client.CollectorRegistry()
+    for kind, label in TIMER_LABELS.items():
+        _durations[kind] = prometheus_client.Histogram(
+            f'navigator_{kind}_seconds', f"Time taken by each {kind}", [label], registry=REGISTRY
+        )
+        _errors[kind] = prometheus_client.Counter(
+            f'navigator_{kind}_errors', f"Errors raised by each {kind}", [label], registry=REGISTRY
+        )
+    _downloaded_bytes = prometheus_client.Counter(
+        'navigator_downloaded_bytes', "Bytes downloaded for each resource type", ['resource_type'], registry=REGISTRY
+    )
+    for key, description in HTTP_POOL_GAUGES.items():
+        prometheus_client.Gauge(f'navigator_http_{key}', description, registry=REGISTRY).set_function(
+            lambda key=key: http_session.get_pool_metrics()[key]
+        )
+
+
+def metrics_enabled() -> bool:
+    return prometheus_client is not None and get_config('METRICS_ENABLED', False)
+
+
+def metrics_client_missing() -> bool:
+    # Metrics enabled without prometheus_client would otherwise never be recorded, unnoticed
+    return prometheus_client is None and get_config('METRICS_ENABLED', False)
+
+
+class Timer():
+    # Times the block if metrics are enabled, counting an error if it raises
+
+    def __init__(self, kind: str, name: str) -> None:
+        self.kind: str = kind
+        self.name: str = name
+        self.started: Optional[float] = None
+
+    def __enter__(self) -> 'Timer':
+        if metrics_enabled():
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        if self.started is None:
+            return
+        _durations[self.kind].labels(self.name).observe(time.perf_counter() - self.started)
+        if exc_type and issubclass(exc_type, Exception):
+            _errors[self.kind].labels(self.name).inc()
+
+
+def instrument_loader(loader: Callable) -> Callable:
+    if inspect.iscoroutinefunction(loader):
+        @functools.wraps(loader)
+        async def timed_async_loader(*args: Any, **kwargs: Any) -> Any:
+            with Timer('data_loader', loader.__name__):
+                return await loader(*args, **kwargs)
+        return timed_async_loader
+
+    @functools.wraps(loader)
+    def timed_loader(*args: Any, **kwargs: Any) -> Any:
+        with Timer('data_loader', loader.__name__):
+            return loader(*args, **kwargs)
+    return timed_loader
+
+
+def count_downloaded_bytes(resource_type: Optional[str], byte_count: int) -> None:
+    if metrics_enabled():
+        _downloaded_bytes.labels(resource_type or 'none').inc(byte_count)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    return prometheus_client.generate_latest(REGISTRY), prometheus_client.CONTENT_TYPE_LATEST
@@ -1,4 +1,5 @@
 import networkx
+from typing import Optional
 from navigator_engine.common import DecisionError
 from navigator_engine import model
 
@@ -11,6 +12,11 @@ class Network():
         self.root_node = None
         self.complete_node = None
         self.milestones = None
+        self.nodes_by_ref = None
+        self.acyclic = None
+        self.topological_nodes = None
+        self.longest_distances = {}
+        self.path_counts = {}
 
     def get_complete_node(self) -> model.Node:
 
@@ -56,8 +62,18 @@ class Network():
 
         return self.milestones
 
-    def all_possible_paths(self, source: model.Node = None,
-                           target: model.Node = None) -> list[list[model.Node]]:
+    def get_node(self, node_ref: str) -> model.Node:
+
+        if self.nodes_by_ref is None:
+            self.nodes_by_ref = {node.ref: node for node in self.networkx.nodes()}
+
+        try:
+            return self.nodes_by_ref[node_ref]
+        except KeyError:
+            raise DecisionError(f"Network has no node {node_ref}")
+
+    def all_possible_paths(self, source: Optional[model.Node] = None,
+                           target: Optional[model.Node] = None) -> list[list[model.Node]]:
 
         if not target:
             target = self.get_complete_node()
@@ -71,11 +87,131 @@ class Network():
             target=target
         ))
 
-    def common_path(self, source: model.Node = None,
-                    target: model.Node = None, all_paths=None) -> tuple[list[model.Node], bool]:
+    def is_acyclic(self) -> bool:
 
-        if not all_paths:
+        if self.acyclic is None:
+            self.acyclic = networkx.is_directed_acyclic_graph(self.networkx)
+
+        return self.acyclic
+
+    def get_topological_order(self) -> list[model.Node]:
+
+        if self.topological_nodes is None:
+
+            try:
+                self.topological_nodes = list(networkx.topological_sort(self.networkx))
+            except networkx.NetworkXUnfeasible:
+                raise DecisionError("Network is not a directed acyclic graph")
+
+        return self.topological_nodes
+
+    def get_longest_distances(self, target: Optional[model.Node] = None) -> dict[model.Node, int]:
+        # Number of edges in the longest path to the target, for every node that can reach it
+
+        if not target:
+            target = self.get_complete_node()
+
+        if target not in self.longest_distances:
+            distances = {target: 0}
+
+            for node in reversed(self.get_topological_order()):
+                child_distances = [
+                    distances[child] for child in self.networkx.successors(node)
+                    if child in distances
+                ]
+                if child_distances and node != target:
+                    distances[node] = max(child_distances) + 1
+
+            self.longest_distances[target] = distances
+
+        return self.longest_distances[target]
+
+    def get_path_counts(self, target: Optional[model.Node] = None) -> dict[model.Node, int]:
+        # Number of paths to the target, capped at 2 as we only need to know if it is unique
+
+        if not target:
+            target = self.get_complete_node()
+
+        if target not in self.path_counts:
+            counts = {target: 1}
+
+            for node in reversed(self.get_topological_order()):
+                child_counts = [
+                    counts[child] for child in self.networkx.successors(node)
+                    if child in counts
+                ]
+                if child_counts and node != target:
+                    counts[node] = min(sum(child_counts), 2)
+
+            self.path_counts[target] = counts
+
+        return self.path_counts[target]
+
+    def longest_path_length(self, source: Optional[model.Node] = None,
+                            target: Optional[model.Node] = None) -> int:
+
+        if not source:
+            source = self.get_root_node()
+
+        if not self.is_acyclic():
             all_paths = self.all_possible_paths(source, target)
+            if not all_paths:
+                raise DecisionError(f"No path from node {source.ref} to the target")
+            return len(max(all_paths, key=len)) - 1
+
+        try:
+            return self.get_longest_distances(target)[source]
+        except KeyError:
+            raise DecisionError(f"No path from node {source.ref} to the target")
+
+    def common_path(self, source: Optional[model.Node] = None,
+                    target: Optional[model.Node] = None) -> tuple[list[model.Node], bool]:
+
+        if not target:
+            target = self.get_complete_node()
+
+        if not source:
+            source = self.get_root_node()
+
+        if not self.is_acyclic():
+            return self.enumerated_common_path(self.all_possible_paths(source, target))
+
+        distances = self.get_longest_distances(target)
+
+        if source == target or source not in distances:
+            return [], True
+
+        path_fully_resolved = self.get_path_counts(target)[source] == 1
+
+        # Nodes on a path from source to target, in topological order
+        topological_order = self.get_topological_order()
+        path_nodes = []
+        reachable = {source}
+        for node in topological_order[topological_order.index(source):]:
+            if node in reachable and node in distances:
+                path_nodes.append(node)
+                reachable.update(self.networkx.successors(node))
+
+        # A node is common to all paths unless an edge jumps over it in topological order
+        positions = {node: position for position, node in enumerate(path_nodes)}
+        jumps = [0] * (len(path_nodes) + 1)
+        for node in path_nodes:
+            for child in self.networkx.successors(node):
+                if child in positions:
+                    jumps[positions[node] + 1] += 1
+                    jumps[positions[child]] -= 1
+
+        common_path = []
+        edges_jumping = 0
+        for position, node in enumerate(path_nodes):
+            edges_jumping += jumps[position]
+            if edges_jumping == 0:
+                common_path.append(node)
+
+        return common_path, path_fully_resolved
+
+    def enumerated_common_path(self, all_paths: list[list[model.Node]]) -> tuple[list[model.Node], bool]:
+        # Only used for graphs containing loops, where the DAG computations don't apply
 
         if not all_paths:
             return [], True
@@ -93,11 +229,13 @@ class Network():
 
     def milestone_path(self, source: model.Node) -> tuple[list[model.Node], bool]:
 
-        milestone_paths = []
+        if not self.is_acyclic():
+            milestone_paths = []
+            for path in self.all_possible_paths(source=source):
+                milestone_paths.append([node for node in path[1:] if getattr(node, 'milestone_id')])
+            return self.enumerated_common_path(milestone_paths)
 
-        for path in self.all_possible_paths(source=source):
-            path = path[1:]
-            milestone_path = [node for node in path if getattr(node, 'milestone_id')]
-            milestone_paths.append(milestone_path)
+        common_path, path_fully_resolved = self.common_path(source=source)
+        milestone_path = [node for node in common_path[1:] if getattr(node, 'milestone_id')]
 
-        return self.common_path(all_paths=milestone_paths)
+        return milestone_path, path_fully_resolved
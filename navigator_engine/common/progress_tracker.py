@@ -129,8 +129,9 @@ class ProgressTracker():
             route = route[:-1]  # If we're on an action don't count it
         current_node = route[-1]
         distance_travelled = len(route) - 1
-        all_possible_paths = self.network.all_possible_paths(current_node)
-        longest_path_length = len(max(all_possible_paths, key=len)) - 1
+        longest_path_length = getattr(current_node, 'distance_to_complete', None)
+        if longest_path_length is None:
+            longest_path_length = self.network.longest_path_length(current_node)
         progress = distance_travelled / (longest_path_length + distance_travelled)
         percentage_progress = int(round(progress * 100))
         return percentage_progress
@@ -140,4 +141,8 @@ class ProgressTracker():
             current_node = self.route[-2]
         else:
             current_node = self.route[-1]
-        return self.network.milestone_path(current_node)
+        milestone_refs = getattr(current_node, 'milestones_to_complete', None)
+        if milestone_refs is None:
+            return self.network.milestone_path(current_node)
+        milestones = [self.network.get_node(ref) for ref in milestone_refs]
+        return milestones, current_node.milestones_to_complete_resolved
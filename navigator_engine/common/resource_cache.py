@@ -0,0 +1,220 @@
+"""
+A cache of the resources downloaded by the data loaders, so that files that
+haven't changed since the last decision aren't downloaded again.
+
+Resources are held on disk, in RESOURCE_CACHE_DIR or a temporary directory,
+and small resources (up to RESOURCE_SPOOL_MAX_BYTES) are also held in
+memory. Both tiers are limited in total size and evict the least recently
+used resources first. Large resources are only ever read and written as
+files, so they never need to be held in memory. Entries are keyed by url and
+auth header, so users can only ever be served resources they have downloaded
+themselves.
+"""
+from navigator_engine.common import get_config
+from collections import OrderedDict
+from typing import IO, Any, Optional
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MEMORY_BYTES = 64 * 1024 * 1024
+DEFAULT_MEMORY_ENTRY_BYTES = 8 * 1024 * 1024
+DEFAULT_DISK_BYTES = 2 * 1024 * 1024 * 1024
+DEFAULT_DIRECTORY = os.path.join(tempfile.gettempdir(), 'navigator-resource-cache')
+# Key of the engine's data holding the futures of resources downloaded ahead of their loaders
+PREFETCH_KEY = 'prefetched-resources'
+
+_resource_cache: Optional['ResourceCache'] = None
+_resource_cache_lock = threading.Lock()
+
+
+class CachedResource():
+
+    def __init__(self, url: str, etag: Optional[str] = None,
+                 last_modified: Optional[str] = None, version: Optional[str] = None) -> None:
+        self.url: str = url
+        self.etag: Optional[str] = etag
+        self.last_modified: Optional[str] = last_modified
+        self.version: Optional[str] = version
+
+    def validation_headers(self) -> dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def metadata(self) -> dict[str, Optional[str]]:
+        return {
+            'url': self.url,
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'version': self.version
+        }
+
+
+class ResourceCache():
+
+    def __init__(self, max_memory_bytes: int = DEFAULT_MEMORY_BYTES, directory: Optional[str] = None,
+                 max_disk_bytes: int = DEFAULT_DISK_BYTES,
+                 max_memory_entry_bytes: int = DEFAULT_MEMORY_ENTRY_BYTES) -> None:
+        self.max_memory_bytes: int = max_memory_bytes
+        self.max_disk_bytes: int = max_disk_bytes
+        # Larger resources are only cached on disk
+        self.max_memory_entry_bytes: int = max_memory_entry_bytes
+        self.directory: str = directory or ''
+        self.memory: OrderedDict[str, tuple[CachedResource, bytes]] = OrderedDict()
+        self.memory_bytes: int = 0
+        self.lock = threading.Lock()
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key(url: str, auth_header: Optional[str]) -> str:
+        return hashlib.sha256(f"{auth_header}\n{url}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[CachedResource]:
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                return self.memory[key][0]
+        if not self.directory:
+            return None
+        try:
+            with open(self._paths(key)[1]) as metadata_file:
+                return CachedResource(**json.load(metadata_file))
+        except (OSError, ValueError):
+            return None
+
+    def open(self, key: str) -> Optional[IO[bytes]]:
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                # BytesIO shares the cached bytes until written to, rather than copying them
+                return io.BytesIO(self.memory[key][1])
+        if not self.directory:
+            return None
+        data_path = self._paths(key)[0]
+        try:
+            # Modification time records when the resource was last used, for LRU eviction
+            os.utime(data_path)
+            return open(data_path, 'rb')
+        except OSError:
+            return None
+
+    def put(self, key: str, resource: CachedResource, resource_file: IO[bytes]) -> None:
+        # Reads the file from its current position, leaving it at the start when done
+        start = resource_file.tell()
+        resource_file.seek(0, io.SEEK_END)
+        size = resource_file.tell() - start
+        resource_file.seek(start)
+        if size <= min(self.max_memory_entry_bytes, self.max_memory_bytes):
+            self._add_to_memory(key, resource, resource_file.read())
+            resource_file.seek(start)
+        if self.directory and size <= self.max_disk_bytes:
+            self._write_to_disk(key, resource, resource_file)
+        resource_file.seek(start)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.memory.clear()
+            self.memory_bytes = 0
+            if self.directory:
+                for filename in os.listdir(self.directory):
+                    os.remove(os.path.join(self.directory, filename))
+
+    def _add_to_memory(self, key: str, resource: CachedResource, content: bytes) -> None:
+        with self.lock:
+            if key in self.memory:
+                self.memory_bytes -= len(self.memory.pop(key)[1])
+            self.memory[key] = (resource, content)
+            self.memory_bytes += len(content)
+            while self.memory_bytes > self.max_memory_bytes:
+                _, (_, evicted_content) = self.memory.popitem(last=False)
+                self.memory_bytes -= len(evicted_content)
+
+    def _paths(self, key: str) -> tuple[str, str]:
+        return os.path.join(self.directory, f"{key}.data"), os.path.join(self.directory, f"{key}.json")
+
+    def _write_to_disk(self, key: str, resource: CachedResource, resource_file: IO[bytes]) -> None:
+        data_path, metadata_path = self._paths(key)
+        # Workers may share the directory, so the temporary file is unique to the process and thread
+        temporary_path = f"{data_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporary_path, 'wb') as data_file:
+                shutil.copyfileobj(resource_file, data_file)
+            os.replace(temporary_path, data_path)
+            with open(temporary_path, 'w') as metadata_file:
+                json.dump(resource.metadata(), metadata_file)
+            os.replace(temporary_path, metadata_path)
+            self._evict_from_disk()
+        except OSError as e:
+            logger.warning(f"Failed to write {resource.url} to the resource cache: {e}")
+
+    def _evict_from_disk(self) -> None:
+        with self.lock:
+            data_files = []
+            for filename in os.listdir(self.directory):
+                if filename.endswith('.data'):
+                    stat = os.stat(os.path.join(self.directory, filename))
+                    data_files.append((stat.st_mtime, stat.st_size, filename[:-len('.data')]))
+            disk_bytes = sum(size for _, size, _ in data_files)
+            for _, size, key in sorted(data_files):
+                if disk_bytes <= self.max_disk_bytes:
+                    break
+                for path in self._paths(key):
+                    if os.path.exists(path):
+                        os.remove(path)
+                disk_bytes -= size
+
+
+def get_resource_cache() -> ResourceCache:
+    global _resource_cache
+    with _resource_cache_lock:
+        if not _resource_cache:
+            _resource_cache = ResourceCache(
+                max_memory_bytes=get_config('RESOURCE_CACHE_MEMORY_BYTES', DEFAULT_MEMORY_BYTES),
+                directory=get_config('RESOURCE_CACHE_DIR') or DEFAULT_DIRECTORY,
+                max_disk_bytes=get_config('RESOURCE_CACHE_DISK_BYTES', DEFAULT_DISK_BYTES),
+                max_memory_entry_bytes=get_config('RESOURCE_SPOOL_MAX_BYTES', DEFAULT_MEMORY_ENTRY_BYTES)
+            )
+    return _resource_cache
+
+
+def clear_resource_cache() -> None:
+    global _resource_cache
+    with _resource_cache_lock:
+        if _resource_cache:
+            _resource_cache.clear()
+        _resource_cache = None
+
+
+def get_resource_version(resource: dict) -> Optional[str]:
+    # CKAN changes a resource's last_modified and hash whenever a new file is uploaded
+    if not resource.get('last_modified') and not resource.get('hash'):
+        return None
+    return f"{resource.get('last_modified')}:{resource.get('hash')}"
+
+
+def release_prefetched_resources(data: Any) -> None:
+    # Downloads the decision never reached are cancelled, or their files closed once finished
+    if not isinstance(data, dict):
+        return
+    for prefetched in data.pop(PREFETCH_KEY, {}).values():
+        if prefetched.done():
+            _close_prefetched(prefetched)
+        elif not prefetched.cancel():
+            prefetched.add_done_callback(_close_prefetched)
+
+
+def _close_prefetched(prefetched: Any) -> None:
+    if not prefetched.cancelled() and prefetched.exception() is None:
+        prefetched.result().close()
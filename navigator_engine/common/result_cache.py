@@ -0,0 +1,119 @@
+"""
+A cache of decide responses, keyed by a fingerprint of everything the
+decision depends upon, so that identical requests (e.g. the UI polling for
+the next action) are answered without processing the graph again.
+
+Responses are held in process, or in Redis if RESULT_CACHE_REDIS_URL is
+configured, and expire after RESULT_CACHE_TTL_SECONDS.
+"""
+from navigator_engine.common import get_config
+from collections import OrderedDict
+from typing import Any, Optional
+import hashlib
+import json
+import logging
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # Only the redis backend needs redis
+    redis = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_MAX_ENTRIES = 1024
+
+_result_cache: Optional['ResultCache'] = None
+_result_cache_lock = threading.Lock()
+
+
+def fingerprint(*parts: Any) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class ResultCache():
+
+    def __init__(self, ttl_seconds: float = DEFAULT_TTL_SECONDS, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        self.ttl_seconds: float = ttl_seconds
+        self.max_entries: int = max_entries
+        self.entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self.lock:
+            if key not in self.entries:
+                return None
+            expires, result = self.entries[key]
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return result
+
+    def set(self, key: str, result: Any) -> None:
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl_seconds, result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+
+class RedisResultCache(ResultCache):
+    # Redis expires entries after the TTL, its maxmemory policy bounds their size
+
+    def __init__(self, url: str, ttl_seconds: float = DEFAULT_TTL_SECONDS, prefix: str = 'navigator-result:') -> None:
+        super().__init__(ttl_seconds)
+        self.prefix: str = prefix
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            result = self.client.get(self.prefix + key)
+        except redis.RedisError as e:
+            logger.warning(f"Failed to read from the result cache: {e}")
+            return None
+        return json.loads(result) if result is not None else None
+
+    def set(self, key: str, result: Any) -> None:
+        try:
+            self.client.set(self.prefix + key, json.dumps(result), ex=max(1, int(self.ttl_seconds)))
+        except redis.RedisError as e:
+            logger.warning(f"Failed to write to the result cache: {e}")
+
+    def clear(self) -> None:
+        try:
+            for key in self.client.scan_iter(f"{self.prefix}*"):
+                self.client.delete(key)
+        except redis.RedisError as e:
+            logger.warning(f"Failed to clear the result cache: {e}")
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    global _result_cache
+    if not get_config('RESULT_CACHE_ENABLED', True):
+        return None
+    with _result_cache_lock:
+        if not _result_cache:
+            ttl_seconds = get_config('RESULT_CACHE_TTL_SECONDS', DEFAULT_TTL_SECONDS)
+            redis_url = get_config('RESULT_CACHE_REDIS_URL')
+            if redis_url and redis:
+                _result_cache = RedisResultCache(redis_url, ttl_seconds)
+            else:
+                if redis_url:
+                    logger.warning("RESULT_CACHE_REDIS_URL is set but redis is not installed, caching in process")
+                _result_cache = ResultCache(ttl_seconds, get_config('RESULT_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+    return _result_cache
+
+
+def clear_result_cache() -> None:
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache:
+            _result_cache.clear()
+        _result_cache = None
@@ -0,0 +1,201 @@
+"""
+Route checkpoints record the outcome of each conditional evaluated while
+making a decision, along with a fingerprint of each data key it read.  The
+next decision for the same dataset replays the recorded outcomes of
+conditionals whose data hasn't changed, only running the conditionals
+downstream of a change.
+
+Replaying stops as soon as a conditional's outcome differs from the one
+recorded, as the route then leaves the recorded route.  Data values are
+assumed not to be changed in place once loaded.  Conditionals that read or
+change the engine's state beyond its data are registered as stateful, and
+are always run.
+"""
+from navigator_engine.common import STATEFUL_CONDITIONALS, get_config, get_pluggable_function_and_args
+from navigator_engine.common.result_cache import ResultCache, fingerprint
+from typing import Any, Hashable, Optional
+import hashlib
+import json
+import threading
+
+DEFAULT_TTL_SECONDS = 3600
+DEFAULT_MAX_ENTRIES = 1024
+MISSING_FINGERPRINT = 'missing'
+
+_route_checkpoints: Optional[ResultCache] = None
+_route_checkpoints_lock = threading.Lock()
+
+
+class ReadTrackingDict(dict):
+    # A copy of the engine's data that records which keys a conditional reads
+
+    def __init__(self, data: dict) -> None:
+        super().__init__(data)
+        self.keys_read: set[Hashable] = set()
+        self.read_all: bool = False
+
+    def __getitem__(self, key: Hashable) -> Any:
+        self.keys_read.add(key)
+        return super().__getitem__(key)
+
+    def __contains__(self, key: object) -> bool:
+        self.keys_read.add(key)  # type: ignore
+        return super().__contains__(key)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        self.keys_read.add(key)
+        return super().get(key, default)
+
+    def __iter__(self):
+        self.read_all = True
+        return super().__iter__()
+
+    def __len__(self) -> int:
+        self.read_all = True
+        return super().__len__()
+
+    def keys(self):
+        self.read_all = True
+        return super().keys()
+
+    def values(self):
+        self.read_all = True
+        return super().values()
+
+    def items(self):
+        self.read_all = True
+        return super().items()
+
+    def copy(self) -> dict:
+        self.read_all = True
+        return super().copy()
+
+
+class CheckpointStep():
+
+    def __init__(self, ref: str, function: str, result: Any, inputs: Optional[dict[Hashable, str]]) -> None:
+        self.ref: str = ref
+        self.function: str = function
+        self.result: Any = result
+        # None if the data read by the conditional isn't known, so it can't be replayed
+        self.inputs: Optional[dict[Hashable, str]] = inputs
+
+
+class RouteCheckpoint():
+
+    def __init__(self, key: Optional[str] = None, steps: list[CheckpointStep] = []) -> None:
+        self.key: Optional[str] = key
+        self.previous_steps: list[CheckpointStep] = steps
+        self.steps: list[CheckpointStep] = []
+        self.replaying: bool = True
+        self.replayed: int = 0
+        self.fingerprints: dict[tuple[Hashable, int], tuple[Any, Optional[str]]] = {}
+
+    def reset(self) -> None:
+        # Deciding again replays the steps recorded by the previous decision
+        if self.steps:
+            self.previous_steps = self.steps
+        self.steps = []
+        self.replaying = True
+        self.replayed = 0
+        self.fingerprints = {}
+
+    def save(self) -> None:
+        route_checkpoints = get_route_checkpoints()
+        if self.key and route_checkpoints:
+            route_checkpoints.set(self.key, self.steps)
+
+    def evaluate(self, node: Any, engine: Any) -> Any:
+        previous = None
+        if self.replaying and len(self.steps) < len(self.previous_steps):
+            previous = self.previous_steps[len(self.steps)]
+            if previous.ref != node.ref or previous.function != node.conditional.function:
+                previous = None
+
+        if previous and previous.inputs is not None and self.inputs_unchanged(previous.inputs, engine.data):
+            self.steps.append(previous)
+            self.replayed += 1
+            return previous.result
+
+        result, inputs = self.run_conditional(node, engine)
+        self.replaying = previous is not None and previous.result == result
+        self.steps.append(CheckpointStep(node.ref, node.conditional.function, result, inputs))
+        return result
+
+    def run_conditional(self, node: Any, engine: Any) -> tuple[Any, Optional[dict[Hashable, str]]]:
+        function_name, _ = get_pluggable_function_and_args(node.conditional.function)
+        data = engine.data
+        if function_name in STATEFUL_CONDITIONALS or not isinstance(data, dict):
+            return engine.run_conditional(node), None
+
+        tracked_data = ReadTrackingDict(data)
+        engine.data = tracked_data
+        try:
+            result = engine.run_conditional(node)
+        finally:
+            engine.data = data
+
+        if tracked_data.read_all:
+            return result, None
+        inputs = {key: self.fingerprint(data, key) for key in tracked_data.keys_read}
+        if None in inputs.values():
+            return result, None
+        return result, inputs  # type: ignore
+
+    def inputs_unchanged(self, inputs: dict[Hashable, str], data: Any) -> bool:
+        if not isinstance(data, dict):
+            return False
+        return all(self.fingerprint(data, key) == value_fingerprint for key, value_fingerprint in inputs.items())
+
+    def fingerprint(self, data: dict, key: Hashable) -> Optional[str]:
+        # Each value is only fingerprinted once per decision, the value is kept so its id isn't reused
+        if key not in data:
+            return MISSING_FINGERPRINT
+        value = data[key]
+        cached = self.fingerprints.get((key, id(value)))
+        if cached and cached[0] is value:
+            return cached[1]
+        value_fingerprint = fingerprint_value(value)
+        self.fingerprints[(key, id(value))] = (value, value_fingerprint)
+        return value_fingerprint
+
+
+def fingerprint_value(value: Any) -> Optional[str]:
+    # None for values that can't be fingerprinted exactly, e.g. dataframes
+    def encode(value: Any) -> Any:
+        if isinstance(value, bytes):
+            return hashlib.sha256(value).hexdigest()
+        raise TypeError(f"Can't fingerprint {type(value).__name__}")
+    try:
+        return hashlib.sha256(json.dumps(value, sort_keys=True, default=encode).encode()).hexdigest()
+    except (TypeError, ValueError):
+        return None
+
+
+def get_route_checkpoints() -> Optional[ResultCache]:
+    global _route_checkpoints
+    if not get_config('ROUTE_CHECKPOINT_ENABLED', False):
+        return None
+    with _route_checkpoints_lock:
+        if not _route_checkpoints:
+            _route_checkpoints = ResultCache(
+                get_config('ROUTE_CHECKPOINT_TTL_SECONDS', DEFAULT_TTL_SECONDS),
+                get_config('ROUTE_CHECKPOINT_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+            )
+    return _route_checkpoints
+
+
+def load_route_checkpoint(*key_parts: Any) -> Optional[RouteCheckpoint]:
+    route_checkpoints = get_route_checkpoints()
+    if not route_checkpoints:
+        return None
+    key = fingerprint(*key_parts)
+    return RouteCheckpoint(key, route_checkpoints.get(key) or [])
+
+
+def clear_route_checkpoints() -> None:
+    global _route_checkpoints
+    with _route_checkpoints_lock:
+        if _route_checkpoints:
+            _route_checkpoints.clear()
+        _route_checkpoints = None
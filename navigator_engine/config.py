@@ -17,6 +17,33 @@ class Config(object):
     DEFAULT_DECISION_GRAPH = f'{base_directory}/../Estimates 22 BDG [Final].xlsx'
     LANGUAGES = os.getenv('NAVIGATOR_LANGUAGES', 'en,fr,pt_PT').split(',')
     DEFAULT_LANGUAGE = os.getenv('NAVIGATOR_DEFAULT_LANGUAGE', 'en')
+    PREFETCH_DATASET_RESOURCES = (os.getenv("PREFETCH_DATASET_RESOURCES", 'true').lower() == 'true')
+    PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", 8))
+    HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", 4))
+    HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 16))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 10))
+    HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 60))
+    HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", 3))
+    HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", 0.5))
+    RESOURCE_CACHE_ENABLED = (os.getenv("RESOURCE_CACHE_ENABLED", 'true').lower() == 'true')
+    RESOURCE_CACHE_DIR = os.getenv("RESOURCE_CACHE_DIR")
+    RESOURCE_CACHE_MEMORY_BYTES = int(os.getenv("RESOURCE_CACHE_MEMORY_BYTES", 64 * 1024 * 1024))
+    RESOURCE_CACHE_DISK_BYTES = int(os.getenv("RESOURCE_CACHE_DISK_BYTES", 2 * 1024 * 1024 * 1024))
+    RESOURCE_SPOOL_MAX_BYTES = int(os.getenv("RESOURCE_SPOOL_MAX_BYTES", 8 * 1024 * 1024))
+    GRAPH_RELEASE_CHECK_SECONDS = float(os.getenv("GRAPH_RELEASE_CHECK_SECONDS", 10))
+    GRAPH_RELEASES_KEPT = int(os.getenv("GRAPH_RELEASES_KEPT", 3))
+    GRAPH_ARTIFACT = os.getenv("GRAPH_ARTIFACT")
+    BATCH_DECIDE_WORKERS = int(os.getenv("BATCH_DECIDE_WORKERS", 8))
+    BATCH_DECIDE_MAX_ITEMS = int(os.getenv("BATCH_DECIDE_MAX_ITEMS", 500))
+    RESULT_CACHE_ENABLED = (os.getenv("RESULT_CACHE_ENABLED", 'true').lower() == 'true')
+    RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", 300))
+    RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 1024))
+    RESULT_CACHE_REDIS_URL = os.getenv("RESULT_CACHE_REDIS_URL")
+    ROUTE_CHECKPOINT_ENABLED = (os.getenv("ROUTE_CHECKPOINT_ENABLED", 'false').lower() == 'true')
+    ROUTE_CHECKPOINT_TTL_SECONDS = float(os.getenv("ROUTE_CHECKPOINT_TTL_SECONDS", 3600))
+    ROUTE_CHECKPOINT_MAX_ENTRIES = int(os.getenv("ROUTE_CHECKPOINT_MAX_ENTRIES", 1024))
+    ACTION_CACHE_MAX_AGE_SECONDS = int(os.getenv("ACTION_CACHE_MAX_AGE_SECONDS", 300))
+    METRICS_ENABLED = (os.getenv("METRICS_ENABLED", 'false').lower() == 'true')
 
 
 class Testing(Config):
@@ -25,6 +52,12 @@ class Testing(Config):
     DEFAULT_DECISION_GRAPH = f'{base_directory}/tests/test_data/Estimates Test Data.xlsx'
     DECISION_GRAPH_FOLDER = f'{base_directory}/tests/test_data/test_graphs/'
     DASH_REROUTE_PREFIX = ''
+    # Recorded HTTP cassettes are replayed in order, so resources aren't fetched concurrently
+    PREFETCH_DATASET_RESOURCES = False
+    # Tests load and activate graph releases, which must be seen straight away
+    GRAPH_RELEASE_CHECK_SECONDS = 0
+    # Run the suite with RESULT_CACHE_ENABLED=true to check responses are the same when cached
+    RESULT_CACHE_ENABLED = (os.getenv("RESULT_CACHE_ENABLED", 'false').lower() == 'true')
 
 
 class Development(Config):
@@ -0,0 +1,20 @@
+from flask import Blueprint, Response, abort
+
+from navigator_engine.common.instrumentation import (
+    MISSING_CLIENT_MESSAGE,
+    metrics_client_missing,
+    metrics_enabled,
+    render_metrics
+)
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics() -> Response:
+    if metrics_client_missing():
+        abort(500, MISSING_CLIENT_MESSAGE)
+    if not metrics_enabled():
+        abort(404, "Metrics are not enabled")
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
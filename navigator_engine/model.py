@@ -8,6 +8,10 @@ from sqlalchemy_i18n import (
     Translatable,
 )
 from sqlalchemy_i18n.manager import BaseTranslationMixin
+from sqlalchemy.schema import CreateColumn
+import datetime
+import logging
+from typing import Optional
 import networkx
 import os
 
@@ -22,6 +26,22 @@ default_language = os.environ.get('NAVIGATOR_DEFAULT_LANGUAGE', 'en')
 
 make_translatable(options={'locales': languages})
 
+logger = logging.getLogger(__name__)
+
+
+class GraphRelease(BaseModel):
+    # Each loaded workbook is a release, only one of which is active at a time
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String)
+    # A hash of the workbook, so loading the workbook of the active release again can be skipped
+    source_hash = db.Column(db.String)
+    created = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    active = db.Column(db.Boolean, default=False, nullable=False)
+    # The root graph of the release, processed first when making a decision
+    graph_id = db.Column(db.Integer)
+    graphs = db.relationship("Graph", back_populates="release")
+    nodes = db.relationship("Node", back_populates="release")
+
 
 class Graph(Translatable, BaseModel):
     __translatable__ = {'locales': languages}
@@ -29,7 +49,9 @@ class Graph(Translatable, BaseModel):
 
     id = db.Column(db.Integer, primary_key=True)
     version = db.Column(db.String, nullable=False)
+    release_id = db.Column(db.Integer, db.ForeignKey('graph_release.id'))
     edges = db.relationship("Edge", back_populates="graph")
+    release = db.relationship("GraphRelease", back_populates="graphs")
 
     def to_networkx(self):
         network = networkx.DiGraph()
@@ -76,15 +98,21 @@ class Milestone(Translatable, BaseModel):
 
 
 class Node(BaseModel):
-    __table_args__ = (db.UniqueConstraint('ref'), )
+    __table_args__ = (db.UniqueConstraint('release_id', 'ref'), )
     id = db.Column(db.Integer, primary_key=True)
     ref = db.Column(db.String, nullable=False)
+    release_id = db.Column(db.Integer, db.ForeignKey('graph_release.id'))
     conditional_id = db.Column(db.Integer, db.ForeignKey('conditional.id'))
     action_id = db.Column(db.Integer, db.ForeignKey('action.id'))
     milestone_id = db.Column(db.Integer, db.ForeignKey('milestone.id'))
+    # Progress tables precomputed when the graph is validated
+    distance_to_complete = db.Column(db.Integer)
+    milestones_to_complete = db.Column(db.JSON)
+    milestones_to_complete_resolved = db.Column(db.Boolean)
     action = db.relationship("Action", back_populates="nodes")
     conditional = db.relationship("Conditional", back_populates="nodes")
     milestone = db.relationship("Milestone", back_populates="nodes")
+    release = db.relationship("GraphRelease", back_populates="nodes")
 
     def __hash__(self):
         return self.id
@@ -157,12 +185,125 @@ def load_graph(graph_id: int) -> Graph:
         first()
 
 
-def load_node(node_id: int = None, node_ref: str = None) -> Node:
+def load_graph_full(graph_id: int, locale: Optional[str] = None) -> Graph:
+    # Eager loads everything needed to process the graph in a fixed number of queries.
+    # If a locale is given, only that locale's translations (and the defaults) are loaded.
+    def translations(model_class):
+        if not locale:
+            return [model_class.translations]
+        return [model_class.translations[lang] for lang in {str(locale), default_language}]
+
+    graph = Graph.query.\
+        options(orm.selectinload(Graph.edges)).\
+        options(*[orm.selectinload(t) for t in translations(Graph)]).\
+        filter_by(id=graph_id).\
+        first()
+
+    if not graph:
+        return graph
+
+    conditional_loader = orm.selectinload(Node.conditional)
+    action_loader = orm.selectinload(Node.action)
+    resource_loader = action_loader.selectinload(Action.resources)
+    milestone_loader = orm.selectinload(Node.milestone)
+    node_ids = {edge.from_id for edge in graph.edges} | {edge.to_id for edge in graph.edges}
+    nodes = Node.query.\
+        options(*[conditional_loader.selectinload(t) for t in translations(Conditional)]).\
+        options(*[action_loader.selectinload(t) for t in translations(Action)]).\
+        options(*[resource_loader.selectinload(t) for t in translations(Resource)]).\
+        options(*[milestone_loader.selectinload(t) for t in translations(Milestone)]).\
+        filter(Node.id.in_(node_ids)).\
+        all()
+
+    # Edges find their nodes in the session identity map, so building the network doesn't
+    # query the db. The graph holds the loaded nodes, so they stay in the identity map.
+    graph.loaded_nodes = nodes
+    return graph
+
+
+def load_node(node_id: Optional[int] = None, node_ref: Optional[str] = None, release_id: Optional[int] = None) -> Node:
+    # Refs are only unique within a release, nodes loaded outside of a release have no release_id
     if node_id:
         return Node.query.filter_by(id=node_id).first()
     else:
-        return Node.query.filter_by(ref=node_ref).first()
+        return Node.query.filter_by(ref=node_ref, release_id=release_id).first()
 
 
 def load_edge(from_id: int, to_id: int) -> Edge:
     return Edge.query.filter_by(from_id=from_id, to_id=to_id).first()
+
+
+def load_active_release() -> GraphRelease:
+    return GraphRelease.query.filter_by(active=True).first()
+
+
+def activate_release(release_id: int) -> None:
+    # Deactivating the old release and activating the new one in a single transaction
+    GraphRelease.query.filter(GraphRelease.id != release_id).update({'active': False})
+    GraphRelease.query.filter_by(id=release_id).update({'active': True})
+    db.session.commit()
+
+
+def migrate_schema() -> None:
+    # create_all only creates missing tables, so columns and constraints added to the graph tables
+    # since the db was created are added in place, leaving the graphs being served untouched
+    db.create_all()
+    inspector = db.inspect(db.engine)
+    preparer = db.engine.dialect.identifier_preparer
+    with db.engine.begin() as connection:
+        for table in (GraphRelease.__table__, Graph.__table__, Node.__table__):
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_ddl = str(CreateColumn(column).compile(dialect=db.engine.dialect))
+                for foreign_key in column.foreign_keys:
+                    column_ddl += f" REFERENCES {preparer.format_table(foreign_key.column.table)} " \
+                        f"({preparer.format_column(foreign_key.column)})"
+                logger.info(f"Adding column {column.name} to {table.name}")
+                connection.execute(db.text(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {column_ddl}"))
+
+        # Refs were unique across all graphs before releases, they are now unique within a release
+        unique_columns = [constraint['column_names'] for constraint in inspector.get_unique_constraints('node')]
+        unique_columns += [index['column_names'] for index in inspector.get_indexes('node') if index['unique']]
+        for constraint in inspector.get_unique_constraints('node'):
+            if constraint['column_names'] != ['ref']:
+                continue
+            if not constraint['name'] or db.engine.dialect.name == 'sqlite':
+                raise RuntimeError("The unique constraint on node refs can't be dropped in place, reset the db")
+            logger.info(f"Dropping constraint {constraint['name']} from node")
+            connection.execute(db.text(f"ALTER TABLE node DROP CONSTRAINT {preparer.quote(constraint['name'])}"))
+        if ['release_id', 'ref'] not in unique_columns:
+            logger.info("Adding unique constraint on release_id and ref to node")
+            connection.execute(db.text("CREATE UNIQUE INDEX node_release_id_ref_key ON node (release_id, ref)"))
+
+
+def prune_releases(keep: int) -> list[int]:
+    # Deletes all but the newest `keep` inactive releases, which are kept for rolling back
+    releases = GraphRelease.query.filter_by(active=False).order_by(GraphRelease.id.desc()).offset(keep).all()
+    release_ids = [release.id for release in releases]
+    for release in releases:
+        _delete_release(release)
+    db.session.commit()
+    return release_ids
+
+
+def _delete_release(release: GraphRelease) -> None:
+    nodes = Node.query.filter_by(release_id=release.id).all()
+    graph_ids = [graph.id for graph in release.graphs]
+    for edge in Edge.query.filter(Edge.graph_id.in_(graph_ids)):
+        db.session.delete(edge)
+    for node in nodes:
+        db.session.delete(node)
+        if node.action:
+            for resource in node.action.resources:
+                db.session.delete(resource)
+        for item in (node.conditional, node.action, node.milestone):
+            if item:
+                db.session.delete(item)
+    # Milestones refer to their graph without a relationship, so are deleted before the graphs
+    db.session.flush()
+    for graph in release.graphs:
+        db.session.delete(graph)
+    db.session.delete(release)
+    db.session.flush()
@@ -0,0 +1,173 @@
+"""
+Async counterparts of the data loaders, run by DecisionEngine.create_async so
+that waiting on the ADR doesn't block the event loop. They require httpx.
+
+The Flask app's routes are synchronous and load data with the sync loaders,
+these are for callers that run their own event loop.
+"""
+from navigator_engine.common import DecisionError, get_config, get_resource_from_dataset, register_async_loader
+from navigator_engine.common.decision_engine import DecisionEngine
+from navigator_engine.common.http_session import get_http_config
+from navigator_engine.common.instrumentation import count_downloaded_bytes
+from navigator_engine.common.resource_cache import (
+    CachedResource,
+    ResourceCache,
+    get_resource_cache,
+    get_resource_version
+)
+import navigator_engine.pluggable_logic.data_loaders as data_loaders
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import IO, Any, Hashable, Optional
+import asyncio
+import json
+import tempfile
+import weakref
+
+try:
+    import httpx
+except ImportError:  # Only the async loaders need httpx
+    httpx = None  # type: ignore
+
+_async_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def get_async_client() -> Any:
+    # Clients are bound to the event loop they are used in, so each loop has its own
+    if httpx is None:
+        raise DecisionError("The async data loaders require httpx to be installed")
+    loop = asyncio.get_running_loop()
+    if loop not in _async_clients:
+        transport = httpx.AsyncHTTPTransport(
+            retries=get_http_config('HTTP_RETRIES'),
+            limits=httpx.Limits(max_connections=get_http_config('HTTP_POOL_MAXSIZE'))
+        )
+        _async_clients[loop] = httpx.AsyncClient(
+            transport=transport,
+            timeout=httpx.Timeout(get_http_config('HTTP_READ_TIMEOUT'), connect=get_http_config('HTTP_CONNECT_TIMEOUT')),
+            # The client is shared by every user, so cookies must never be stored on it
+            cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+        )
+    return _async_clients[loop]
+
+
+async def close_async_client() -> None:
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client:
+        await client.aclose()
+
+
+async def _download(url: str, auth_header: str, version: Optional[str] = None,
+                    resource_type: Optional[str] = None) -> IO[bytes]:
+    cache = get_resource_cache() if get_config('RESOURCE_CACHE_ENABLED', True) else None
+    cache_key = ResourceCache.key(url, auth_header)
+    cached = cache.get(cache_key) if cache else None
+
+    if cache and cached and version and cached.version == version:
+        cached_file = cache.open(cache_key)
+        if cached_file:
+            return cached_file
+
+    resource_file, response = await _stream_to_file(
+        url, auth_header, cached.validation_headers() if cached else {}, resource_type
+    )
+    if cache and response.status_code == 304:
+        cached_file = cache.open(cache_key)
+        if cached_file:
+            return cached_file
+        resource_file, response = await _stream_to_file(url, auth_header, resource_type=resource_type)
+
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    if cache and (etag or last_modified or version):
+        cache.put(cache_key, CachedResource(url, etag, last_modified, version), resource_file)
+    return resource_file
+
+
+async def _stream_to_file(url: str, auth_header: str, headers: dict[str, str] = {},
+                          resource_type: Optional[str] = None) -> tuple[IO[bytes], Any]:
+    resource_file = tempfile.SpooledTemporaryFile(
+        max_size=get_config('RESOURCE_SPOOL_MAX_BYTES', data_loaders.SPOOL_MAX_BYTES)
+    )
+    if auth_header:
+        headers = {"Authorization": auth_header, **headers}
+    async with get_async_client().stream('GET', url, headers=headers) as response:
+        if response.status_code != 304:
+            response.raise_for_status()
+        async for chunk in response.aiter_bytes(data_loaders.CHUNK_BYTES):
+            resource_file.write(chunk)
+    count_downloaded_bytes(resource_type, resource_file.tell())
+    resource_file.seek(0)
+    return resource_file, response
+
+
+async def _open_url(url: str, auth_header: str, data: dict) -> IO[bytes]:
+    prefetched = data.get(data_loaders.PREFETCH_KEY, {}).pop((url, auth_header), None)
+    if prefetched:
+        return await prefetched
+    resource = data_loaders._get_resource(url, data)
+    return await _download(url, auth_header, get_resource_version(resource) if resource else None,
+                           resource.get('resource_type'))
+
+
+async def prefetch_dataset_resources(resource_types: set[str], engine: DecisionEngine) -> dict:
+    # Waits for every download, so the sync loaders run by milestones can take the finished results
+    dataset = engine.data['dataset']['data']['result']
+    auth_header = engine.data['dataset']['auth_header']
+    prefetched = engine.data.setdefault(data_loaders.PREFETCH_KEY, {})
+
+    for resource_type in sorted(resource_types):
+        resource = get_resource_from_dataset(resource_type, dataset)
+        if resource and resource['url'] and (resource['url'], auth_header) not in prefetched:
+            prefetched[(resource['url'], auth_header)] = asyncio.ensure_future(
+                _download(resource['url'], auth_header, get_resource_version(resource), resource_type)
+            )
+
+    await asyncio.gather(*prefetched.values(), return_exceptions=True)
+    return engine.data
+
+
+@register_async_loader
+async def load_url(url: str, auth_header: str, name: str, engine: DecisionEngine) -> dict:
+    data = engine.data
+    with await _open_url(url, auth_header, data) as resource_file:
+        content = resource_file.read()
+    data[name] = {'url': url, 'auth_header': auth_header, 'data': content}
+    return data
+
+
+@register_async_loader
+async def load_json_url(url: str, auth_header: str, name: str, engine: DecisionEngine) -> dict:
+    data = await load_url(url, auth_header, name, engine)
+    data[name]['data'] = json.loads(data[name]['data'])
+    return data
+
+
+@register_async_loader
+async def load_dataset_resource(resource_type: str, engine: DecisionEngine) -> dict:
+    dataset = engine.data['dataset']['data']['result']
+    auth_header = engine.data['dataset']['auth_header']
+    resource = get_resource_from_dataset(resource_type, dataset)
+    if not resource or not resource['url']:
+        engine.data[resource_type] = {
+            'data': None,
+            'auth_header': auth_header,
+            'url': None
+        }
+        return engine.data
+    if 'json' in resource['format'].lower():
+        return await load_json_url(resource['url'], auth_header, resource_type, engine)
+    return await load_url(resource['url'], auth_header, resource_type, engine)
+
+
+@register_async_loader
+async def load_estimates_dataset(url_key: Hashable, auth_header_key: Hashable, engine: DecisionEngine) -> dict:
+    dataset_url = engine.data[url_key]
+    auth_header = engine.data[auth_header_key]
+    engine.data = {data_loaders.PREFETCH_KEY: engine.data.get(data_loaders.PREFETCH_KEY, {})}
+    data = await load_json_url(dataset_url, auth_header, 'dataset', engine)
+    if get_config('PREFETCH_DATASET_RESOURCES'):
+        resource_types = data_loaders.get_required_resource_types(engine.network)
+        resource_types.add('navigator-workflow-state')
+        data = await prefetch_dataset_resources(resource_types, engine)
+    data = await load_dataset_resource('navigator-workflow-state', engine)
+    return data
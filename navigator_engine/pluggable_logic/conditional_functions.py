@@ -1,4 +1,4 @@
-from navigator_engine.common import register_conditional, get_resource_from_dataset
+from navigator_engine.common import register_conditional, register_stateful_conditional, get_resource_from_dataset
 from navigator_engine.common.decision_engine import DecisionEngine
 from typing import Hashable, Union, Any
 import re
@@ -24,7 +24,7 @@ def check_dict_value(key: Hashable, value: Hashable, engine: DecisionEngine) ->
     return engine.data[key] == value
 
 
-@register_conditional
+@register_stateful_conditional
 def check_not_skipped(actions: list[str], engine: DecisionEngine) -> bool:
 
     if type(actions) is not list:
@@ -82,8 +82,6 @@ def check_spectrum_file(indicators: list[str], engine: DecisionEngine) -> bool:
     return _check_validation_file(
         indicators,
         'spectrum-validation-file',
-        'ID',
-        'Status',
         engine
     )
 
@@ -93,30 +91,18 @@ def check_naomi_file(indicators: list[str], engine: DecisionEngine) -> bool:
     return _check_validation_file(
         indicators,
         'naomi-validation-file',
-        'NaomiCheckPermPrimKey',
-        'TrueFalse',
         engine
     )
 
 
-def _check_validation_file(indicators: list[str], data_source: str,
-                           id_column: str, result_column: str, engine: DecisionEngine) -> bool:
+def _check_validation_file(indicators: list[str], data_source: str, engine: DecisionEngine) -> bool:
 
     checklist = engine.data[data_source]['data']
 
     if checklist is None:
         return False
 
-    indicators = [indicator.lower() for indicator in indicators]
-
-    indicator_checks = checklist[checklist[id_column].str.lower().isin(indicators)]
-    indicator_results = indicator_checks[result_column].replace(
-        [0, 'FALSE', 'F', 'false', 'f'],
-        value=False
-    )
-    indicator_results[indicator_results.ne(False)] = True
-
-    return indicator_results.eq(True).all()
+    return all(checklist.get(indicator.lower(), True) for indicator in indicators)
 
 
 def _get_completed_actions(engine: DecisionEngine) -> dict[str, dict[str, Any]]:
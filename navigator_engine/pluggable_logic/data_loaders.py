@@ -1,17 +1,205 @@
 from navigator_engine.common import register_loader
+from navigator_engine.common.http_session import get_session, get_timeout
+from navigator_engine.common.instrumentation import count_downloaded_bytes
+from navigator_engine.common.resource_cache import (
+    PREFETCH_KEY,
+    CachedResource,
+    ResourceCache,
+    get_resource_cache,
+    get_resource_version
+)
+from typing import IO, Any, Callable, Hashable, Optional
 import requests
-from typing import Hashable
 from navigator_engine.common.decision_engine import DecisionEngine
-from navigator_engine.common import get_resource_from_dataset
+from navigator_engine.common.network import Network
+from navigator_engine.common import get_config, get_resource_from_dataset, get_pluggable_function_and_args
+import navigator_engine.common.compiled_graph as compiled_graph
+from concurrent.futures import Future, ThreadPoolExecutor
+from flask import current_app, has_app_context
+import functools
+import threading
 import json
 import logging
 import pandas as pd
+import tempfile
 import zipfile
 import re
-import io
 
 logger = logging.getLogger(__name__)
 
+# Loaders whose first argument is the type of the dataset resource they download
+RESOURCE_LOADERS = ['load_dataset_resource', 'load_csv_from_zipped_resource']
+CHUNK_BYTES = 1024 * 1024
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+# Validation files are loaded as a checklist, built from their id and result columns
+VALIDATION_FILE_COLUMNS = {
+    'spectrum-validation-file': ('ID', 'Status'),
+    'naomi-validation-file': ('NaomiCheckPermPrimKey', 'TrueFalse')
+}
+FAILED_CHECK_VALUES = [0, 'FALSE', 'F', 'false', 'f']
+
+_prefetch_executor: Optional[ThreadPoolExecutor] = None
+_prefetch_executor_lock = threading.Lock()
+
+
+def _download(url: str, auth_header: str, version: Optional[str] = None,
+              resource_type: Optional[str] = None) -> IO[bytes]:
+    cache = get_resource_cache() if get_config('RESOURCE_CACHE_ENABLED', True) else None
+    cache_key = ResourceCache.key(url, auth_header)
+    cached = cache.get(cache_key) if cache else None
+    cached_file = None
+
+    if cache and cached and version and cached.version == version:
+        cached_file = cache.open(cache_key)
+    if cache and cached and not cached_file:
+        resource_file, response = _stream_to_file(url, auth_header, cached.validation_headers(), resource_type)
+        if response.status_code == 304:
+            cached_file = cache.open(cache_key)
+    if cached_file:
+        return cached_file
+    if not cache or not cached or response.status_code == 304:
+        resource_file, response = _stream_to_file(url, auth_header, resource_type=resource_type)
+
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    if cache and (etag or last_modified or version):
+        cache.put(cache_key, CachedResource(url, etag, last_modified, version), resource_file)
+    return resource_file
+
+
+def _stream_to_file(url: str, auth_header: str, headers: dict[str, str] = {},
+                    resource_type: Optional[str] = None) -> tuple[IO[bytes], requests.Response]:
+    # The temporary file only moves from memory to disk once it gets large
+    resource_file = tempfile.SpooledTemporaryFile(max_size=get_config('RESOURCE_SPOOL_MAX_BYTES', SPOOL_MAX_BYTES))
+    headers = {"Authorization": auth_header, **headers}
+    with get_session().get(url, headers=headers, timeout=get_timeout(), stream=True) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(chunk_size=CHUNK_BYTES):
+            resource_file.write(chunk)
+    count_downloaded_bytes(resource_type, resource_file.tell())
+    resource_file.seek(0)
+    return resource_file, response
+
+
+def _open_url(url: str, auth_header: str, data: dict) -> IO[bytes]:
+    prefetched: Optional[Future] = data.get(PREFETCH_KEY, {}).pop((url, auth_header), None)
+    if prefetched:
+        return prefetched.result()
+    resource = _get_resource(url, data)
+    return _download(url, auth_header, get_resource_version(resource) if resource else None,
+                     resource.get('resource_type'))
+
+
+def _get_resource(url: str, data: dict) -> dict:
+    # The dataset's resource with the given url, if any
+    dataset = data.get('dataset', {}).get('data')
+    if not isinstance(dataset, dict):
+        return {}
+    for resource in dataset.get('result', {}).get('resources', []):
+        if resource.get('url') == url:
+            return resource
+    return {}
+
+
+def _get_prefetch_executor() -> ThreadPoolExecutor:
+    global _prefetch_executor
+    with _prefetch_executor_lock:
+        if not _prefetch_executor:
+            _prefetch_executor = ThreadPoolExecutor(
+                max_workers=get_config('PREFETCH_WORKERS', 8),
+                thread_name_prefix='prefetch'
+            )
+    return _prefetch_executor
+
+
+def _in_app_context(function: Callable) -> Callable:
+    # Prefetch threads have no app context of their own, so would only see config defaults
+    if not has_app_context():
+        return function
+    app = current_app._get_current_object()  # type: ignore
+
+    @functools.wraps(function)
+    def in_app_context(*args: Any, **kwargs: Any) -> Any:
+        with app.app_context():
+            return function(*args, **kwargs)
+    return in_app_context
+
+
+def get_required_resource_types(network: Network, checked_graphs: Optional[set[int]] = None) -> set[str]:
+    # Resource types downloaded by the milestone data loaders of the network and its sub-graphs
+    if checked_graphs is None:
+        checked_graphs = set()
+    resource_types = set()
+
+    for node in network.get_milestones():
+        if node.milestone.data_loader:
+            function_name, function_args = get_pluggable_function_and_args(node.milestone.data_loader)
+            if function_name in RESOURCE_LOADERS:
+                resource_types.add(function_args[0])
+        graph_id = node.milestone.graph_id
+        if graph_id not in checked_graphs:
+            checked_graphs.add(graph_id)
+            graph = compiled_graph.load_compiled_graph(graph_id)
+            resource_types |= get_required_resource_types(Network(graph.to_networkx()), checked_graphs)
+
+    return resource_types
+
+
+def prefetch_dataset_resources(resource_types: set[str], engine: DecisionEngine) -> dict:
+    dataset = engine.data['dataset']['data']['result']
+    auth_header = engine.data['dataset']['auth_header']
+    prefetched = engine.data.setdefault(PREFETCH_KEY, {})
+    executor = _get_prefetch_executor()
+    download = _in_app_context(_download)
+
+    for resource_type in sorted(resource_types):
+        resource = get_resource_from_dataset(resource_type, dataset)
+        if resource and resource['url'] and (resource['url'], auth_header) not in prefetched:
+            prefetched[(resource['url'], auth_header)] = executor.submit(
+                download,
+                resource['url'],
+                auth_header,
+                get_resource_version(resource),
+                resource_type
+            )
+
+    return engine.data
+
+
+def get_source_fingerprint(data_loader: str, source_data: dict) -> Any:
+    # Identifies the data a loader will load, or None if it can't be told apart from newer data.
+    # The estimates dataset is downloaded to read the versions of its resources, and left
+    # prefetched in source_data for the loader, so callers pass a copy of their data. Other
+    # loaders are assumed to be determined by their arguments and the source data.
+    function_name, function_args = get_pluggable_function_and_args(data_loader)
+    if function_name != 'load_estimates_dataset':
+        return [data_loader, source_data]
+
+    url = source_data[function_args[0]]
+    auth_header = source_data[function_args[1]]
+    resource_file = _download(url, auth_header)
+    dataset = json.load(resource_file).get('result', {})
+    resource_file.seek(0)
+    prefetched: Future = Future()
+    prefetched.set_result(resource_file)
+    source_data.setdefault(PREFETCH_KEY, {})[(url, auth_header)] = prefetched
+
+    resource_versions = [
+        (resource.get('id'), resource.get('url'), get_resource_version(resource))
+        for resource in dataset.get('resources', [])
+    ]
+    if any(version is None for _, _, version in resource_versions):
+        return None
+    return [data_loader, url, auth_header, dataset.get('metadata_modified'), resource_versions]
+
+
+def get_checklist(dataframe: pd.DataFrame, id_column: str, result_column: str) -> dict[str, bool]:
+    # Maps each lower cased check id to whether the check passed, for every row of the validation file
+    checklist: dict[str, bool] = {}
+    for check_id, result in zip(dataframe[id_column].astype(str).str.lower(), dataframe[result_column]):
+        checklist[check_id] = checklist.get(check_id, True) and result not in FAILED_CHECK_VALUES
+    return checklist
+
 
 @register_loader
 def load_empty(engine: DecisionEngine) -> dict:
@@ -31,10 +219,9 @@ def load_dict_value(key: Hashable, engine: DecisionEngine) -> Hashable:
 @register_loader
 def load_url(url: str, auth_header: str, name: str, engine: DecisionEngine) -> dict:
     data = engine.data
-    headers = {"Authorization": auth_header}
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    data[name] = {'url': url, 'auth_header': auth_header, 'data': response.content}
+    with _open_url(url, auth_header, data) as resource_file:
+        content = resource_file.read()
+    data[name] = {'url': url, 'auth_header': auth_header, 'data': content}
     return data
 
 
@@ -78,8 +265,12 @@ def load_dataset_resource(resource_type: str, engine: DecisionEngine) -> dict:
 def load_estimates_dataset(url_key: Hashable, auth_header_key: Hashable, engine: DecisionEngine) -> dict:
     dataset_url = engine.data[url_key]
     auth_header = engine.data[auth_header_key]
-    engine.data = {}
+    engine.data = {PREFETCH_KEY: engine.data.get(PREFETCH_KEY, {})}
     data = load_json_url(dataset_url, auth_header, 'dataset', engine)
+    if get_config('PREFETCH_DATASET_RESOURCES'):
+        resource_types = get_required_resource_types(engine.network)
+        resource_types.add('navigator-workflow-state')
+        data = prefetch_dataset_resources(resource_types, engine)
     data = load_dataset_resource(
         'navigator-workflow-state',
         engine
@@ -90,43 +281,46 @@ def load_estimates_dataset(url_key: Hashable, auth_header_key: Hashable, engine:
 @register_loader
 def load_csv_from_zipped_resource(resource_type: str, csv_filename_regex: str,
                                   name: str, engine: DecisionEngine) -> dict:
-    data = load_dataset_resource(resource_type, engine)
-    auth_header = data[resource_type]['auth_header']
-    if not data[resource_type]['data']:
+    data = engine.data
+    dataset = data['dataset']['data']['result']
+    auth_header = data['dataset']['auth_header']
+    resource = get_resource_from_dataset(resource_type, dataset)
+    url = resource.get('url')
+    if not url:
         data[name] = {
             'data': None,
             'auth_header': auth_header,
-            'url': data[resource_type]['url']
+            'url': None
         }
         return data
 
     filename_re = re.compile(csv_filename_regex, flags=re.IGNORECASE)
-    matching_filenames = []
+    columns = VALIDATION_FILE_COLUMNS.get(name)
 
     try:
-        with zipfile.ZipFile(io.BytesIO(data[resource_type]['data'])) as zip_file:
-            for filename in zip_file.namelist():
-                if filename_re.match(filename):
-                    matching_filenames.append(filename)
+        with _open_url(url, auth_header, data) as resource_file, zipfile.ZipFile(resource_file) as zip_file:
+            matching_filenames = [filename for filename in zip_file.namelist() if filename_re.match(filename)]
             if len(matching_filenames) > 1:
                 raise ValueError(
                     f"Multiple files match filename regex {csv_filename_regex}"
-                    f"in: {data[resource_type]['url']}"
+                    f"in: {url}"
                 )
             elif len(matching_filenames) == 0:
                 dataframe = None
             else:
                 with zip_file.open(matching_filenames[0], 'r') as csv_file:
-                    dataframe = pd.read_csv(csv_file)
+                    dataframe = pd.read_csv(
+                        csv_file,
+                        usecols=(lambda column: column in columns) if columns else None
+                    )
     except zipfile.BadZipFile:
         raise zipfile.BadZipFile(
-            f"Bad zip file for {resource_type}: {data[resource_type]['url']}"
+            f"Bad zip file for {resource_type}: {url}"
         )
 
     data[name] = {
-        'data': dataframe,
+        'data': get_checklist(dataframe, *columns) if columns and dataframe is not None else dataframe,
         'auth_header': auth_header,
-        'url': data[resource_type]['url']
+        'url': url
     }
-    del data[resource_type]
     return data
@@ -0,0 +1,73 @@
+"""
+Times decisions on synthetic chains of conditionals of increasing length,
+comparing the DecisionEngine's loop against the recursive traversal it
+replaced.
+
+    python -m navigator_engine.tests.benchmarks.benchmark_decision_engine
+"""
+from navigator_engine.common.decision_engine import DecisionEngine
+import navigator_engine.model as model
+import navigator_engine.pluggable_logic  # noqa: F401 registers the conditional functions
+import networkx
+import sys
+import threading
+import timeit
+
+CHAIN_LENGTHS = [1000, 2500, 5000, 10000]
+REPEATS = 3
+# The recursive traversal needs a stack deep enough for the longest chain
+RECURSION_LIMIT = 100000
+THREAD_STACK_BYTES = 512 * 1024 * 1024
+
+
+class ChainGraph():
+
+    def __init__(self, length):
+        nodes = [
+            model.Node(id=i, ref=f"chain-{i}-c", conditional_id=i,
+                       conditional=model.Conditional(id=i, function='return_true()'))
+            for i in range(1, length)
+        ]
+        nodes.append(model.Node(id=length, ref=f"chain-{length}-a", action_id=1,
+                                action=model.Action(id=1, title='Complete', complete=True)))
+        self.networkx = networkx.DiGraph()
+        self.networkx.add_edges_from(zip(nodes, nodes[1:]), type=True)
+        networkx.freeze(self.networkx)
+
+    def to_networkx(self):
+        return self.networkx
+
+
+class RecursiveDecisionEngine(DecisionEngine):
+    # How the DecisionEngine traversed graphs before process_node became a loop
+
+    def process_node(self, node):
+        self.progress.add_node(node)
+        next_node = self.visit_node_recursive(node)
+        return node if next_node is node else self.process_node(next_node)
+
+    def visit_node_recursive(self, node):
+        if getattr(node, 'conditional_id'):
+            return self.process_conditional(node)
+        return self.process_action(node)
+
+
+def time_decision(engine_class, graph):
+    return min(timeit.repeat(lambda: engine_class(graph, {}).decide(), number=1, repeat=REPEATS))
+
+
+def run():
+    print(f"{'nodes':>8} {'recursive (s)':>14} {'loop (s)':>9} {'speed up':>9}")
+    for length in CHAIN_LENGTHS:
+        graph = ChainGraph(length)
+        recursive = time_decision(RecursiveDecisionEngine, graph)
+        loop = time_decision(DecisionEngine, graph)
+        print(f"{length:>8} {recursive:>14.3f} {loop:>9.3f} {recursive / loop:>8.1f}x")
+
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(RECURSION_LIMIT)
+    threading.stack_size(THREAD_STACK_BYTES)
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
@@ -0,0 +1,52 @@
+"""
+Times parsing graph workbooks of increasing sheet count, comparing
+read_workbook against reading each sheet's header and data separately.
+
+    python -m navigator_engine.tests.benchmarks.benchmark_graph_loader
+"""
+from navigator_engine.common.graph_loader import read_workbook
+import openpyxl
+import os
+import pandas as pd
+import re
+import tempfile
+import timeit
+
+TEMPLATE_WORKBOOK = os.path.join(os.path.dirname(__file__), '..', 'test_data', 'Simple Development BDG.xlsx')
+SHEET_COUNTS = [4, 8, 16, 32, 64]
+REPEATS = 3
+
+
+def create_workbook(sheet_count, path):
+    workbook = openpyxl.load_workbook(TEMPLATE_WORKBOOK)
+    template_sheets = [sheet for sheet in workbook.worksheets if re.match(r'[\d]{2,2}-', sheet.title)]
+    for index in range(len(template_sheets), sheet_count):
+        copy = workbook.copy_worksheet(template_sheets[index % len(template_sheets)])
+        copy.title = f"{index:02d}-Copy"
+    workbook.save(path)
+
+
+def read_workbook_per_sheet(graph_config_file):
+    # How the graph loader read workbooks before read_workbook
+    xl = pd.ExcelFile(graph_config_file)
+    workbook = {}
+    for sheet_name in filter(lambda x: re.match(r'[\d]{2,2}-', x), xl.sheet_names):
+        graph_header = pd.read_excel(graph_config_file, sheet_name=sheet_name, header=0).loc[0]
+        graph_data = pd.read_excel(graph_config_file, sheet_name=sheet_name, header=3, index_col=0, dtype=str)
+        workbook[sheet_name] = (graph_header, graph_data)
+    return workbook
+
+
+def run():
+    print(f"{'sheets':>8} {'per sheet (s)':>14} {'single pass (s)':>16} {'speed up':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for sheet_count in SHEET_COUNTS:
+            path = os.path.join(directory, f"benchmark-{sheet_count}.xlsx")
+            create_workbook(sheet_count, path)
+            per_sheet = min(timeit.repeat(lambda: read_workbook_per_sheet(path), number=1, repeat=REPEATS))
+            single_pass = min(timeit.repeat(lambda: read_workbook(path), number=1, repeat=REPEATS))
+            print(f"{sheet_count:>8} {per_sheet:>14.3f} {single_pass:>16.3f} {per_sheet / single_pass:>8.1f}x")
+
+
+if __name__ == '__main__':
+    run()
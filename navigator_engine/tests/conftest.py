@@ -89,6 +89,7 @@ def get_mock_engine():
     engine.skip_requests = []
     engine.progress = get_mock_tracker()
     engine.stop_action = None
+    engine.checkpoint = None
     return engine
 
 
@@ -111,6 +112,7 @@ def get_mock_network():
     network.milestones = None
     network.root_node = None
     network.complete_node = None
+    network.nodes_by_ref = None
     network.networkx = mock.Mock(spec=DiGraph)
     return network
 
@@ -0,0 +1,164 @@
+import json
+import pytest
+import navigator_engine.model as model
+from navigator_engine.app import create_app
+from navigator_engine.config import Testing
+from concurrent.futures import ThreadPoolExecutor
+import navigator_engine.common.compiled_graph as compiled_graph
+import navigator_engine.common.route_checkpoint as route_checkpoint
+from navigator_engine.common.decision_engine import DecisionEngine
+from navigator_engine.common import CONDITIONAL_FUNCTIONS, DecisionError
+import navigator_engine.tests.util as test_util
+from navigator_engine.tests.util import QueryCounter
+
+
+@pytest.mark.usefixtures('with_app_context')
+def test_load_compiled_graph_is_cached(mocker):
+    test_util.create_demo_data()
+    load_graph = mocker.spy(model, 'load_graph_full')
+    graph = compiled_graph.load_compiled_graph(2)
+    assert compiled_graph.load_compiled_graph(2) is graph
+    load_graph.assert_called_once_with(2)
+
+
+@pytest.mark.usefixtures('with_app_context')
+def test_clear_graph_cache(mocker):
+    test_util.create_demo_data()
+    mocker.patch.dict(test_util.app.config, {'ROUTE_CHECKPOINT_ENABLED': True})
+    graph = compiled_graph.load_compiled_graph(1)
+    checkpoint = route_checkpoint.load_route_checkpoint(graph.key, 'https://example.ckan', None)
+    checkpoint.steps = ['step']
+    checkpoint.save()
+
+    compiled_graph.clear_graph_cache()
+    assert compiled_graph.load_compiled_graph(1) is not graph
+    assert compiled_graph.load_compiled_graph(1).key != graph.key
+    assert route_checkpoint.load_route_checkpoint(graph.key, 'https://example.ckan', None).previous_steps == []
+
+
+@pytest.mark.usefixtures('with_app_context')
+def test_load_compiled_graph_not_found():
+    test_util.create_demo_data()
+    with pytest.raises(DecisionError, match="Graph 99 not found"):
+        compiled_graph.load_compiled_graph(99)
+
+
+@pytest.mark.usefixtures('with_app_context')
+def test_compiled_graph_payloads():
+    test_util.create_demo_data()
+    graph = compiled_graph.load_compiled_graph(1)
+    nodes = {node.ref: node for node in graph.to_networkx().nodes()}
+    assert graph.title == "Upload ADR Data"
+    assert nodes['tst-1-0-c'].conditional.function == "dict_value('1')"
+    assert nodes['tst-1-0-c'].conditional.title == "Check if GeoJSON uploaded"
+    assert nodes['tst-1-0-c'].conditional.logic == (CONDITIONAL_FUNCTIONS['dict_value'], ('1',))
+    assert nodes['tst-1-5-a'].action.to_dict() == {
+        'title': 'Validate your geographic data',
+        'displayHTML': 'Validate geographic data html',
+        'skippable': True,
+        'terminus': False,
+        'helpURLs': [
+            {'label': 'The AIDS Data Repository', 'url': 'https://adr.unaids.org'},
+            {'label': 'HIV Tools', 'url': 'https://hivtools.unaids.org'}
+        ]
+    }
+
+
+@pytest.mark.usefixtures('with_app_context')
+def test_get_compiled_node(mocker):
+    test_util.create_demo_data()
+    # Only the active release is checked for, at most every GRAPH_RELEASE_CHECK_SECONDS
+    mocker.patch.dict(test_util.app.config, {'GRAPH_RELEASE_CHECK_SECONDS': 60})
+    node = compiled_graph.get_compiled_node('tst-1-5-a')
+    assert node.action.title == 'Validate your geographic data'
+    assert compiled_graph.get_compiled_node('tst-1-0-c').conditional.function == "dict_value('1')"
+
+    with QueryCounter() as counter:
+        assert compiled_graph.get_compiled_node('tst-1-5-a') is node
+        assert compiled_graph.get_compiled_node('wrong-ref') is None
+    assert counter.count == 0
+
+    compiled_graph.clear_graph_cache()
+    assert compiled_graph.get_compiled_node('tst-1-5-a') is not node
+
+
+@pytest.mark.usefixtures('with_app_context')
+def test_warm_cache_decision_makes_no_queries():
+    test_util.create_demo_data()
+    data = {'1': True, '2': True, 'data': {'1': True, '2': True, '3': True, '4': True}, 'naomi': {'1': True}}
+    expected_result = DecisionEngine(model.load_graph(2), data.copy()).decide()
+    DecisionEngine(compiled_graph.load_compiled_graph(2), data.copy()).decide()
+
+    with QueryCounter() as counter:
+        engine = DecisionEngine(compiled_graph.load_compiled_graph(2), data.copy())
+        result = engine.decide()
+        engine.progress.report_progress()
+
+    assert counter.count == 0
+    assert result['id'] == expected_result['id'] == 'tst-2-5-a'
+    assert result['content'] == expected_result['content']
+
+
+@pytest.mark.usefixtures('with_app_context')
+def test_milestones_processed_by_one_engine(mocker):
+    test_util.create_demo_data()
+    data = {'1': True, '2': True, 'data': {'1': True, '2': True, '3': True, '4': True}, 'naomi': {'1': True}}
+    engine_init = mocker.spy(DecisionEngine, '__init__')
+
+    engine = DecisionEngine(compiled_graph.load_compiled_graph(2), data.copy())
+    result = engine.decide()
+    report = engine.progress.report_progress()
+
+    assert engine_init.call_count == 1
+    assert engine.frames == []
+    assert result['id'] == 'tst-2-5-a'
+    assert [milestone['completed'] for milestone in report['milestones']] == [True, True]
+    assert compiled_graph.load_compiled_network(1) is compiled_graph.load_compiled_network(1)
+
+
+@pytest.mark.usefixtures('with_app_context')
+def test_graph_artifact_decision_makes_no_queries(tmp_path):
+    test_util.create_demo_data()
+    data = {'1': True, '2': True, 'data': {'1': True, '2': True, '3': True, '4': True}, 'naomi': {'1': True}}
+    expected_result = DecisionEngine(compiled_graph.load_compiled_graph(2), data.copy()).decide()
+    artifact = compiled_graph.export_graph_artifact(str(tmp_path / 'graphs.pickle'))
+    assert set(artifact['graphs'].keys()) == {1, 2, 3}
+    compiled_graph.clear_graph_cache()
+
+    with QueryCounter() as counter:
+        compiled_graph.load_graph_artifact(str(tmp_path / 'graphs.pickle'))
+        graph = compiled_graph.load_compiled_graph(compiled_graph.get_active_graph_id())
+        result = DecisionEngine(compiled_graph.load_compiled_graph(2), data.copy()).decide()
+
+    assert counter.count == 0
+    assert graph.id == 1
+    assert result['id'] == expected_result['id']
+    assert result['content'] == expected_result['content']
+    compiled_graph.clear_graph_cache()
+
+
+@pytest.mark.usefixtures('with_app_context')
+def test_graph_artifact_wrong_format(tmp_path, mocker):
+    test_util.create_demo_data()
+    mocker.patch.object(compiled_graph, 'ARTIFACT_FORMAT', 0)
+    compiled_graph.export_graph_artifact(str(tmp_path / 'graphs.pickle'))
+    mocker.patch.object(compiled_graph, 'ARTIFACT_FORMAT', 1)
+    with pytest.raises(DecisionError, match="is not in format 1"):
+        compiled_graph.load_graph_artifact(str(tmp_path / 'graphs.pickle'))
+
+
+@pytest.mark.usefixtures('with_app_context')
+def test_create_app_renders_artifact_actions(tmp_path):
+    test_util.create_demo_data()
+    compiled_graph.export_graph_artifact(str(tmp_path / 'graphs.pickle'))
+    compiled_graph.clear_graph_cache()
+
+    class ArtifactTesting(Testing):
+        GRAPH_ARTIFACT = str(tmp_path / 'graphs.pickle')
+
+    # Apps are created outside of any app context
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(create_app, ArtifactTesting).result()
+    payloads = compiled_graph._action_payloads[None]['tst-1-5-a']
+    assert json.loads(payloads['en'][1])['id'] == 'tst-1-5-a'
+    compiled_graph.clear_graph_cache()
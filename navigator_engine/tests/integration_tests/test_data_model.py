@@ -40,3 +40,68 @@ def test_db_graph_storage():
 
     # Assert that the updated title was stored in the DB
     assert new_title == root.conditional.title
+
+
+def create_chain_graph(length):
+    graph = model.Graph(title="Chain", version="0.1", description="A chain of conditionals")
+    complete_node = model.Node(action=model.Action(
+        title="Complete",
+        html="Chain complete",
+        complete=True
+    ), ref=f'chain-{length}-complete')
+    previous_node = model.Node(milestone=model.Milestone(
+        title="Chain Milestone",
+        data_loader="load_empty()"
+    ), ref=f'chain-{length}-m')
+    edges = []
+
+    for i in range(length):
+        conditional_node = model.Node(conditional=model.Conditional(
+            title=f"Conditional {i}",
+            function="return_true()"
+        ), ref=f'chain-{length}-{i}-c')
+        action_node = model.Node(action=model.Action(
+            title=f"Action {i}",
+            html=f"Action {i} HTML",
+            resources=[model.Resource(title=f"Resource {i}", url="https://example.com")]
+        ), ref=f'chain-{length}-{i}-a')
+        edges.append(model.Edge(from_node=previous_node, to_node=conditional_node, type=True))
+        edges.append(model.Edge(from_node=conditional_node, to_node=action_node, type=False))
+        previous_node = conditional_node
+
+    edges.append(model.Edge(from_node=previous_node, to_node=complete_node, type=True))
+    graph.edges = edges
+    model.db.session.add(graph)
+    model.db.session.commit()
+    return graph.id
+
+
+def count_full_graph_load_queries(graph_id, locale=None):
+    model.db.session.expunge_all()
+    with test_util.QueryCounter() as counter:
+        graph = model.load_graph_full(graph_id, locale)
+        network = graph.to_networkx()
+        for node in network.nodes():
+            for content in [node.conditional, node.action, node.milestone]:
+                if content:
+                    for lang in [locale] if locale else model.languages:
+                        content.translations[lang].title
+            if node.action:
+                for resource in node.action.resources:
+                    for lang in [locale] if locale else model.languages:
+                        resource.translations[lang].title
+    return counter.count
+
+
+@pytest.mark.parametrize('locale', [None, 'fr'])
+@pytest.mark.usefixtures('with_app_context')
+def test_load_graph_full_query_count_is_bounded(locale):
+    test_util.create_demo_data()
+    small_graph_id = create_chain_graph(2)
+    large_graph_id = create_chain_graph(25)
+
+    small_graph_queries = count_full_graph_load_queries(small_graph_id, locale)
+    large_graph_queries = count_full_graph_load_queries(large_graph_id, locale)
+
+    assert small_graph_queries == large_graph_queries
+    assert large_graph_queries <= 17
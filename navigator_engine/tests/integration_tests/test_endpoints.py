@@ -1,6 +1,14 @@
 import json
 import pytest
 import navigator_engine.tests.util as test_util
+import navigator_engine.api as api
+import navigator_engine.common.compiled_graph as compiled_graph
+import navigator_engine.common.result_cache as result_cache
+import navigator_engine.common.route_checkpoint as route_checkpoint
+from navigator_engine.common.decision_engine import DecisionEngine
+from navigator_engine.common.resource_cache import PREFETCH_KEY
+from concurrent.futures import Future
+from flask import jsonify
 from unittest.mock import ANY
 """
 Endpoint tests use the client fixture, which requires the db, meaning they should
@@ -195,6 +203,57 @@ def test_action_bad_node_id(client, mocker):
     assert "Please specify a valid action ID." in response.json['message']
 
 
+@pytest.mark.usefixtures('with_app_context')
+def test_action_revalidated_with_etag(client, mocker):
+    setup_endpoint_test(mocker)
+    response = client.get("/api/action/tst-1-5-a")
+    assert response.status_code == 200
+    assert response.headers['ETag']
+    assert response.cache_control.public
+    assert response.cache_control.max_age == 300
+    assert 'Accept-Language' in response.vary
+
+    response = client.get("/api/action/tst-1-5-a", headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+    assert response.data == b''
+
+
+@pytest.mark.usefixtures('with_app_context')
+def test_action_payload_per_locale(client, mocker):
+    # The demo data has no French translations, so falls back to English
+    setup_endpoint_test(mocker)
+    english = client.get("/api/action/tst-1-5-a", headers={'Accept-Language': 'en'})
+    french = client.get("/api/action/tst-1-5-a", headers={'Accept-Language': 'fr'})
+    assert english.headers['ETag'] != french.headers['ETag']
+    assert english.json == french.json
+
+
+@pytest.mark.parametrize('prettyprint', [False, True])
+@pytest.mark.usefixtures('with_app_context')
+def test_action_payload_matches_jsonify(client, mocker, prettyprint):
+    setup_endpoint_test(mocker)
+    mocker.patch.dict(test_util.app.config, {'JSONIFY_PRETTYPRINT_REGULAR': prettyprint})
+    compiled_graph.clear_graph_cache()
+    node = compiled_graph.get_compiled_node('tst-1-5-a')
+    response = client.get("/api/action/tst-1-5-a")
+    with test_util.app.test_request_context():
+        expected = jsonify({'id': 'tst-1-5-a', 'content': node.action.to_dict('en')})
+    assert response.data == expected.data
+
+
+@pytest.mark.usefixtures('with_app_context')
+def test_action_payloads_rendered_once(client, mocker):
+    setup_endpoint_test(mocker)
+    client.get("/api/action/tst-1-5-a")
+    render = mocker.spy(compiled_graph, 'render_action_payloads')
+    response = client.get("/api/action/tst-1-5-a", headers={'Accept-Language': 'fr'})
+    assert response.status_code == 200
+    render.assert_not_called()
+    client.get("/api/action/tst-2-5-a")
+    client.get("/api/action/tst-1-0-c")
+    assert [call.args[1] for call in render.call_args_list] == ['tst-2-5-a']
+
+
 def setup_endpoint_test(mocker, data=None):
     if not data:
         data = {
@@ -408,3 +467,137 @@ def test_decide_list_incomplete(client, mocker):
             'title': 'Naomi Data Review'
         }],
     }
+
+
+@pytest.mark.usefixtures('with_app_context')
+def test_decide_batch(client, mocker):
+    setup_endpoint_test(mocker, {'1': True, '2': True, 'data': {'1': True, '2': True, '3': False, '4': True}})
+    item = {
+        'data': {
+            'url': 'https://example.ckan/api/3/action/package_show?id=example',
+            'authorization_header': "example-api-key"
+        },
+        'skipActions': ['tst-1-5-a']
+    }
+    expected_result = client.post("/api/decide", data=json.dumps(item)).json
+    response = client.post("/api/decide/batch", data=json.dumps({
+        'items': [item, {'data': {}}, item]
+    }))
+    assert response.status_code == 200
+    assert response.json['results'] == [
+        {'index': 0, **expected_result},
+        {'index': 1, 'error': {
+            'status_code': 400,
+            'error': 'Bad Request',
+            'message': "No data specified in request"
+        }},
+        {'index': 2, **expected_result}
+    ]
+
+
+@pytest.mark.usefixtures('with_app_context')
+def test_decide_batch_ndjson(client, mocker):
+    setup_endpoint_test(mocker, {'1': True, '2': True, 'data': {'1': True, '2': True, '3': False, '4': True}})
+    item = {
+        'data': {'url': 'https://example.ckan/api/3/action/package_show?id=example'},
+        'skipActions': ['tst-1-5-a']
+    }
+    response = client.post(
+        "/api/decide/batch",
+        data=json.dumps({'items': [item, item, item]}),
+        headers={'Accept': 'application/x-ndjson'}
+    )
+    assert response.mimetype == 'application/x-ndjson'
+    results = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert sorted(result['index'] for result in results) == [0, 1, 2]
+    assert all(result['decision']['id'] == 'tst-1-6-a' for result in results)
+
+
+@pytest.mark.parametrize('items', [None, [], [{}] * 501])
+def test_decide_batch_invalid_items_raises_bad_request(client, items):
+    response = client.post("/api/decide/batch", data=json.dumps({'items': items}))
+    assert 400 == response.status_code
+
+
+@pytest.mark.usefixtures('with_app_context')
+def test_decide_results_memoized(client, mocker):
+    setup_endpoint_test(mocker, {'1': True, '2': True, 'data': {'1': True, '2': True, '3': False, '4': True}})
+    mocker.patch.dict(test_util.app.config, {'RESULT_CACHE_ENABLED': True})
+    result_cache.clear_result_cache()
+    make_engine = mocker.spy(api, '_make_engine')
+    item = {
+        'data': {'url': 'https://example.ckan/api/3/action/package_show?id=example'},
+        'skipActions': ['tst-1-5-a']
+    }
+
+    first_response = client.post("/api/decide", data=json.dumps(item))
+    second_response = client.post("/api/decide", data=json.dumps(item))
+    assert make_engine.call_count == 1
+    assert first_response.json == second_response.json
+
+    client.post("/api/decide/list", data=json.dumps(item))
+    client.post("/api/decide", data=json.dumps({**item, 'skipActions': []}))
+    client.post("/api/decide", data=json.dumps(item), headers={'Accept-Language': 'fr'})
+    assert make_engine.call_count == 4
+
+    test_util.create_demo_data()
+    client.post("/api/decide", data=json.dumps(item))
+    assert make_engine.call_count == 5
+    result_cache.clear_result_cache()
+
+
+@pytest.mark.parametrize('source_fingerprint,respond_count', [(['dataset', 'v1'], 1), (None, 2)])
+@pytest.mark.usefixtures('with_app_context')
+def test_memoize_releases_prefetched_dataset(mocker, source_fingerprint, respond_count):
+    mocker.patch.dict(test_util.app.config, {'RESULT_CACHE_ENABLED': True})
+    result_cache.clear_result_cache()
+    dataset_files = []
+
+    def get_source_fingerprint(data_loader, source_data):
+        dataset_files.append(mocker.Mock())
+        prefetched = Future()
+        prefetched.set_result(dataset_files[-1])
+        source_data[PREFETCH_KEY] = {('url', 'auth'): prefetched}
+        return source_fingerprint
+
+    mocker.patch('navigator_engine.api.get_source_fingerprint', side_effect=get_source_fingerprint)
+    respond = mocker.Mock(return_value={'decision': 'test'})
+    input_data = {'data': {'url': 'https://example.ckan/api/3/action/package_show?id=example'}}
+
+    with test_util.app.test_request_context():
+        assert api._memoize('decide', respond, input_data) == {'decision': 'test'}
+        assert api._memoize('decide', respond, input_data) == {'decision': 'test'}
+
+    assert respond.call_count == respond_count
+    assert input_data == {'data': {'url': 'https://example.ckan/api/3/action/package_show?id=example'}}
+    for dataset_file in dataset_files:
+        dataset_file.close.assert_called_once()
+    result_cache.clear_result_cache()
+
+
+@pytest.mark.usefixtures('with_app_context')
+def test_decide_replays_route_checkpoint(client, mocker):
+    data = {'1': True, '2': True, 'data': {'1': True, '2': True, '3': False, '4': True}}
+    setup_endpoint_test(mocker, data)
+    item = {'data': {'url': 'https://example.ckan/api/3/action/package_show?id=example'}}
+    expected_response = client.post("/api/decide", data=json.dumps(item))
+    mocker.patch.dict(test_util.app.config, {'ROUTE_CHECKPOINT_ENABLED': True, 'RESULT_CACHE_ENABLED': False})
+    route_checkpoint.clear_route_checkpoints()
+    run_conditional = mocker.spy(DecisionEngine, 'run_conditional')
+
+    client.post("/api/decide", data=json.dumps(item))
+    conditionals_run = run_conditional.call_count
+    response = client.post("/api/decide", data=json.dumps(item))
+    assert run_conditional.call_count == conditionals_run
+    assert response.json == expected_response.json
+
+    changed_data = {**data, 'data': {**data['data'], '3': True}, 'naomi': {'1': True}}
+    mocker.patch(
+        'navigator_engine.api.choose_data_loader',
+        return_value=f'load_dict_from_json({json.dumps(json.dumps(changed_data))})'
+    )
+    response = client.post("/api/decide", data=json.dumps(item))
+    conditionals_rerun = [call.args[1].ref for call in run_conditional.call_args_list[conditionals_run:]]
+    assert conditionals_rerun == ['tst-1-2-c', 'tst-1-3-c', 'tst-3-0-c', 'tst-2-2-c']
+    assert response.json['decision']['id'] == 'tst-2-5-a'
+    route_checkpoint.clear_route_checkpoints()
@@ -1,9 +1,13 @@
 import pytest
+import hashlib
 import networkx
+import os
+import pandas as pd
 import pickle
 import re
 from navigator_engine import model
-from navigator_engine.common.graph_loader import graph_loader
+from navigator_engine.common.graph_loader import graph_loader, read_workbook, validate_graph
+import navigator_engine.common.compiled_graph as compiled_graph
 from navigator_engine.tests.util import app
 
 
@@ -80,3 +84,171 @@ class TestGraphLoader:
     def test_resource_url(self):
         resources = model.Resource.query.all()
         assert resources[0].url == 'https://test.org'
+
+    @pytest.mark.parametrize('ref,distance,milestones,resolved', [
+        ('EST-OVV-01-01-C', 6, ['EST-OVV-03-01-M', 'EST-OVV-04-01-M', 'EST-OVV-05-01-M', 'EST-OVV-06-01-M'], True),
+        ('EST-OVV-03-01-M', 4, ['EST-OVV-04-01-M', 'EST-OVV-05-01-M', 'EST-OVV-06-01-M'], True),
+        ('EST-OVV-06-01-M', 1, [], True),
+        ('EST-OVV-CPLT-A', 0, [], True),
+        ('EST-OVV-01-01-A', None, None, None),
+        ('EST-GEN-01-01-C', 8, [], True),
+        ('EST-MCN-02-01-C', 5, [], False),
+        ('EST-MCN-06-01-C', 1, [], True),
+        ('EST-FOR-01-01-C', 6, [], False),
+        ('EST-FOR-CK-02-01-C', 4, [], False),
+        ('EST-FOR-03-01-C', 3, [], True),
+        ('EST-LOP-01-01-C', 6, [], True),
+        ('EST-LOP-CK-02-01-C', 4, [], True)
+    ])
+    def test_precomputed_progress(self, ref, distance, milestones, resolved):
+        node = model.Node.query.filter_by(ref=ref).order_by(model.Node.id).first()
+        assert node.distance_to_complete == distance
+        assert node.milestones_to_complete == milestones
+        assert node.milestones_to_complete_resolved == resolved
+
+    def test_workbook_committed_once(self, mocker):
+        commit = mocker.spy(model.db.session, 'commit')
+        graph_loader(app.config.get('DEFAULT_DECISION_GRAPH'))
+        assert commit.call_count == 1
+        assert model.Edge.query.count() > 0
+
+    def test_edges_inserted_in_one_statement(self):
+        statements = []
+
+        def record_statement(connection, cursor, statement, *args):
+            statements.append(statement)
+
+        model.db.event.listen(model.db.engine, 'before_cursor_execute', record_statement)
+        try:
+            release = graph_loader(app.config.get('DEFAULT_DECISION_GRAPH'))
+        finally:
+            model.db.event.remove(model.db.engine, 'before_cursor_execute', record_statement)
+        assert len([statement for statement in statements if statement.startswith('INSERT INTO edge')]) == 1
+        graph = model.load_graph(release.graph_id)
+        assert graph.edges and all(edge.from_node.release_id == release.id for edge in graph.edges)
+
+    def test_check_skips_action_lists_tasks(self, mocker):
+        load_node = mocker.spy(model, 'load_node')
+        workbook = os.path.join(os.path.dirname(app.config['DEFAULT_DECISION_GRAPH']), 'Simple Development BDG.xlsx')
+        release = graph_loader(workbook)
+        node = model.Node.query.filter_by(ref='EST-ROB-01-CK-A', release_id=release.id).first()
+        assert "<li>Upload data inputs to the ADR using the required templates</li>" in node.action.html
+        load_node.assert_not_called()
+
+    def test_read_workbook(self):
+        graph_config_file = app.config.get('DEFAULT_DECISION_GRAPH')
+        workbook = read_workbook(graph_config_file)
+        assert list(workbook.keys()) == [sheet for sheet in pd.ExcelFile(graph_config_file).sheet_names
+                                         if re.match(r'[\d]{2,2}-', sheet)]
+        for sheet_name, (graph_header, graph_data) in workbook.items():
+            assert graph_header.equals(pd.read_excel(graph_config_file, sheet_name=sheet_name, header=0).loc[0])
+            assert graph_data.equals(
+                pd.read_excel(graph_config_file, sheet_name=sheet_name, header=3, index_col=0, dtype=str)
+            )
+
+    def test_release_activation(self):
+        first_release = graph_loader(app.config.get('DEFAULT_DECISION_GRAPH'))
+        validate_graph(first_release.graph_id)
+        model.activate_release(first_release.id)
+        assert compiled_graph.get_active_graph_id() == first_release.graph_id
+
+        second_release = graph_loader(app.config.get('DEFAULT_DECISION_GRAPH'))
+        assert compiled_graph.get_active_graph_id() == first_release.graph_id
+        validate_graph(second_release.graph_id)
+        model.activate_release(second_release.id)
+        assert compiled_graph.get_active_graph_id() == second_release.graph_id
+        assert compiled_graph.get_active_release_id() == second_release.id
+        assert model.load_active_release().id == second_release.id
+
+        node = model.load_node(node_ref='EST-GEN-01-01-C', release_id=first_release.id)
+        assert node.release_id == first_release.id
+        assert model.load_node(node_ref=node.ref, release_id=second_release.id).id != node.id
+
+    def test_release_source_hash(self):
+        release = graph_loader(app.config.get('DEFAULT_DECISION_GRAPH'))
+        with open(app.config.get('DEFAULT_DECISION_GRAPH'), 'rb') as workbook_file:
+            assert release.source_hash == hashlib.sha256(workbook_file.read()).hexdigest()
+
+    def test_prune_releases(self):
+        releases = [graph_loader(app.config.get('DEFAULT_DECISION_GRAPH')) for _ in range(3)]
+        model.activate_release(releases[-1].id)
+        release_ids = [release.id for release in releases]
+        inactive_release_ids = [release.id for release in model.GraphRelease.query.filter_by(active=False)]
+
+        pruned_release_ids = model.prune_releases(keep=1)
+
+        assert sorted(pruned_release_ids) == sorted(set(inactive_release_ids) - {release_ids[1]})
+        assert sorted(release.id for release in model.GraphRelease.query) == release_ids[1:]
+        assert not model.Node.query.filter(model.Node.release_id.in_(pruned_release_ids)).count()
+        assert not model.Graph.query.filter(model.Graph.release_id.in_(pruned_release_ids)).count()
+        assert model.Conditional.query.count() == model.Node.query.filter(model.Node.conditional_id.isnot(None)).count()
+        assert model.Action.query.count() == model.Node.query.filter(model.Node.action_id.isnot(None)).count()
+        assert model.Milestone.query.count() == model.Node.query.filter(model.Node.milestone_id.isnot(None)).count()
+        assert model.Edge.query.count() == sum(len(graph.edges) for graph in model.Graph.query)
+
+    def test_load_graph_command(self, mocker):
+        mocker.patch.dict(app.config, {'GRAPH_RELEASES_KEPT': 1})
+        runner = app.test_cli_runner()
+        graph_config_file = app.config.get('DEFAULT_DECISION_GRAPH')
+        runner.invoke(args=['navigator-engine', 'load-graph', graph_config_file])
+        active_release_id = model.load_active_release().id
+
+        result = runner.invoke(args=['navigator-engine', 'load-graph', graph_config_file])
+        assert result.exit_code == 0
+        assert model.load_active_release().id == active_release_id
+
+        result = runner.invoke(args=['navigator-engine', 'load-graph', '--force', graph_config_file])
+        assert result.exit_code == 0
+        assert model.load_active_release().id > active_release_id
+        assert model.GraphRelease.query.filter_by(active=False).count() == 1
+
+
+OLD_NODE_TABLE = """
+    CREATE TABLE node (
+        id INTEGER PRIMARY KEY,
+        ref VARCHAR NOT NULL,
+        conditional_id INTEGER REFERENCES conditional (id),
+        action_id INTEGER REFERENCES action (id),
+        milestone_id INTEGER REFERENCES milestone (id)
+        {constraint}
+    )
+"""
+
+
+def create_tables_without_releases(node_constraint=''):
+    # The graph tables as they were before graph releases
+    model.db.drop_all()
+    model.db.session.close()
+    tables = [table for table in model.db.metadata.sorted_tables if table.name not in ('graph_release', 'graph', 'node')]
+    model.db.metadata.create_all(model.db.engine, tables=tables)
+    with model.db.engine.begin() as connection:
+        connection.execute(model.db.text("CREATE TABLE graph (id INTEGER PRIMARY KEY, version VARCHAR NOT NULL)"))
+        connection.execute(model.db.text(OLD_NODE_TABLE.format(constraint=node_constraint)))
+
+
+@pytest.mark.usefixtures('with_app_context')
+def test_migrate_schema():
+    create_tables_without_releases()
+    model.migrate_schema()
+
+    inspector = model.db.inspect(model.db.engine)
+    assert 'source_hash' in {column['name'] for column in inspector.get_columns('graph_release')}
+    assert 'release_id' in {column['name'] for column in inspector.get_columns('graph')}
+    assert {'release_id', 'distance_to_complete'} <= {column['name'] for column in inspector.get_columns('node')}
+    assert ['release_id', 'ref'] in [index['column_names'] for index in inspector.get_indexes('node') if index['unique']]
+
+    first_release = graph_loader(app.config.get('DEFAULT_DECISION_GRAPH'))
+    second_release = graph_loader(app.config.get('DEFAULT_DECISION_GRAPH'))
+    assert model.load_node(node_ref='EST-GEN-01-01-C', release_id=first_release.id)
+    assert model.load_node(node_ref='EST-GEN-01-01-C', release_id=second_release.id)
+
+    model.migrate_schema()
+
+
+@pytest.mark.usefixtures('with_app_context')
+def test_migrate_schema_unique_refs_in_sqlite():
+    create_tables_without_releases(', UNIQUE (ref)')
+    with pytest.raises(RuntimeError, match='reset the db'):
+        model.migrate_schema()
+    model.db.drop_all()
+    model.db.create_all()
@@ -0,0 +1,36 @@
+from navigator_engine.common.graph_visualizer import get_graph_elements
+from navigator_engine.tests.util import QueryCounter
+import navigator_engine.tests.util as test_util
+import pytest
+
+
+@pytest.mark.usefixtures('with_app_context')
+def test_graph_elements_cached():
+    test_util.create_demo_data()
+    with test_util.app.test_request_context():
+        elements = get_graph_elements(2)
+        with QueryCounter() as counter:
+            assert get_graph_elements(2) is elements
+        assert counter.count == 0
+
+    nodes = [element for element in elements if 'position' in element]
+    edges = [element for element in elements if 'source' in element['data']]
+    assert len(nodes) + len(edges) == len(elements)
+    assert {edge['classes'] for edge in edges} == {'true', 'false'}
+    assert nodes[0]['data']['label'] == 'tst-2-0-c'
+    assert nodes[0]['position'] == {'x': 0, 'y': 0}
+    positions = [(node['position']['x'], node['position']['y']) for node in nodes]
+    assert len(set(positions)) == len(positions)
+    for edge in edges:
+        source = next(node for node in nodes if node['data']['id'] == edge['data']['source'])
+        target = next(node for node in nodes if node['data']['id'] == edge['data']['target'])
+        assert source['position']['y'] < target['position']['y']
+
+
+@pytest.mark.usefixtures('with_app_context')
+def test_graph_elements_translated():
+    test_util.create_demo_data()
+    with test_util.app.test_request_context(headers={'Accept-Language': 'fr'}):
+        french_elements = get_graph_elements(2)
+    with test_util.app.test_request_context():
+        assert get_graph_elements(2) is not french_elements
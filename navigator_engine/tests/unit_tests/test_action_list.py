@@ -82,7 +82,7 @@ def test_step_through_common_path(mocker, simple_network, sources, expected_resu
     mock_graph = mocker.Mock()
     mock_graph.to_networkx.return_value = mini_network
     mock_load_graph = mocker.patch(
-        'navigator_engine.common.action_list.model.load_graph',
+        'navigator_engine.common.action_list.compiled_graph.load_compiled_graph',
         return_value=mock_graph
     )
 
@@ -124,19 +124,7 @@ def test_create_action_list(mock_engine, mock_tracker, mocker, milestone_id):
     ]
     milestone_node = factories.NodeFactory(ref=milestone_id, milestone=factories.MilestoneFactory())
 
-    def side_effect(node_ref=""):
-
-        if node_ref == milestone_id:
-            return milestone_node
-
-        else:
-            action = factories.ActionFactory(title=node_ref.upper())
-            return factories.NodeFactory(action=action)
-
-    mock_load_node = mocker.patch(
-        'navigator_engine.common.action_list.model.load_node',
-        side_effect=side_effect
-    )
+    mock_engine.network.get_node.return_value = milestone_node
     mock_step_through_common_path = mocker.patch(
         'navigator_engine.common.action_list.step_through_common_path',
         return_value=(mock_tracker, False)
@@ -179,7 +167,7 @@ def test_create_action_list(mock_engine, mock_tracker, mocker, milestone_id):
 
     if milestone_id:
         expected_sources = [milestone_node, mock_engine.progress.entire_route[-2]]
-        mock_load_node.assert_any_call(node_ref=milestone_id)
+        mock_engine.network.get_node.assert_called_once_with(milestone_id)
 
     mock_step_through_common_path.assert_called_once_with(
         mock_engine.network,
@@ -187,3 +175,25 @@ def test_create_action_list(mock_engine, mock_tracker, mocker, milestone_id):
     )
     assert result[0] == expected_result
     assert not result[1]
+
+
+def test_get_future_actions_memoized(mock_network, mock_tracker, mocker):
+    mock_tracker.action_breadcrumbs = [
+        {'id': 'tst-0-18-a', 'reached': True},
+        {'id': 'tst-0-7-a', 'reached': True}
+    ]
+    mock_step_through_common_path = mocker.patch(
+        'navigator_engine.common.action_list.step_through_common_path',
+        return_value=(mock_tracker, True)
+    )
+    sources = [factories.NodeFactory(ref='tst-0-13-c')]
+
+    result = action_list.get_future_actions(mock_network, sources)
+    assert result == (({'id': 'tst-0-7-a', 'reached': True},), True)
+    assert action_list.get_future_actions(mock_network, sources) is result
+    mock_step_through_common_path.assert_called_once_with(mock_network, sources=sources)
+    with pytest.raises(TypeError):
+        result[0][0]['reached'] = False
+
+    action_list.get_future_actions(mock_network, [factories.NodeFactory(ref='tst-0-2-c')])
+    assert mock_step_through_common_path.call_count == 2
@@ -0,0 +1,72 @@
+from navigator_engine.common import ASYNC_DATA_LOADERS, DATA_LOADERS
+import navigator_engine.pluggable_logic.async_data_loaders as async_data_loaders
+import navigator_engine.pluggable_logic.data_loaders as data_loaders
+import asyncio
+import json
+import pytest
+
+
+def test_async_loaders_registered():
+    for name in ['load_url', 'load_json_url', 'load_dataset_resource', 'load_estimates_dataset']:
+        assert name in ASYNC_DATA_LOADERS
+        assert name in DATA_LOADERS
+
+
+def test_load_json_url_takes_prefetched_download(mock_engine, mocker):
+    resource_file = mocker.MagicMock()
+    resource_file.__enter__.return_value.read.return_value = json.dumps({'key': 'value'}).encode()
+
+    async def load():
+        prefetched = asyncio.get_running_loop().create_future()
+        prefetched.set_result(resource_file)
+        mock_engine.data = {data_loaders.PREFETCH_KEY: {('http://test.com', 'auth'): prefetched}}
+        return await async_data_loaders.load_json_url('http://test.com', 'auth', 'test', mock_engine)
+
+    download = mocker.patch.object(async_data_loaders, '_download')
+    data = asyncio.run(load())
+    download.assert_not_called()
+    assert data['test'] == {'url': 'http://test.com', 'auth_header': 'auth', 'data': {'key': 'value'}}
+    assert data[data_loaders.PREFETCH_KEY] == {}
+
+
+def test_download_revalidates_cached_resource(mocker):
+    httpx = pytest.importorskip('httpx')
+    responses = iter([
+        httpx.Response(200, content=b'content', headers={'ETag': '"1"'}),
+        httpx.Response(304)
+    ])
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return next(responses)
+
+    async def download_twice():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            mocker.patch.object(async_data_loaders, 'get_async_client', return_value=client)
+            first = await async_data_loaders._download('http://test.com/file', 'auth')
+            second = await async_data_loaders._download('http://test.com/file', 'auth')
+            return first.read(), second.read()
+
+    mocker.patch.object(async_data_loaders, 'get_resource_cache', return_value=async_data_loaders.ResourceCache())
+    assert asyncio.run(download_twice()) == (b'content', b'content')
+    assert requests[1].headers['If-None-Match'] == '"1"'
+
+
+def test_load_estimates_dataset_keeps_prefetched_downloads(mock_engine, mocker):
+    prefetched = {('https://example.com/dataset', 'auth'): 'prefetched download'}
+    mock_engine.data = {
+        'url': 'https://example.com/dataset',
+        'authorization_header': 'auth',
+        data_loaders.PREFETCH_KEY: prefetched
+    }
+
+    async def load_json_url(url, auth_header, name, engine):
+        assert engine.data == {data_loaders.PREFETCH_KEY: prefetched}
+        return engine.data
+
+    mocker.patch.object(async_data_loaders, 'load_json_url', side_effect=load_json_url)
+    mocker.patch.object(async_data_loaders, 'load_dataset_resource', mocker.AsyncMock(return_value={}))
+    mocker.patch.object(async_data_loaders, 'get_config', return_value=False)
+    asyncio.run(async_data_loaders.load_estimates_dataset('url', 'authorization_header', mock_engine))
+    async_data_loaders.load_json_url.assert_called_once()
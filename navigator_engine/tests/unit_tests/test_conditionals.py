@@ -1,7 +1,11 @@
 import pandas as pd
 import navigator_engine.pluggable_logic.conditional_functions as conditionals
+from navigator_engine.pluggable_logic.data_loaders import get_checklist
 import pytest
 
+SPECTRUM_CHECKLIST = get_checklist(pd.read_csv('spectrum_check_list.csv'), 'ID', 'Status')
+NAOMI_CHECKLIST = get_checklist(pd.read_csv('naomi_check_list.csv'), 'NaomiCheckPermPrimKey', 'TrueFalse')
+
 
 @pytest.mark.parametrize("actions,expected,remove_skips", [
     (['1'], True, []),
@@ -94,37 +98,48 @@ def test_check_dataset_valid(resources, expected, mock_engine):
         conditionals.check_not_skipped(123, mock_engine)
 
 
-@pytest.mark.parametrize("checklist, dataframe, expected", [
-    (['MaleART_current', 'AdultARTcovLT100'], pd.read_csv('spectrum_check_list.csv'), True),
-    (['UAvalid', 'ARTMortNoART_default'], pd.read_csv('spectrum_check_list.csv'), False),
+@pytest.mark.parametrize("indicators, checklist, expected", [
+    (['MaleART_current', 'AdultARTcovLT100'], SPECTRUM_CHECKLIST, True),
+    (['UAvalid', 'ARTMortNoART_default'], SPECTRUM_CHECKLIST, False),
     (['MaleART_current', 'AdultARTcovLT100'], None, False),
-    (['MaleART_current', 'CurrentYear'], pd.read_csv('spectrum_check_list.csv'), True),
-    (['MaleART_current', 'This indicator does not exist'], pd.read_csv('spectrum_check_list.csv'), True)
+    (['MaleART_current', 'CurrentYear'], SPECTRUM_CHECKLIST, True),
+    (['MaleART_current', 'This indicator does not exist'], SPECTRUM_CHECKLIST, True)
 ])
-def test_check_spectrum_file(checklist, dataframe, expected, mock_engine):
+def test_check_spectrum_file(indicators, checklist, expected, mock_engine):
 
     mock_engine.data = {
         'spectrum-validation-file': {
-            'data': dataframe
+            'data': checklist
         }
     }
-    check_result = conditionals.check_spectrum_file(checklist, mock_engine)
+    check_result = conditionals.check_spectrum_file(indicators, mock_engine)
     assert check_result == expected
 
 
-@pytest.mark.parametrize("checklist, dataframe, expected", [
-    (['Package_created', 'Package_has_all_data'], pd.read_csv('naomi_check_list.csv'), True),
-    (['Package_created', 'Opt_ANC_data'], pd.read_csv('naomi_check_list.csv'), False),
+@pytest.mark.parametrize("indicators, checklist, expected", [
+    (['Package_created', 'Package_has_all_data'], NAOMI_CHECKLIST, True),
+    (['Package_created', 'Opt_ANC_data'], NAOMI_CHECKLIST, False),
     (['Package_created', 'Package_has_all_data'], None, False),
-    (['Package_created', 'Opt_ART_data'], pd.read_csv('naomi_check_list.csv'), True),
-    (['Package_created', 'This indicator does not exist'], pd.read_csv('naomi_check_list.csv'), True)
+    (['Package_created', 'Opt_ART_data'], NAOMI_CHECKLIST, True),
+    (['Package_created', 'This indicator does not exist'], NAOMI_CHECKLIST, True)
 ])
-def test_check_naomi_file(checklist, dataframe, expected, mock_engine):
+def test_check_naomi_file(indicators, checklist, expected, mock_engine):
 
     mock_engine.data = {
         'naomi-validation-file': {
-            'data': dataframe
+            'data': checklist
         }
     }
-    check_result = conditionals.check_naomi_file(checklist, mock_engine)
+    check_result = conditionals.check_naomi_file(indicators, mock_engine)
     assert check_result == expected
+
+
+def test_check_validation_file_leaves_data_unchanged(mock_engine):
+    mock_engine.data = {
+        'naomi-validation-file': {
+            'data': dict(NAOMI_CHECKLIST)
+        }
+    }
+    assert conditionals.check_naomi_file(['Package_created'], mock_engine)
+    assert not conditionals.check_naomi_file(['Opt_ANC_data'], mock_engine)
+    assert mock_engine.data == {'naomi-validation-file': {'data': NAOMI_CHECKLIST}}
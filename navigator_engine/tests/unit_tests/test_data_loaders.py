@@ -1,7 +1,35 @@
 import navigator_engine.pluggable_logic.data_loaders as data_loaders
+import navigator_engine.tests.factories as factories
+from navigator_engine.common.resource_cache import CachedResource, ResourceCache
+from navigator_engine.tests.util import app
 import json
+import pytest
+from concurrent.futures import Future
+from networkx import DiGraph
 from requests import Response
 from copy import deepcopy
+import io
+import pandas as pd
+import zipfile
+
+
+def mock_http_response(mocker, content=b'', status_code=200, headers={}):
+    response = mocker.MagicMock(spec=Response, status_code=status_code, headers=headers)
+    response.__enter__.return_value = response
+    response.iter_content.return_value = [content[:4], content[4:]]
+    return response
+
+
+@pytest.fixture
+def resource_cache(mocker):
+    cache = ResourceCache()
+    mocker.patch('navigator_engine.pluggable_logic.data_loaders.get_resource_cache', return_value=cache)
+    return cache
+
+
+@pytest.fixture
+def mock_session(mocker, resource_cache):
+    return mocker.patch('navigator_engine.pluggable_logic.data_loaders.get_session').return_value
 
 
 def test_load_empty(mock_engine):
@@ -22,14 +50,9 @@ def test_load_dict_from_json(mock_engine):
     assert result == test_data
 
 
-def test_load_url(mock_engine, mocker):
-    mock_response = mocker.Mock(spec=Response)
-    mock_response.content = json.dumps({'key': 'value'})
-    mock_response.status_code = 200
-    mock_requests_get = mocker.patch(
-        'navigator_engine.pluggable_logic.data_loaders.requests.get',
-        return_value=mock_response
-    )
+def test_load_url(mock_engine, mock_session, mocker):
+    content = json.dumps({'key': 'value'}).encode()
+    mock_session.get.return_value = mock_http_response(mocker, content)
     args = [
         'https://example.com/test-data',
         'xxxx-xxxx-xxxx-xxxx',
@@ -37,16 +60,197 @@ def test_load_url(mock_engine, mocker):
         mock_engine
     ]
     result = data_loaders.load_url(*args)
-    mock_requests_get.assert_called_once_with(args[0], headers={'Authorization': args[1]})
+    mock_session.get.assert_called_once_with(
+        args[0],
+        headers={'Authorization': args[1]},
+        timeout=(10, 60),
+        stream=True
+    )
     assert result == {
         args[2]: {
             'url': args[0],
             'auth_header': args[1],
-            'data': mock_response.content
+            'data': content
         }
     }
 
 
+def test_load_url_uses_prefetched_resource(mock_engine, mock_session):
+    prefetched = Future()
+    prefetched.set_result(io.BytesIO(b'prefetched content'))
+    args = [
+        'https://example.com/test-data',
+        'xxxx-xxxx-xxxx-xxxx',
+        'test-url',
+        mock_engine
+    ]
+    mock_engine.data = {data_loaders.PREFETCH_KEY: {(args[0], args[1]): prefetched}}
+    result = data_loaders.load_url(*args)
+    mock_session.get.assert_not_called()
+    assert result[args[2]] == {
+        'url': args[0],
+        'auth_header': args[1],
+        'data': b'prefetched content'
+    }
+    assert result[data_loaders.PREFETCH_KEY] == {}
+
+
+@pytest.mark.usefixtures('with_app_context')
+def test_prefetch_dataset_resources(mock_engine, mocker):
+    mock_download = mocker.patch(
+        'navigator_engine.pluggable_logic.data_loaders._download',
+        side_effect=lambda url, auth_header, version, resource_type: f"{url} content"
+    )
+    mock_engine.data = {
+        'dataset': {
+            'auth_header': 'xxxx-xxxx-xxxx-xxxx',
+            'data': {'result': {
+                'name': 'test-dataset',
+                'resources': [
+                    {'resource_type': 'spectrum-file', 'url': 'https://example.com/spectrum'},
+                    {'resource_type': 'naomi-file', 'url': 'https://example.com/naomi'},
+                    {'resource_type': 'art-data', 'url': 'https://example.com/art'},
+                    {'resource_type': 'anc-data', 'url': None}
+                ]
+            }}
+        }
+    }
+    result = data_loaders.prefetch_dataset_resources(
+        {'spectrum-file', 'naomi-file', 'anc-data', 'missing-file'},
+        mock_engine
+    )
+    prefetched = result[data_loaders.PREFETCH_KEY]
+    assert {url: future.result() for (url, auth_header), future in prefetched.items()} == {
+        'https://example.com/spectrum': 'https://example.com/spectrum content',
+        'https://example.com/naomi': 'https://example.com/naomi content'
+    }
+    assert mock_download.call_count == 2
+
+
+@pytest.mark.usefixtures('with_app_context')
+def test_prefetch_uses_app_config(mock_engine, mock_session, mocker):
+    # Prefetch threads read the app's config, not the defaults
+    mocker.patch.dict(app.config, {
+        'PREFETCH_DATASET_RESOURCES': True,
+        'RESOURCE_CACHE_ENABLED': False,
+        'RESOURCE_SPOOL_MAX_BYTES': 4
+    })
+    get_resource_cache = mocker.patch('navigator_engine.pluggable_logic.data_loaders.get_resource_cache')
+    mocker.patch.object(data_loaders, 'get_required_resource_types', return_value={'spectrum-file'})
+    dataset = {'result': {'name': 'test-dataset', 'resources': [
+        {'resource_type': 'spectrum-file', 'url': 'https://example.com/spectrum', 'format': 'PJNZ'}
+    ]}}
+    contents = {
+        'https://example.com/dataset': json.dumps(dataset).encode(),
+        'https://example.com/spectrum': b'spectrum content'
+    }
+    mock_session.get.side_effect = lambda url, **kwargs: mock_http_response(mocker, contents[url])
+    mock_engine.data = {'url': 'https://example.com/dataset', 'authorization_header': 'xxxx'}
+
+    data = data_loaders.load_estimates_dataset('url', 'authorization_header', mock_engine)
+
+    spectrum_file = data[data_loaders.PREFETCH_KEY][('https://example.com/spectrum', 'xxxx')].result()
+    assert spectrum_file.read() == b'spectrum content'
+    assert spectrum_file._rolled
+    get_resource_cache.assert_not_called()
+
+
+def test_get_required_resource_types(mock_network, mocker):
+    sub_graph_milestone = factories.NodeFactory(milestone_id=4, milestone=factories.MilestoneFactory(
+        data_loader="load_csv_from_zipped_resource('naomi-file', '.*.csv', 'naomi-check')",
+        graph_id=3
+    ))
+    sub_graph = DiGraph()
+    sub_graph.add_edge(sub_graph_milestone, factories.NodeFactory())
+    mock_load_compiled_graph = mocker.patch(
+        'navigator_engine.pluggable_logic.data_loaders.compiled_graph.load_compiled_graph'
+    )
+    mock_load_compiled_graph.return_value.to_networkx.return_value = sub_graph
+    mock_network.get_milestones.return_value = [
+        factories.NodeFactory(milestone=factories.MilestoneFactory(
+            data_loader="load_dataset_resource('spectrum-file')",
+            graph_id=2
+        )),
+        factories.NodeFactory(milestone=factories.MilestoneFactory(
+            data_loader="load_empty()",
+            graph_id=3
+        ))
+    ]
+    assert data_loaders.get_required_resource_types(mock_network) == {'spectrum-file', 'naomi-file'}
+    assert mock_load_compiled_graph.call_count == 2
+
+
+def test_get_source_fingerprint(mock_session, mocker):
+    dataset = {'result': {'metadata_modified': '2022-04-01', 'resources': [
+        {'id': '1', 'url': 'https://example.com/1', 'last_modified': '2022-04-01', 'hash': 'abc'}
+    ]}}
+    mock_session.get.return_value = mock_http_response(mocker, json.dumps(dataset).encode())
+    data_loader = "load_estimates_dataset('url', 'authorization_header')"
+    source_data = {'url': 'https://example.com/dataset', 'authorization_header': 'xxxx'}
+    fingerprint = data_loaders.get_source_fingerprint(data_loader, source_data)
+    assert fingerprint == [
+        data_loader, 'https://example.com/dataset', 'xxxx', '2022-04-01',
+        [('1', 'https://example.com/1', '2022-04-01:abc')]
+    ]
+    prefetched = source_data[data_loaders.PREFETCH_KEY][('https://example.com/dataset', 'xxxx')]
+    assert json.load(prefetched.result()) == dataset
+
+
+def test_get_source_fingerprint_unknown_version(mock_session, mocker):
+    dataset = {'result': {'metadata_modified': '2022-04-01', 'resources': [
+        {'id': '1', 'url': 'https://example.com/1', 'last_modified': '2022-04-01', 'hash': 'abc'},
+        {'id': '2', 'url': 'https://example.com/2'}
+    ]}}
+    mock_session.get.return_value = mock_http_response(mocker, json.dumps(dataset).encode())
+    source_data = {'url': 'https://example.com/dataset', 'authorization_header': 'xxxx'}
+    data_loader = "load_estimates_dataset('url', 'authorization_header')"
+    assert data_loaders.get_source_fingerprint(data_loader, source_data) is None
+    assert ('https://example.com/dataset', 'xxxx') in source_data[data_loaders.PREFETCH_KEY]
+
+
+def test_get_source_fingerprint_other_loader():
+    source_data = {'url': 'https://example.com/dataset'}
+    assert data_loaders.get_source_fingerprint("load_empty()", source_data) == ["load_empty()", source_data]
+
+
+def test_download_skips_unchanged_resource(resource_cache, mock_session):
+    url = 'https://example.com/test-data'
+    resource_cache.put(
+        resource_cache.key(url, 'xxxx'),
+        CachedResource(url, version='2022-04-01:abc'),
+        io.BytesIO(b'cached content')
+    )
+    assert data_loaders._download(url, 'xxxx', '2022-04-01:abc').read() == b'cached content'
+    mock_session.get.assert_not_called()
+
+
+def test_download_revalidates_cached_resource(resource_cache, mock_session, mocker):
+    url = 'https://example.com/test-data'
+    resource_cache.put(
+        resource_cache.key(url, 'xxxx'),
+        CachedResource(url, etag='"v1"', last_modified='Fri, 01 Apr 2022 10:00:00 GMT'),
+        io.BytesIO(b'cached content')
+    )
+    mock_session.get.return_value = mock_http_response(mocker, status_code=304, headers={'ETag': '"v1"'})
+    assert data_loaders._download(url, 'xxxx').read() == b'cached content'
+    mock_session.get.assert_called_once_with(url, headers={
+        'Authorization': 'xxxx',
+        'If-None-Match': '"v1"',
+        'If-Modified-Since': 'Fri, 01 Apr 2022 10:00:00 GMT'
+    }, timeout=(10, 60), stream=True)
+
+
+def test_download_caches_downloaded_resource(resource_cache, mock_session, mocker):
+    url = 'https://example.com/test-data'
+    mock_session.get.return_value = mock_http_response(mocker, b'new content', headers={'ETag': '"v2"'})
+    assert data_loaders._download(url, 'xxxx', '2022-04-02:def').read() == b'new content'
+    cache_key = resource_cache.key(url, 'xxxx')
+    cached = resource_cache.get(cache_key)
+    assert (cached.etag, cached.version) == ('"v2"', '2022-04-02:def')
+    assert resource_cache.open(cache_key).read() == b'new content'
+    assert resource_cache.get(resource_cache.key(url, 'yyyy')) is None
+
+
 def test_load_json_url(mock_engine, mocker):
     test_data = {'key': 'value'}
     args = [
@@ -151,20 +355,24 @@ def test_load_estimates_dataset(mock_engine, mocker):
     assert result == mock_load_dataset_resource.return_value
 
 
-def test_load_spectrum_csv_from_zipped_resource(mock_engine, mocker):
+def zipped_resource_data(resource_type):
+    return {
+        'dataset': {
+            'auth_header': 'test-auth-header',
+            'data': {'result': {
+                'name': 'test-dataset',
+                'resources': [{'resource_type': resource_type, 'url': 'https://example.com/test-data'}]
+            }}
+        }
+    }
 
-    with open('navigator_engine/tests/test_data/test_spectrum_file.pjnz', 'rb') as f:
-        spectrum_file = f.read()
 
-    mock_load_dataset_resource = mocker.patch(
-        'navigator_engine.pluggable_logic.data_loaders.load_dataset_resource',
-        return_value={
-            'spectrum-file': {
-                'data': spectrum_file,
-                'auth_header': 'test-auth-header',
-                'url': 'https://example.com/test-data'
-            }
-        }
+def test_load_spectrum_csv_from_zipped_resource(mock_engine, mocker):
+
+    mock_engine.data = zipped_resource_data('spectrum-file')
+    mock_open_url = mocker.patch(
+        'navigator_engine.pluggable_logic.data_loaders._open_url',
+        return_value=open('navigator_engine/tests/test_data/test_spectrum_file.pjnz', 'rb')
     )
     result = data_loaders.load_csv_from_zipped_resource(
         "spectrum-file",
@@ -172,9 +380,10 @@ def test_load_spectrum_csv_from_zipped_resource(mock_engine, mocker):
         "spectrum-file-check",
         mock_engine
     )
-    mock_load_dataset_resource.assert_called_once_with(
-        'spectrum-file',
-        mock_engine
+    mock_open_url.assert_called_once_with(
+        'https://example.com/test-data',
+        'test-auth-header',
+        mock_engine.data
     )
     data = result['spectrum-file-check']['data']
     assert all(i for i in data.columns == ['Condition checked', 'Status']), \
@@ -182,45 +391,30 @@ def test_load_spectrum_csv_from_zipped_resource(mock_engine, mocker):
     assert data.shape == (28, 2), "Unexpected shape of Spectrum check file"
 
 
-def test_load_csv_from_zipped_resource_returns_empty_on_http_error(mock_engine, mocker):
+def test_load_csv_from_zipped_resource_returns_empty_for_missing_resource(mock_engine, mocker):
 
-    mocker.patch(
-        'navigator_engine.pluggable_logic.data_loaders.load_dataset_resource',
-        return_value={
-            'spectrum-file': {
-                'data': None,
-                'auth_header': None,
-                'url': None
-            }
-        }
-    )
+    mock_engine.data = zipped_resource_data('naomi-file')
+    mock_open_url = mocker.patch('navigator_engine.pluggable_logic.data_loaders._open_url')
     result = data_loaders.load_csv_from_zipped_resource(
         "spectrum-file",
         "(.*)_check.CSV",
         "spectrum-file-check",
         mock_engine
     )
+    mock_open_url.assert_not_called()
     assert result['spectrum-file-check'] == {
         'data': None,
-        'auth_header': None,
+        'auth_header': 'test-auth-header',
         'url': None
     }
 
 
 def test_load_naomi_csv_from_zipped_resource(mock_engine, mocker):
 
-    with open('navigator_engine/tests/test_data/test_naomi_file.zip', 'rb') as f:
-        naomi_file = f.read()
-
-    mock_load_dataset_resource = mocker.patch(
-        'navigator_engine.pluggable_logic.data_loaders.load_dataset_resource',
-        return_value={
-            'naomi-file': {
-                'data': naomi_file,
-                'auth_header': 'test-auth-header',
-                'url': 'https://example.com/test-data'
-            }
-        }
+    mock_engine.data = zipped_resource_data('naomi-file')
+    mock_open_url = mocker.patch(
+        'navigator_engine.pluggable_logic.data_loaders._open_url',
+        return_value=open('navigator_engine/tests/test_data/test_naomi_file.zip', 'rb')
     )
     result = data_loaders.load_csv_from_zipped_resource(
         "naomi-file",
@@ -228,11 +422,48 @@ def test_load_naomi_csv_from_zipped_resource(mock_engine, mocker):
         "naomi-file-check",
         mock_engine
     )
-    mock_load_dataset_resource.assert_called_once_with(
-        'naomi-file',
-        mock_engine
+    mock_open_url.assert_called_once_with(
+        'https://example.com/test-data',
+        'test-auth-header',
+        mock_engine.data
     )
     data = result['naomi-file-check']['data']
     assert all(i for i in data.columns == ['NaomiCheckPermPrimKey', 'NaomiCheckDes', 'TrueFalse']), \
         "Unexpected column names in Naomi check file"
     assert data.shape == (20, 3), "Unexpected shape of Naomi check file"
+
+
+def test_load_validation_checklist_from_zipped_resource(mock_engine, mocker):
+
+    zipped_file = io.BytesIO()
+    with zipfile.ZipFile(zipped_file, 'w') as zip_file:
+        zip_file.writestr('other.csv', 'a,b\n1,2\n')
+        zip_file.writestr(
+            'outputs/unaids_navigator_checklist.csv',
+            'NaomiCheckPermPrimKey,NaomiCheckDes,TrueFalse\nCheck_A,Description A,TRUE\nCheck_B,Description B,FALSE\n'
+        )
+    zipped_file.seek(0)
+    mock_engine.data = zipped_resource_data('naomi-file')
+    mocker.patch('navigator_engine.pluggable_logic.data_loaders._open_url', return_value=zipped_file)
+    result = data_loaders.load_csv_from_zipped_resource(
+        "naomi-file",
+        ".*unaids_navigator_checklist.csv",
+        "naomi-validation-file",
+        mock_engine
+    )
+    assert result['naomi-validation-file']['data'] == {'check_a': True, 'check_b': False}
+    assert zipped_file.closed
+
+
+def test_get_checklist():
+    dataframe = pd.DataFrame({
+        'ID': ['Check_A', 'CHECK_B', 'check_c', 'check_d', 'check_d', 'check_e'],
+        'Status': [True, 'F', 0, 'TRUE', 'false', 'Warning']
+    })
+    assert data_loaders.get_checklist(dataframe, 'ID', 'Status') == {
+        'check_a': True,
+        'check_b': False,
+        'check_c': False,
+        'check_d': False,
+        'check_e': True
+    }
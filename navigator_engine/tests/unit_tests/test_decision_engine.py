@@ -1,7 +1,12 @@
-from navigator_engine.common.decision_engine import DecisionEngine
+from navigator_engine.common.decision_engine import DecisionEngine, MilestoneFrame
+from navigator_engine.common.progress_tracker import ProgressTracker
+from navigator_engine.common.network import Network
+from navigator_engine.common.route_checkpoint import RouteCheckpoint
+from unittest.mock import call
 import navigator_engine.common as common
 import navigator_engine.tests.factories as factories
 from navigator_engine import model
+import asyncio
 import networkx
 import pytest
 
@@ -11,14 +16,81 @@ import pytest
     (factories.NodeFactory(action_id=1), 'process_action'),
     (factories.NodeFactory(milestone_id=1), 'process_milestone'),
 ])
-def test_process_node(mocker, node, function_called):
+def test_visit_node(mocker, node, function_called):
     engine = mocker.Mock(spec=DecisionEngine)
-    engine.progress = mocker.patch('navigator_engine.common.progress_tracker.ProgressTracker', auto_spec=True)
-    DecisionEngine.process_node(engine, node)
+    engine.progress = mocker.Mock(spec=ProgressTracker)
+    getattr(engine, function_called).return_value = "next_node"
+    result = DecisionEngine.visit_node(engine, node)
+    assert result == "next_node"
     getattr(engine, function_called).assert_called_once_with(node)
     engine.progress.add_node.assert_called_once_with(node)
 
 
+def test_process_node(mock_engine):
+    nodes = [factories.NodeFactory(conditional_id=1), factories.NodeFactory(action_id=1)]
+    mock_engine.frames = []
+    mock_engine.visit_node.side_effect = [nodes[1], nodes[1]]
+    result = DecisionEngine.process_node(mock_engine, nodes[0])
+    assert result == nodes[1]
+    assert mock_engine.visit_node.call_args_list == [call(nodes[0]), call(nodes[1])]
+    mock_engine.complete_milestone.assert_not_called()
+
+
+def test_process_node_completes_milestones(mock_engine):
+    milestone_node = factories.NodeFactory(milestone_id=1)
+    nodes = [factories.NodeFactory(action_id=1), factories.NodeFactory(action_id=2)]
+    mock_engine.frames = []
+
+    def visit_node(node):
+        if node == milestone_node:
+            mock_engine.frames.append('milestone frame')
+        return node if node != milestone_node else nodes[0]
+
+    def complete_milestone(node):
+        mock_engine.frames.pop()
+        return nodes[1]
+    mock_engine.visit_node.side_effect = visit_node
+    mock_engine.complete_milestone.side_effect = complete_milestone
+
+    result = DecisionEngine.process_node(mock_engine, milestone_node)
+
+    assert result == nodes[1]
+    mock_engine.complete_milestone.assert_called_once_with(nodes[0])
+    assert mock_engine.frames == []
+
+
+def test_process_node_pops_frames_on_error(mock_engine):
+    mock_engine.frames = []
+
+    def visit_node(node):
+        mock_engine.frames.append('milestone frame')
+        raise common.DecisionError("Test error")
+    mock_engine.visit_node.side_effect = visit_node
+    mock_engine.pop_frame.side_effect = mock_engine.frames.pop
+
+    with pytest.raises(common.DecisionError):
+        DecisionEngine.process_node(mock_engine, factories.NodeFactory(milestone_id=1))
+
+    assert mock_engine.frames == []
+
+
+def test_process_node_long_chain():
+    chain = [
+        factories.NodeFactory(ref=f"c-{i}", conditional_id=i + 1, conditional=factories.ConditionalFactory(id=i + 1))
+        for i in range(3000)
+    ]
+    complete = factories.NodeFactory(ref='complete', action_id=1, action=factories.ActionFactory(id=1, complete=True))
+    graph = networkx.DiGraph()
+    graph.add_edges_from(zip(chain, chain[1:] + [complete]), type=True)
+    engine = DecisionEngine(factories.GraphFactory(), {})
+    engine.network = Network(graph)
+    engine.progress = ProgressTracker(engine.network)
+    engine.run_pluggable_logic = lambda *args, **kwargs: True
+
+    assert engine.process_node(chain[0]) == complete
+    assert len(engine.progress.route) == 3001
+
+
 def test_run_pluggable_logic(mocker):
     def test_function(*args):
         return args
@@ -34,6 +106,55 @@ def test_run_pluggable_logic(mocker):
     assert result == ('hello', 1, engine)
 
 
+def test_get_pluggable_function_and_args_returns_args_as_parsed():
+    function_name, function_args = common.get_pluggable_function_and_args("test_function(['a', ['b']], 1)")
+    assert function_name == 'test_function'
+    assert function_args == (['a', ['b']], 1)
+    assert common.get_pluggable_function_and_args("test_function(['a', ['b']], 1)")[1] is function_args
+
+
+def test_run_pluggable_logic_resolved(mocker):
+    def test_function(*args):
+        return args
+    engine = mocker.Mock(spec=DecisionEngine)
+    result = DecisionEngine.run_pluggable_logic(engine, "unused()", logic=(test_function, ('hello', 1)))
+    assert result == ('hello', 1, engine)
+
+
+@pytest.mark.parametrize("registry,expected", [('ASYNC_DATA_LOADERS', 'async'), ('DATA_LOADERS', 'sync')])
+def test_run_async_pluggable_logic(mocker, registry, expected):
+    async def async_loader(*args):
+        return ('async', *args)
+
+    def sync_loader(*args):
+        return ('sync', *args)
+    mocker.patch.dict('navigator_engine.common.DATA_LOADERS', {'test_loader': sync_loader}, clear=True)
+    mocker.patch.dict('navigator_engine.common.ASYNC_DATA_LOADERS', {}, clear=True)
+    if registry == 'ASYNC_DATA_LOADERS':
+        common.ASYNC_DATA_LOADERS['test_loader'] = async_loader
+    engine = mocker.Mock(spec=DecisionEngine)
+    result = asyncio.run(DecisionEngine.run_async_pluggable_logic(engine, "test_loader('hello')"))
+    assert result == (expected, 'hello', engine)
+
+
+def test_run_async_pluggable_logic_error(mocker):
+    async def async_loader(*args):
+        raise KeyError('key')
+    mocker.patch.dict('navigator_engine.common.ASYNC_DATA_LOADERS', {'test_loader': async_loader}, clear=True)
+    engine = mocker.Mock(spec=DecisionEngine)
+    with pytest.raises(common.DecisionError, match="Error running pluggable logic test_loader"):
+        asyncio.run(DecisionEngine.run_async_pluggable_logic(engine, "test_loader()"))
+
+
+def test_create_async(mocker):
+    mocker.patch.object(DecisionEngine, '__init__', return_value=None)
+    mocker.patch.object(DecisionEngine, 'run_async_pluggable_logic', mocker.AsyncMock(return_value={'key': 'value'}))
+    engine = asyncio.run(DecisionEngine.create_async('graph', {}, data_loader='loader()', stop='stop'))
+    DecisionEngine.__init__.assert_called_once_with('graph', {}, stop='stop')
+    DecisionEngine.run_async_pluggable_logic.assert_called_once_with('loader()')
+    assert engine.data == {'key': 'value'}
+
+
 @pytest.mark.parametrize("edge_type,node", [(True, 1), (False, 2)])
 def test_get_next_node(mock_engine, edge_type, node):
     nodes = [
@@ -85,16 +206,36 @@ def test_process_conditional(mocker):
     node = factories.NodeFactory(conditional=conditional, conditional_id=1)
     next_node = factories.NodeFactory(action=factories.ActionFactory(id=1), action_id=1),
     engine = mocker.Mock(spec=DecisionEngine)
-    engine.run_pluggable_logic.return_value = True
+    engine.checkpoint = None
+    engine.run_conditional.return_value = True
     engine.get_next_node.return_value = next_node
-    engine.process_node.return_value = "processed_action"
 
     result = DecisionEngine.process_conditional(engine, node)
 
-    assert result == "processed_action"
-    engine.run_pluggable_logic.assert_called_once_with("function()")
+    assert result == next_node
+    engine.run_conditional.assert_called_once_with(node)
     engine.get_next_node.assert_called_once_with(node, True)
-    engine.process_node.assert_called_once_with(next_node)
+
+
+def test_process_conditional_checkpoint(mocker):
+    node = factories.NodeFactory(conditional=factories.ConditionalFactory(id=1), conditional_id=1)
+    engine = mocker.Mock(spec=DecisionEngine)
+    engine.checkpoint = mocker.Mock(spec=RouteCheckpoint)
+    engine.checkpoint.evaluate.return_value = False
+
+    DecisionEngine.process_conditional(engine, node)
+
+    engine.checkpoint.evaluate.assert_called_once_with(node, engine)
+    engine.run_conditional.assert_not_called()
+    engine.get_next_node.assert_called_once_with(node, False)
+
+
+def test_run_conditional(mocker):
+    node = factories.NodeFactory(conditional=factories.ConditionalFactory(id=1, function="function()"))
+    engine = mocker.Mock(spec=DecisionEngine)
+    engine.run_pluggable_logic.return_value = True
+    assert DecisionEngine.run_conditional(engine, node) is True
+    engine.run_pluggable_logic.assert_called_once_with("function()", logic=None)
 
 
 def test_skip_action(mock_engine, mocker):
@@ -111,14 +252,12 @@ def test_skip_action(mock_engine, mocker):
     mock_engine.network.networkx = network
     mock_engine.progress.route = [nodes[0], nodes[1]]
     mock_engine.progress.entire_route = [nodes[0], nodes[1]]
-    mock_engine.process_node.return_value = 'processed_action'
 
     result = DecisionEngine.skip_action(mock_engine, nodes[1])
 
-    assert result == 'processed_action'
+    assert result == nodes[2]
     assert mock_engine.progress.skipped_actions == [nodes[1].ref]
     mock_engine.progress.pop_node.assert_called_once()
-    mock_engine.process_node.assert_called_once_with(nodes[2])
 
 
 def test_process_action_skip_unskippable(mocker, mock_engine):
@@ -133,73 +272,92 @@ def test_process_action_skip_unskippable(mocker, mock_engine):
     assert 'test-ref' in mock_engine.remove_skip_requests
 
 
-def test_process_milestone_incomplete(mocker, mock_engine):
+def test_process_milestone(mocker, mock_engine):
     milestone = factories.MilestoneFactory()
-    milestone_graph = factories.GraphFactory()
-    node1 = factories.NodeFactory(milestone=milestone, milestone_id=1)
-    node2 = factories.NodeFactory(action=factories.ActionFactory(id=1, complete=False), action_id=1)
+    node = factories.NodeFactory(milestone=milestone, milestone_id=1)
+    parent_data = mock_engine.data = {'parent': 'data'}
+
+    def run_pluggable_logic(function_string, functions):
+        # The loader is given a copy, so the parent graph's data is left as it was
+        assert mock_engine.data == parent_data and mock_engine.data is not parent_data
+        return {'loaded': 'data'}
+
+    mock_engine.run_pluggable_logic.side_effect = run_pluggable_logic
+    milestone_network = mocker.Mock()
+    mocker.patch('navigator_engine.common.compiled_graph.load_compiled_network', return_value=milestone_network)
+
+    result = DecisionEngine.process_milestone(mock_engine, node)
+
+    mock_engine.push_frame.assert_called_once_with(milestone_network, parent_data, node)
+    mock_engine.run_pluggable_logic.assert_called_once_with(milestone.data_loader, common.DATA_LOADERS)
+    assert mock_engine.data == {'loaded': 'data'}
+    assert result == mock_engine.network.get_root_node.return_value
+
+
+def test_process_milestone_without_data_loader(mocker, mock_engine):
+    node = factories.NodeFactory(milestone=factories.MilestoneFactory(data_loader=""), milestone_id=1)
+    mocker.patch('navigator_engine.common.compiled_graph.load_compiled_network')
+    parent_data = mock_engine.data
+    DecisionEngine.process_milestone(mock_engine, node)
+    mock_engine.run_pluggable_logic.assert_not_called()
+    assert mock_engine.push_frame.call_args.args[1] is parent_data
 
-    mock_engine.run_pluggable_logic.return_value = True
-    mock_engine.process_action.return_value = "processed_action"
+
+def test_complete_milestone_incomplete(mocker, mock_engine):
+    node1 = factories.NodeFactory(milestone=factories.MilestoneFactory(), milestone_id=1)
+    node2 = factories.NodeFactory(action=factories.ActionFactory(id=1, complete=False), action_id=1)
     mock_engine.remove_skip_requests = [2]
-    mocker.patch('navigator_engine.model.load_graph', return_value=milestone_graph)
+    milestone_frame = MilestoneFrame(mocker.Mock(), {}, mocker.Mock(spec=ProgressTracker), [3], node1)
+    mock_engine.pop_frame.return_value = milestone_frame
 
-    milestone_engine = mocker.Mock(spec=DecisionEngine)
-    milestone_engine.remove_skip_requests = [3]
-    milestone_engine.progress = mocker.patch(
-        'navigator_engine.common.progress_tracker.ProgressTracker',
-        auto_spec=True
-    )
-    milestone_engine.progress.route = [1, 2, 3]
-    milestone_engine.decide.return_value = {'node': node2}
-    mocker.patch(
-        'navigator_engine.common.decision_engine.engine_factory',
-        return_value=milestone_engine
-    )
+    result = DecisionEngine.complete_milestone(mock_engine, node2)
 
-    result = DecisionEngine.process_milestone(mock_engine, node1)
-    mock_engine.progress.add_milestone.assert_called_once_with(node1, milestone_engine.progress)
     assert result == node2
     assert mock_engine.remove_skip_requests == [2, 3]
+    mock_engine.remove_skip_requests_not_needed.assert_called_once()
+    mock_engine.progress.add_milestone.assert_called_once_with(node1, milestone_frame.progress)
+    mock_engine.get_next_node.assert_not_called()
 
 
-def test_process_milestone_complete(mocker, mock_engine):
-    milestone = factories.MilestoneFactory(data_loader="")
-    node1 = factories.NodeFactory(milestone=milestone, milestone_id=1)
+def test_complete_milestone_complete(mocker, mock_engine):
+    node1 = factories.NodeFactory(milestone=factories.MilestoneFactory(), milestone_id=1)
     node2 = factories.NodeFactory(action=factories.ActionFactory(id=1, complete=True), action_id=1)
-    node3 = factories.NodeFactory(
-        conditional=factories.ConditionalFactory(id=1),
-        conditional_id=1
-    )
-    mock_engine.data = {'test': 'data'}
-    mock_engine.run_pluggable_logic.return_value = {}
+    node3 = factories.NodeFactory(conditional=factories.ConditionalFactory(id=1), conditional_id=1)
     mock_engine.get_next_node.return_value = node3
-    mock_engine.process_node.return_value = "processed_action"
-    mock_engine.remove_skip_requests = [2]
-    mocker.patch('navigator_engine.model.load_graph')
+    milestone_frame = MilestoneFrame(mocker.Mock(), {}, mocker.Mock(spec=ProgressTracker), [3], node1)
+    mock_engine.pop_frame.return_value = milestone_frame
 
-    milestone_engine = mocker.Mock(spec=DecisionEngine)
-    milestone_engine.remove_skip_requests = [3]
-    milestone_engine.progress = mocker.patch(
-        'navigator_engine.common.progress_tracker.ProgressTracker',
-        auto_spec=True
-    )
-    milestone_engine.progress.route = [1, 2, 3]
-    milestone_engine.decide.return_value = {'node': node2}
-    mocker.patch(
-        'navigator_engine.common.decision_engine.engine_factory',
-        return_value=milestone_engine
-    )
-    result = DecisionEngine.process_milestone(mock_engine, node1)
+    result = DecisionEngine.complete_milestone(mock_engine, node2)
 
-    assert result == "processed_action"
-    assert mock_engine.remove_skip_requests == [2, 3]
-    mock_engine.progress.add_milestone.assert_called_once_with(
-        node1,
-        milestone_engine.progress
-    )
+    assert result == node3
+    assert mock_engine.remove_skip_requests == [3]
+    mock_engine.progress.add_milestone.assert_called_once_with(node1, milestone_frame.progress)
     mock_engine.get_next_node.assert_called_once_with(node1, True)
-    mock_engine.process_node.assert_called_once_with(node3)
+
+
+def test_push_and_pop_frame(mock_engine, mocker):
+    network = mocker.Mock()
+    parent_network, parent_progress = mock_engine.network, mock_engine.progress
+    mock_engine.data = {'parent': 'data'}
+    mock_engine.progress.skipped_actions = ['1']
+    mock_engine.remove_skip_requests = ['2']
+    mock_engine.frames = []
+
+    DecisionEngine.push_frame(mock_engine, network, {'milestone': 'data'}, 'milestone node')
+    assert mock_engine.network == network
+    assert mock_engine.data == {'milestone': 'data'}
+    assert mock_engine.progress.skipped_actions == ['1']
+    assert mock_engine.remove_skip_requests == []
+    milestone_progress = mock_engine.progress
+
+    frame = DecisionEngine.pop_frame(mock_engine)
+    assert (frame.network, frame.data, frame.progress) == (network, {'milestone': 'data'}, milestone_progress)
+    assert frame.milestone_node == 'milestone node'
+    assert mock_engine.network == parent_network
+    assert mock_engine.progress == parent_progress
+    assert mock_engine.data == {'parent': 'data'}
+    assert mock_engine.remove_skip_requests == ['2']
+    assert mock_engine.frames == []
 
 
 def test_decide(mock_engine, mocker):
@@ -221,6 +379,15 @@ def test_decide(mock_engine, mocker):
     assert mock_engine.skip_requests == ['4', '5']
 
 
+def test_decide_releases_unreached_prefetches(mock_engine, mocker):
+    release = mocker.patch('navigator_engine.common.decision_engine.release_prefetched_resources')
+    mock_engine.network.get_root_node.return_value = factories.NodeFactory(id=1)
+    mock_engine.process_node.side_effect = common.DecisionError("Test error")
+    with pytest.raises(common.DecisionError):
+        DecisionEngine.decide(mock_engine, data={'test': 'data'})
+    release.assert_called_once_with({'test': 'data'})
+
+
 def test_process_action_unskipped(mock_engine):
     action = factories.ActionFactory(
         id=1,
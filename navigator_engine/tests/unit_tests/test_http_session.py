@@ -0,0 +1,53 @@
+import pytest
+import navigator_engine.common.http_session as http_session
+
+
+@pytest.fixture(autouse=True)
+def fresh_session():
+    http_session.close_session()
+    yield
+    http_session.close_session()
+
+
+def test_get_session_is_shared():
+    session = http_session.get_session()
+    assert http_session.get_session() is session
+
+
+def test_get_session_configures_pool_and_retries():
+    adapter = http_session.get_session().get_adapter('https://adr.unaids.org')
+    assert adapter._pool_connections == 4
+    assert adapter._pool_maxsize == 16
+    assert adapter.max_retries.total == 3
+    assert adapter.max_retries.backoff_factor == 0.5
+
+
+def test_get_session_does_not_store_cookies():
+    policy = http_session.get_session().cookies.get_policy()
+    assert policy.allowed_domains() == ()
+
+
+def test_get_timeout():
+    assert http_session.get_timeout() == (10, 60)
+
+
+def test_get_pool_metrics(mocker):
+    adapter = http_session.get_session().get_adapter('https://adr.unaids.org')
+    pools = [
+        mocker.Mock(num_requests=5, num_connections=2),
+        mocker.Mock(num_requests=3, num_connections=1)
+    ]
+    mocker.patch.object(adapter.poolmanager, 'pools', {i: pool for i, pool in enumerate(pools)})
+    assert http_session.get_pool_metrics() == {
+        'requests': 8,
+        'pool_hits': 5,
+        'pool_misses': 3
+    }
+
+
+def test_get_pool_metrics_without_session():
+    assert http_session.get_pool_metrics() == {
+        'requests': 0,
+        'pool_hits': 0,
+        'pool_misses': 0
+    }
@@ -0,0 +1,125 @@
+from navigator_engine.app import create_app
+from navigator_engine.common import DATA_LOADERS, ASYNC_DATA_LOADERS
+from navigator_engine.config import Testing
+from navigator_engine.tests.util import app
+import navigator_engine.common.instrumentation as instrumentation
+import navigator_engine.pluggable_logic.data_loaders as data_loaders
+import pytest
+
+
+@pytest.fixture
+def metrics_enabled(mocker):
+    pytest.importorskip('prometheus_client')
+    mocker.patch.object(instrumentation, 'get_config', return_value=True)
+
+
+def get_sample(name, labels):
+    return instrumentation.REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_timer_disabled(mocker):
+    mocker.patch.object(instrumentation, 'get_config', return_value=False)
+    with instrumentation.Timer('stage', 'progress') as timer:
+        pass
+    assert timer.started is None
+
+
+def test_registered_loaders_are_instrumented():
+    assert DATA_LOADERS['load_empty'] is data_loaders.load_empty
+    assert data_loaders.load_empty.__name__ == 'load_empty'
+    assert data_loaders.load_empty.__wrapped__.__name__ == 'load_empty'
+    assert ASYNC_DATA_LOADERS['load_url'].__name__ == 'load_url'
+
+
+@pytest.mark.usefixtures('metrics_enabled')
+def test_timer_records_duration_and_errors():
+    labels = {'function': 'check_test'}
+    count = get_sample('navigator_conditional_seconds_count', labels)
+    errors = get_sample('navigator_conditional_errors_total', labels)
+
+    with instrumentation.Timer('conditional', 'check_test'):
+        pass
+    with pytest.raises(ValueError):
+        with instrumentation.Timer('conditional', 'check_test'):
+            raise ValueError("Test error")
+
+    assert get_sample('navigator_conditional_seconds_count', labels) == count + 2
+    assert get_sample('navigator_conditional_errors_total', labels) == errors + 1
+
+
+@pytest.mark.usefixtures('metrics_enabled')
+def test_loader_calls_are_timed(mock_engine):
+    labels = {'loader': 'load_empty'}
+    count = get_sample('navigator_data_loader_seconds_count', labels)
+    data_loaders.load_empty(mock_engine)
+    assert get_sample('navigator_data_loader_seconds_count', labels) == count + 1
+
+
+@pytest.mark.usefixtures('metrics_enabled')
+def test_count_downloaded_bytes():
+    labels = {'resource_type': 'spectrum-file'}
+    downloaded = get_sample('navigator_downloaded_bytes_total', labels)
+    instrumentation.count_downloaded_bytes('spectrum-file', 1024)
+    assert get_sample('navigator_downloaded_bytes_total', labels) == downloaded + 1024
+
+
+@pytest.mark.usefixtures('metrics_enabled')
+def test_http_pool_gauges(mocker):
+    mocker.patch.object(
+        instrumentation.http_session, 'get_pool_metrics',
+        return_value={'requests': 5, 'pool_hits': 3, 'pool_misses': 2}
+    )
+    assert get_sample('navigator_http_requests', {}) == 5
+    assert get_sample('navigator_http_pool_hits', {}) == 3
+    assert get_sample('navigator_http_pool_misses', {}) == 2
+
+
+def test_metrics_endpoint_disabled(client):
+    response = client.get('/metrics')
+    assert response.status_code == 404
+
+
+@pytest.mark.usefixtures('metrics_enabled')
+def test_metrics_endpoint(client):
+    instrumentation.count_downloaded_bytes('naomi-file', 1)
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert b'navigator_downloaded_bytes_total{resource_type="naomi-file"}' in response.data
+
+
+def test_metrics_endpoint_missing_client(client, mocker):
+    mocker.patch.object(instrumentation, 'get_config', return_value=True)
+    mocker.patch.object(instrumentation, 'prometheus_client', None)
+    response = client.get('/metrics')
+    assert response.status_code == 500
+    assert response.json['message'] == instrumentation.MISSING_CLIENT_MESSAGE
+
+
+def test_create_app_missing_client(mocker):
+    class MetricsTesting(Testing):
+        METRICS_ENABLED = True
+
+    mocker.patch.object(instrumentation, 'prometheus_client', None)
+    with pytest.raises(RuntimeError, match=instrumentation.MISSING_CLIENT_MESSAGE):
+        create_app(MetricsTesting)
+
+
+@pytest.mark.usefixtures('with_app_context')
+def test_prefetched_bytes_counted(mock_engine, mocker):
+    # Counted by the prefetch thread, which must see the app's config
+    pytest.importorskip('prometheus_client')
+    mocker.patch.dict(app.config, {'METRICS_ENABLED': True, 'RESOURCE_CACHE_ENABLED': False})
+    response = mocker.MagicMock(status_code=200, headers={})
+    response.__enter__.return_value = response
+    response.iter_content.return_value = [b'spectrum content']
+    mocker.patch('navigator_engine.pluggable_logic.data_loaders.get_session').return_value.get.return_value = response
+    mock_engine.data = {'dataset': {'auth_header': 'xxxx', 'data': {'result': {'name': 'test-dataset', 'resources': [
+        {'resource_type': 'spectrum-file', 'url': 'https://example.com/spectrum'}
+    ]}}}}
+    labels = {'resource_type': 'spectrum-file'}
+    downloaded = get_sample('navigator_downloaded_bytes_total', labels)
+
+    data = data_loaders.prefetch_dataset_resources({'spectrum-file'}, mock_engine)
+    data[data_loaders.PREFETCH_KEY][('https://example.com/spectrum', 'xxxx')].result()
+
+    assert get_sample('navigator_downloaded_bytes_total', labels) == downloaded + len(b'spectrum content')
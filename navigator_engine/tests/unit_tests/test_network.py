@@ -94,3 +94,40 @@ def test_common_path(simple_network, source, target, expected_result):
     expected_path = [simple_network['nodes'][i] for i in expected_result[0]]
     assert result[0] == expected_path
     assert result[1] == expected_result[1]
+
+
+@pytest.mark.parametrize("acyclic", [True, False])
+@pytest.mark.parametrize("seed", range(20))
+def test_path_computations_match_path_enumeration(seed, acyclic):
+    random_dag = networkx.gnp_random_graph(14, 0.3 if acyclic else 0.15, seed=seed, directed=True)
+    nodes = {
+        i: factories.NodeFactory(id=i, milestone_id=i if i % 3 == 0 else None)
+        for i in random_dag.nodes()
+    }
+    dag = networkx.DiGraph()
+    dag.add_nodes_from(nodes.values())
+    dag.add_edges_from((nodes[u], nodes[v]) for u, v in random_dag.edges() if u < v or not acyclic)
+    network = Network(dag)
+    assert network.is_acyclic() == networkx.is_directed_acyclic_graph(dag)
+    target = nodes[13]
+
+    for source in nodes.values():
+        all_paths = network.all_possible_paths(source, target)
+        expected_common_path, expected_milestone_path = [], []
+        if all_paths:
+            longest_path = max(all_paths, key=len)
+            common_nodes = set.intersection(*[set(path) for path in all_paths])
+            expected_common_path = [node for node in longest_path if node in common_nodes]
+            expected_milestone_path = [node for node in expected_common_path[1:] if node.milestone_id]
+            assert network.longest_path_length(source, target) == len(longest_path) - 1
+        expected_resolved = len(all_paths) <= 1
+
+        assert network.common_path(source, target) == (expected_common_path, expected_resolved)
+        network.complete_node = target
+        assert network.milestone_path(source) == (expected_milestone_path, expected_resolved)
+
+
+def test_longest_path_length_raises_error(simple_network):
+    network = Network(simple_network['network'])
+    with pytest.raises(DecisionError, match="No path from node"):
+        network.longest_path_length(simple_network['nodes'][5])
@@ -119,6 +119,33 @@ def test_percentage_progress(mock_tracker, simple_network, route, expected_resul
     assert result == expected_result
 
 
+def test_percentage_progress_precomputed(mock_tracker):
+    nodes = [
+        factories.NodeFactory(id=1, distance_to_complete=4),
+        factories.NodeFactory(id=2, distance_to_complete=3),
+        factories.NodeFactory(id=3, distance_to_complete=2)
+    ]
+    mock_tracker.route = nodes
+    result = ProgressTracker.percentage_progress(mock_tracker)
+    mock_tracker.network.longest_path_length.assert_not_called()
+    assert result == 50
+
+
+def test_milestones_to_complete_precomputed(mock_tracker):
+    milestone = factories.NodeFactory(id=2, milestone=factories.MilestoneFactory())
+    node = factories.NodeFactory(
+        id=1,
+        milestones_to_complete=[milestone.ref],
+        milestones_to_complete_resolved=False
+    )
+    mock_tracker.route = [node]
+    mock_tracker.network.get_node.return_value = milestone
+    result = ProgressTracker.milestones_to_complete(mock_tracker)
+    mock_tracker.network.get_node.assert_called_once_with(milestone.ref)
+    mock_tracker.network.milestone_path.assert_not_called()
+    assert result == ([milestone], False)
+
+
 @pytest.mark.parametrize("route,expected_arg", [
     ([1, 5], 1),
     ([1, 9, 12], 12),
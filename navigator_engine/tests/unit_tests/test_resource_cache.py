@@ -0,0 +1,107 @@
+import io
+import os
+from concurrent.futures import Future
+from navigator_engine.common.resource_cache import (
+    DEFAULT_DIRECTORY,
+    DEFAULT_MEMORY_ENTRY_BYTES,
+    PREFETCH_KEY,
+    CachedResource,
+    ResourceCache,
+    clear_resource_cache,
+    get_resource_cache,
+    get_resource_version,
+    release_prefetched_resources
+)
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = ResourceCache(max_memory_bytes=10)
+    cache.put('a', CachedResource('a'), io.BytesIO(b'aaaa'))
+    cache.put('b', CachedResource('b'), io.BytesIO(b'bbbb'))
+    cache.get('a')
+    cache.put('c', CachedResource('c'), io.BytesIO(b'cccc'))
+    assert list(cache.memory.keys()) == ['a', 'c']
+    assert cache.memory_bytes == 8
+
+
+def test_memory_cache_ignores_resources_larger_than_cache():
+    cache = ResourceCache(max_memory_bytes=10)
+    cache.put('a', CachedResource('a'), io.BytesIO(b'a' * 11))
+    assert cache.get('a') is None
+    assert cache.open('a') is None
+    assert cache.memory_bytes == 0
+
+
+def test_put_leaves_file_at_start():
+    cache = ResourceCache(max_memory_bytes=10)
+    resource_file = io.BytesIO(b'aaaa')
+    cache.put('a', CachedResource('a'), resource_file)
+    assert resource_file.read() == b'aaaa'
+
+
+def test_disk_cache_survives_memory_eviction(tmp_path):
+    cache = ResourceCache(max_memory_bytes=4, directory=str(tmp_path))
+    cache.put('a', CachedResource('https://example.com/a', etag='"1"', version='v1'), io.BytesIO(b'aaaa'))
+    cache.put('b', CachedResource('https://example.com/b'), io.BytesIO(b'bbbb'))
+    assert 'a' not in cache.memory
+    assert cache.get('a').metadata() == {
+        'url': 'https://example.com/a',
+        'etag': '"1"',
+        'last_modified': None,
+        'version': 'v1'
+    }
+    with cache.open('a') as cached_file:
+        assert cached_file.read() == b'aaaa'
+
+
+def test_large_resources_only_cached_on_disk(tmp_path):
+    cache = ResourceCache(max_memory_bytes=100, directory=str(tmp_path), max_memory_entry_bytes=4)
+    cache.put('small', CachedResource('small'), io.BytesIO(b'aaaa'))
+    cache.put('large', CachedResource('large'), io.BytesIO(b'b' * 10))
+    assert list(cache.memory.keys()) == ['small']
+    assert cache.memory_bytes == 4
+    with cache.open('large') as cached_file:
+        assert not isinstance(cached_file, io.BytesIO)
+        assert cached_file.read() == b'b' * 10
+
+
+def test_get_resource_cache_defaults_to_disk(mocker):
+    mocker.patch('navigator_engine.common.resource_cache.get_config', side_effect=lambda key, default=None: default)
+    clear_resource_cache()
+    cache = get_resource_cache()
+    assert cache.directory == DEFAULT_DIRECTORY
+    assert cache.max_memory_entry_bytes == DEFAULT_MEMORY_ENTRY_BYTES
+    clear_resource_cache()
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    cache = ResourceCache(max_memory_bytes=0, directory=str(tmp_path), max_disk_bytes=10)
+    cache.put('a', CachedResource('a'), io.BytesIO(b'aaaa'))
+    os.utime(tmp_path / 'a.data', (0, 0))
+    cache.put('b', CachedResource('b'), io.BytesIO(b'bbbb'))
+    cache.put('c', CachedResource('c'), io.BytesIO(b'cccc'))
+    assert sorted(os.listdir(tmp_path)) == ['b.data', 'b.json', 'c.data', 'c.json']
+
+
+def test_key_depends_on_auth_header():
+    assert ResourceCache.key('https://example.com', 'xxxx') != ResourceCache.key('https://example.com', 'yyyy')
+
+
+def test_get_resource_version():
+    assert get_resource_version({'last_modified': '2022-04-01T10:00:00', 'hash': 'abc'}) == '2022-04-01T10:00:00:abc'
+    assert get_resource_version({'last_modified': None, 'hash': ''}) is None
+
+
+def test_release_prefetched_resources():
+    finished, pending, running = Future(), Future(), Future()
+    finished.set_result(io.BytesIO(b'finished'))
+    running.set_running_or_notify_cancel()
+    data = {'key': 'value', PREFETCH_KEY: {('a', 'auth'): finished, ('b', 'auth'): pending, ('c', 'auth'): running}}
+
+    release_prefetched_resources(data)
+    assert data == {'key': 'value'}
+    assert finished.result().closed
+    assert pending.cancelled()
+
+    running.set_result(io.BytesIO(b'running'))
+    assert running.result().closed
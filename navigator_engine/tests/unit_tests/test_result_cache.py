@@ -0,0 +1,52 @@
+from navigator_engine.common.result_cache import RedisResultCache, ResultCache, fingerprint
+import navigator_engine.common.result_cache as result_cache
+import json
+import redis
+
+
+def test_fingerprint_ignores_key_order():
+    assert fingerprint({'a': 1, 'b': 2}, 'c') == fingerprint({'b': 2, 'a': 1}, 'c')
+    assert fingerprint({'a': 1}, 'c') != fingerprint({'a': 2}, 'c')
+
+
+def test_cache_evicts_least_recently_used():
+    cache = ResultCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert list(cache.entries.keys()) == ['a', 'c']
+    assert cache.get('b') is None
+
+
+def test_cache_expires_entries(mocker):
+    monotonic = mocker.patch.object(result_cache.time, 'monotonic', return_value=100)
+    cache = ResultCache(ttl_seconds=10)
+    cache.set('a', {'decision': 'value'})
+    monotonic.return_value = 110
+    assert cache.get('a') == {'decision': 'value'}
+    monotonic.return_value = 111
+    assert cache.get('a') is None
+    assert 'a' not in cache.entries
+
+
+def test_redis_cache(mocker):
+    client = mocker.patch.object(redis.Redis, 'from_url').return_value
+    cache = RedisResultCache('redis://localhost', ttl_seconds=60)
+    cache.set('a', {'decision': 'value'})
+    client.set.assert_called_once_with('navigator-result:a', json.dumps({'decision': 'value'}), ex=60)
+    client.get.return_value = json.dumps({'decision': 'value'}).encode()
+    assert cache.get('a') == {'decision': 'value'}
+    client.get.side_effect = redis.ConnectionError("Connection refused")
+    assert cache.get('a') is None
+
+
+def test_get_result_cache(mocker):
+    result_cache.clear_result_cache()
+    get_config = mocker.patch.object(result_cache, 'get_config', side_effect=lambda key, default=None: default)
+    cache = result_cache.get_result_cache()
+    assert type(cache) is ResultCache
+    assert result_cache.get_result_cache() is cache
+    get_config.side_effect = lambda key, default=None: False if key == 'RESULT_CACHE_ENABLED' else default
+    assert result_cache.get_result_cache() is None
+    result_cache.clear_result_cache()
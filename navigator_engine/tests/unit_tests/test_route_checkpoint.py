@@ -0,0 +1,122 @@
+from navigator_engine.common.decision_engine import DecisionEngine
+from navigator_engine.common.route_checkpoint import ReadTrackingDict, RouteCheckpoint, fingerprint_value
+import navigator_engine.common.route_checkpoint as route_checkpoint
+import navigator_engine.tests.factories as factories
+import networkx
+import pandas as pd
+import pytest
+
+
+def create_engine(mocker, data, functions, checkpoint):
+    """
+    A chain of conditionals, each either continuing along the chain or
+    ending at an incomplete action, with the complete action at the end.
+    """
+    conditionals = [
+        factories.NodeFactory(ref=f"c-{i}", conditional_id=i + 1, conditional=factories.ConditionalFactory(
+            id=i + 1, function=function
+        ))
+        for i, function in enumerate(functions)
+    ]
+    actions = [
+        factories.NodeFactory(ref=f"a-{i}", action_id=i + 1, action=factories.ActionFactory(id=i + 1))
+        for i in range(len(functions))
+    ]
+    complete = factories.NodeFactory(ref='complete', action_id=100, action=factories.ActionFactory(
+        id=100, complete=True
+    ))
+    graph = networkx.DiGraph()
+    graph.add_edges_from(zip(conditionals, conditionals[1:] + [complete]), type=True)
+    graph.add_edges_from(zip(conditionals, actions), type=False)
+    return DecisionEngine(mocker.Mock(to_networkx=mocker.Mock(return_value=graph)), data, checkpoint=checkpoint)
+
+
+@pytest.fixture
+def conditional_calls(mocker):
+    calls = []
+
+    def check_key(key, engine):
+        calls.append(key)
+        return engine.data[key]
+    mocker.patch.dict('navigator_engine.common.CONDITIONAL_FUNCTIONS', {'check_key': check_key})
+    return calls
+
+
+def test_fingerprint_value():
+    assert fingerprint_value({'a': 1, 'b': [True]}) == fingerprint_value({'b': [True], 'a': 1})
+    assert fingerprint_value({'a': b'content'}) != fingerprint_value({'a': b'changed'})
+    assert fingerprint_value(pd.DataFrame({'a': [1]})) is None
+
+
+def test_read_tracking_dict():
+    data = ReadTrackingDict({'a': 1, 'b': 2})
+    data['a']
+    data.get('c')
+    'd' in data
+    assert data.keys_read == {'a', 'c', 'd'}
+    assert not data.read_all
+    list(data.items())
+    assert data.read_all
+
+
+def test_replays_unchanged_conditionals(mocker, conditional_calls):
+    functions = ["check_key('a')", "check_key('b')", "check_key('c')"]
+    checkpoint = RouteCheckpoint()
+    create_engine(mocker, {'a': True, 'b': True, 'c': True}, functions, checkpoint).decide()
+    assert conditional_calls == ['a', 'b', 'c']
+
+    conditional_calls.clear()
+    checkpoint.reset()
+    result = create_engine(mocker, {'a': True, 'b': True, 'c': False}, functions, checkpoint).decide()
+    assert conditional_calls == ['c']
+    assert checkpoint.replayed == 2
+    assert result['id'] == 'a-2'
+
+
+def test_stops_replaying_once_route_changes(mocker, conditional_calls):
+    functions = ["check_key('a')", "check_key('b')", "check_key('c')"]
+    checkpoint = RouteCheckpoint()
+    engine = create_engine(mocker, {'a': True, 'b': True, 'c': True}, functions, checkpoint)
+    engine.decide()
+
+    conditional_calls.clear()
+    result = engine.decide(data={'a': False, 'b': True, 'c': True})
+    assert conditional_calls == ['a']
+    assert not checkpoint.replaying
+    assert result['id'] == 'a-0'
+
+
+def test_conditionals_reading_all_data_are_run(mocker, conditional_calls):
+    def check_any(engine):
+        conditional_calls.append('any')
+        return any(engine.data.values())
+    mocker.patch.dict('navigator_engine.common.CONDITIONAL_FUNCTIONS', {'check_any': check_any})
+    checkpoint = RouteCheckpoint()
+    engine = create_engine(mocker, {'a': True}, ["check_any()", "check_key('a')"], checkpoint)
+    engine.decide()
+    engine.decide()
+    assert conditional_calls == ['any', 'a', 'any']
+    assert checkpoint.steps[0].inputs is None
+
+
+def test_stateful_conditionals_are_run(mocker, conditional_calls):
+    mocker.patch.object(route_checkpoint, 'STATEFUL_CONDITIONALS', {'check_key'})
+    engine = create_engine(mocker, {'a': True}, ["check_key('a')"], RouteCheckpoint())
+    engine.decide()
+    engine.decide()
+    assert conditional_calls == ['a', 'a']
+
+
+def test_saved_checkpoint_is_loaded(mocker):
+    route_checkpoint.clear_route_checkpoints()
+    mocker.patch.object(
+        route_checkpoint, 'get_config',
+        side_effect=lambda key, default: True if key == 'ROUTE_CHECKPOINT_ENABLED' else default
+    )
+    checkpoint = route_checkpoint.load_route_checkpoint(1, 'https://example.ckan', 'auth')
+    checkpoint.steps = ['step']
+    checkpoint.save()
+
+    assert route_checkpoint.load_route_checkpoint(1, 'https://example.ckan', 'auth').previous_steps == ['step']
+    assert route_checkpoint.load_route_checkpoint(1, 'https://example.ckan', 'other').previous_steps == []
+    route_checkpoint.clear_route_checkpoints()
@@ -1,5 +1,6 @@
 from navigator_engine.app import create_app
 import navigator_engine.model as model
+import navigator_engine.common.compiled_graph as compiled_graph
 import logging
 import pickle
 
@@ -9,11 +10,31 @@ app = create_app('navigator_engine.config.Testing')
 logger = logging.getLogger("Tests")
 
 
+class QueryCounter():
+    """
+    Counts the SQL statements executed against the db within a `with` block.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        model.db.event.listen(model.db.engine, 'before_cursor_execute', self)
+        return self
+
+    def __exit__(self, *args):
+        model.db.event.remove(model.db.engine, 'before_cursor_execute', self)
+
+
 def create_demo_data():
     # Clear and reset the db
     model.db.drop_all()
     model.db.session.close()
     model.db.create_all()
+    compiled_graph.clear_graph_cache()
 
     # Load a simple BDG
     # Code written before I learned the more concise way of creating graph data used for the 2nd graph